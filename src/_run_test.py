@@ -1,5 +1,6 @@
 import os
 import types
+from json import dumps
 
 # Set required env vars to dummy values
 os.environ.setdefault("NOTION_API_KEY", "test-notion-key")
@@ -8,12 +9,16 @@ os.environ.setdefault("OPENROUTER_API_KEY", "test-openrouter-key")
 os.environ.setdefault("MASTODON_BASE_URL", "https://example.test")
 os.environ.setdefault("MASTODON_ACCESS_TOKEN", "test-mastodon-token")
 
-# Mock requests.post to return deterministic responses for Notion and OpenRouter
-import requests
+# Mock the shared HTTP transport to return deterministic responses for Notion and OpenRouter
+import http_client
 
 class MockResponse:
-    def __init__(self, data):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data, lines=()):
         self._data = data
+        self._lines = lines
 
     def raise_for_status(self):
         return None
@@ -21,8 +26,14 @@ class MockResponse:
     def json(self):
         return self._data
 
+    def iter_lines(self, decode_unicode=False):
+        return iter(self._lines)
+
+    def close(self):
+        return None
+
 
-def fake_post(url, json=None, headers=None):
+def fake_post(url, json=None, headers=None, **kwargs):
     if "api.notion.com" in url:
         # Return a Notion-like database query response with one row
         data = {
@@ -38,13 +49,18 @@ def fake_post(url, json=None, headers=None):
         return MockResponse(data)
     elif "openrouter.ai" in url:
         # Return a fake OpenRouter chat completion
-        data = {"choices": [{"message": {"content": "This is a generated Mastodon post (mock)."}}]}
+        content = "This is a generated Mastodon post (mock)."
+        if (json or {}).get("stream"):
+            # Server-sent events, as read by llm_client.stream_llm
+            chunk = {"choices": [{"delta": {"content": content}, "finish_reason": "stop"}]}
+            return MockResponse({}, lines=[f"data: {dumps(chunk)}", "", "data: [DONE]"])
+        data = {"choices": [{"message": {"content": content}, "finish_reason": "stop"}]}
         return MockResponse(data)
     else:
         return MockResponse({})
 
 # Apply the monkeypatch
-requests.post = fake_post
+http_client.post = fake_post
 
 # Replace mastodon_client.mastodon with a mock that records the posted text
 import mastodon_client
@@ -0,0 +1,120 @@
+"""
+Startup benchmark: import each entry point under `python -X importtime`
+and check it against a time budget and a list of modules it must not load.
+
+    python _startup_bench.py                 # api, main, reply_engine
+    python _startup_bench.py main --budget 2000 --allow-heavy
+
+Times exclude what a bare interpreter imports anyway (site, encodings).
+
+Exits non-zero if the budget is exceeded or a heavy module was imported.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# ML / SDK stacks that entry points must only load on first use
+HEAVY_MODULES = (
+    "faiss",
+    "numpy",
+    "openai",
+    "replicate",
+    "mastodon",
+    "langchain_text_splitters",
+    "PIL",
+)
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "300"))
+
+# The API process and the one-shot cron/CLI pipelines, with their budgets
+# (ms) where they differ from STARTUP_BUDGET_MS: fastapi alone takes
+# ~350 ms to import, and reply_engine defines pydantic models at import
+ENTRY_POINTS = ("api", "main", "reply_engine")
+ENTRY_POINT_BUDGETS_MS = {"api": 700.0, "reply_engine": 450.0}
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_times(module):
+    """
+    Import `module` in a fresh interpreter. Returns [(name, self_us,
+    cumulative_us, depth)] in the order the imports completed.
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    code = f"import {module}" if module else "pass"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=src_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1]
+        raise RuntimeError(f"import {module} failed: {error}")
+
+    times = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            times.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return times
+
+
+def check(module, budget, allow_heavy=False, top=10, baseline=frozenset()):
+    """
+    Print `module`'s import profile, leaving out the `baseline` modules;
+    returns the list of failures.
+    """
+    times = [t for t in import_times(module) if t[0] not in baseline]
+    total_ms = sum(self_us for _, self_us, _, _ in times) / 1000
+    print(f"import {module}: {total_ms:.1f} ms (budget {budget:.0f} ms)")
+
+    print("Slowest top-level imports:")
+    top_level = sorted((t for t in times if t[3] == 0), key=lambda t: -t[2])
+    for name, _, cumulative_us, _ in top_level[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if total_ms > budget:
+        failures.append(f"{module}: over budget by {total_ms - budget:.1f} ms")
+    if not allow_heavy:
+        loaded = {name.split(".")[0] for name, _, _, _ in times}
+        heavy = sorted(loaded.intersection(HEAVY_MODULES))
+        if heavy:
+            failures.append(f"{module}: heavy modules imported: {', '.join(heavy)}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument(
+        "--budget", type=float, default=None,
+        help="ms (default: per entry point, else STARTUP_BUDGET_MS)",
+    )
+    parser.add_argument("--allow-heavy", action="store_true")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = frozenset(name for name, _, _, _ in import_times(None))
+    failures = []
+    for module in args.modules:
+        budget = args.budget
+        if budget is None:
+            budget = ENTRY_POINT_BUDGETS_MS.get(module, STARTUP_BUDGET_MS)
+        failures += check(module, budget, args.allow_heavy, args.top, baseline)
+        print()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Startup within budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
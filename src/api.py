@@ -1,13 +1,129 @@
-from fastapi import FastAPI
-from main import main as run_bot
+import hmac
+import os
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+import tracing
+from jobs import JobQueue
+
+# The pipeline modules pull in faiss, openai, replicate and the Mastodon
+# SDK, so they are imported inside the handlers that need them. Importing
+# this module (and answering health checks) loads none of them.
+
+
+def _run_job(record_stage, fresh=None):
+    from main import main as run_bot
+
+    return run_bot(record_stage, wait=False, fresh=fresh)
+
+
+def _publish_job(record_stage):
+    from review_worker import publish_approved
+
+    return publish_approved(record_stage)
+
+
+def _pregenerate_job(record_stage, count=None, fresh=False):
+    from pregenerate import PREGENERATE_COUNT, pregenerate
+    from review_worker import send_ready_for_review
+
+    queued = pregenerate(count or PREGENERATE_COUNT, record_stage, fresh=fresh)
+    send_ready_for_review()
+    return {"queued": queued}
+
+
+def _send_ready_job(record_stage):
+    from review_worker import send_ready_for_review
+
+    return send_ready_for_review()
+
+
+# Must match the secret_token registered with setWebhook (see
+# telegram_client.set_webhook); the webhook refuses every call without it
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+
+
+jobs = JobQueue({
+    "run": _run_job,
+    "publish": _publish_job,
+    "pregenerate": _pregenerate_job,
+    "send_ready": _send_ready_job,
+})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    jobs.start()
+    yield
+    jobs.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 def health():
     return {"status": "ok"}
 
-@app.post("/run")
-def run():
-    run_bot()
-    return {"status": "bot executed"}
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint."""
+    # Pull in the review store so its queue depths are exported
+    from review_store import get_review_store
+
+    get_review_store()
+    return PlainTextResponse(
+        tracing.render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+@app.post("/run", status_code=202)
+def run(fresh: bool | None = None):
+    """
+    Queue one pipeline run. `fresh=true` bypasses the LLM cache; by
+    default it is bypassed only if the row's previous draft was rejected.
+    """
+    job_id = jobs.submit("run", fresh=fresh)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.post("/pregenerate", status_code=202)
+def pregenerate_drafts(count: int | None = None, fresh: bool = False):
+    """
+    Queue pre-generation of `count` drafts (PREGENERATE_COUNT by default);
+    `fresh=true` bypasses the LLM cache.
+    """
+    job_id = jobs.submit("pregenerate", count=count, fresh=fresh)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/telegram/webhook")
+def telegram_webhook(
+    update: dict,
+    x_telegram_bot_api_secret_token: str | None = Header(default=None),
+):
+    """Telegram webhook: advance the draft's review state, queue publishing."""
+    if not TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(
+        (x_telegram_bot_api_secret_token or "").encode(), TELEGRAM_WEBHOOK_SECRET.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+
+    from review_store import APPROVED, get_review_store
+    from telegram_client import handle_update
+
+    message_id = handle_update(update)
+    if message_id is not None:
+        from review_worker import discard_rejected_uploads
+
+        discard_rejected_uploads([message_id])
+        draft = get_review_store().get(message_id)
+        if draft and draft["state"] == APPROVED:
+            jobs.submit("publish")
+        # A decision frees a review slot for the next pre-generated draft
+        jobs.submit("send_ready")
+    return {"ok": True}
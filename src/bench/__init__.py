@@ -0,0 +1,9 @@
+"""
+Offline benchmark harness.
+
+`bench.fakes` runs local stand-ins for Notion, OpenRouter, Telegram,
+Replicate and Mastodon. `bench.run` points the pipelines at them and
+records per-stage latency percentiles and throughput as JSON:
+
+    python -m bench.run --scenarios build,post,replies,api --runs 20
+"""
@@ -0,0 +1,772 @@
+"""
+Local stand-ins for the external services, for offline benchmarks.
+
+Each fake is a threaded HTTP server on 127.0.0.1 that speaks just enough
+of the real API for our clients. All of them share the same knobs:
+
+    latency       base delay added to every response (seconds)
+    jitter        extra uniform random delay on top of `latency`
+    error_rate    fraction of requests answered with a 503
+    rate_limit    requests allowed per `rate_window` seconds (0 = no
+                  limit); excess requests get a 429 with Retry-After
+
+Responses are deterministic for a given `seed`, so runs are comparable.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Shared vocabulary, so Notion pages, Mastodon posts and prompts overlap
+# enough for retrieval and the reply pre-filter to find matches
+_TOPICS = [
+    "career", "skills", "hobby", "side quest", "freelance", "craft",
+    "mapping", "archivist", "foley artist", "bookbinding", "data labelling",
+    "beekeeping", "sound design", "typography", "urban sketching",
+    "community radio", "museum", "restoration", "apprenticeship", "micro-skill",
+]
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _iso(ts=None):
+    moment = datetime.fromtimestamp(ts or time.time(), tz=timezone.utc)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _png(size, seed):
+    """An uncompressible RGB PNG of `size` x `size` pixels."""
+    rng = random.Random(seed)
+    row = size * 3
+    raw = b"".join(b"\0" + rng.randbytes(row) for _ in range(size))
+
+    def chunk(kind, data):
+        return (
+            struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+    )
+
+
+class Response:
+    def __init__(self, body=None, status=200, headers=None, chunks=None,
+                 content_type="application/json", chunk_delay=0.0):
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+        self.chunks = chunks
+        self.content_type = content_type
+        self.chunk_delay = chunk_delay
+
+
+class FakeService:
+    """Base class: request handling, latency/error/rate-limit injection."""
+
+    name = "service"
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0,
+                 rate_window=1.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.seed = seed
+
+        self.requests = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._server = None
+
+    # -- lifecycle ------------------------------------------------------
+
+    def start(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                service._dispatch(self, "GET")
+
+            def do_POST(self):
+                service._dispatch(self, "POST")
+
+            def do_PUT(self):
+                service._dispatch(self, "PUT")
+
+            def do_PATCH(self):
+                service._dispatch(self, "PATCH")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self):
+        with self._lock:
+            return {f"{route} {status}": n for (route, status), n in sorted(self.requests.items())}
+
+    # -- request handling -------------------------------------------------
+
+    def handle(self, method, path, params, body):
+        raise NotImplementedError
+
+    def route(self, method, path):
+        """Label for request stats, with ids collapsed."""
+        path = re.sub(r"/bot[^/]+/", "/bot:token/", path)
+        path = re.sub(r"/[0-9a-f-]{16,}|/\d+(?=/|$|\.)", "/:id", path)
+        return f"{method} {path}"
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _rate_limited(self):
+        """Seconds until the window resets if this request is over the limit."""
+        if not self.rate_limit:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.rate_window:
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            if self._window_count > self.rate_limit:
+                return max(0.0, self.rate_window - (now - self._window_start))
+            return None
+
+    def _ratelimit_headers(self):
+        if not self.rate_limit:
+            return {}
+        with self._lock:
+            remaining = max(0, self.rate_limit - self._window_count)
+            reset = time.time() + self.rate_window - (time.monotonic() - self._window_start)
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": _iso(reset),
+        }
+
+    def _dispatch(self, handler, method):
+        parts = urlsplit(handler.path)
+        # Repeated keys (Notion's filter_properties) stay lists
+        params = {k: v if len(v) > 1 else v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        content_type = handler.headers.get("Content-Type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            body = {
+                k.removesuffix("[]"): v if k.endswith("[]") else v[-1]
+                for k, v in parse_qs(raw.decode("utf-8")).items()
+            }
+        else:
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = {"_raw": raw}
+
+        delay = self.latency + (self.jitter * self._random() if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        retry_after = self._rate_limited()
+        if retry_after is not None:
+            response = Response(
+                {"error": "rate limited"}, status=429,
+                headers={"Retry-After": f"{math.ceil(retry_after)}"},
+            )
+        elif self.error_rate and self._random() < self.error_rate:
+            response = Response({"error": "injected failure"}, status=503)
+        else:
+            try:
+                response = self.handle(method, parts.path, params, body)
+            except Exception as e:
+                response = Response({"error": repr(e)}, status=500)
+            if response is None:
+                response = Response({"error": "not found"}, status=404)
+
+        with self._lock:
+            self.requests[(self.route(method, parts.path), response.status)] += 1
+        self._send(handler, response)
+
+    def _send(self, handler, response):
+        handler.send_response(response.status)
+        handler.send_header("Content-Type", response.content_type)
+        for key, value in {**self._ratelimit_headers(), **response.headers}.items():
+            handler.send_header(key, value)
+
+        if response.chunks is not None:
+            # Streamed: no length, the connection closes at the end
+            handler.send_header("Connection", "close")
+            handler.end_headers()
+            handler.close_connection = True
+            for chunk in response.chunks:
+                if response.chunk_delay:
+                    time.sleep(response.chunk_delay)
+                try:
+                    handler.wfile.write(chunk)
+                    handler.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return  # the client stopped reading early
+            return
+
+        body = response.body
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+# ---------------------------------------------------------------------
+# Notion
+# ---------------------------------------------------------------------
+
+
+class FakeNotion(FakeService):
+    """A single database of `pages` rows behind POST /v1/databases/{id}/query."""
+
+    name = "notion"
+
+    def __init__(self, pages=200, **kwargs):
+        super().__init__(**kwargs)
+        rng = random.Random(self.seed)
+        now = time.time()
+        self.pages = []
+        for i in range(pages):
+            topics = rng.sample(_TOPICS, 4)
+            body = " ".join(
+                f"People drift into {t} through a {rng.choice(_TOPICS)} and stay for the craft."
+                for t in topics
+            ) * rng.randint(2, 8)
+            self.pages.append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "title": f"{topics[0].title()} #{i}",
+                "content": body,
+                # Shared template text, as in the real database
+                "examples": "Example: a calm, curious post about an unusual path.",
+                "last_edited_time": _iso(now - rng.randint(3600, 90 * 86400)),
+                "posted": False,
+            })
+
+    def edit(self, fraction=0.05):
+        """Touch a fraction of the pages, for incremental-sync benchmarks."""
+        rng = random.Random(self.seed + 1)
+        edited = rng.sample(self.pages, max(1, int(len(self.pages) * fraction)))
+        for page in edited:
+            page["content"] += " Updated with a new anecdote."
+            page["last_edited_time"] = _iso()
+        return len(edited)
+
+    @staticmethod
+    def _rich_text(text):
+        return [{"type": "text", "plain_text": text, "text": {"content": text}}]
+
+    def _row(self, page, property_ids=None):
+        properties = {
+            "Name": {"id": "title", "type": "title", "title": self._rich_text(page["title"])},
+            "Content": {"id": "cOnT", "type": "rich_text", "rich_text": self._rich_text(page["content"])},
+            "Example Posts": {
+                "id": "eXmP", "type": "rich_text", "rich_text": self._rich_text(page["examples"]),
+            },
+            "Posted": {"id": "pStD", "type": "checkbox", "checkbox": page["posted"]},
+        }
+        if property_ids:
+            properties = {k: v for k, v in properties.items() if v["id"] in property_ids}
+        return {
+            "object": "page",
+            "id": page["id"],
+            "last_edited_time": page["last_edited_time"],
+            "properties": properties,
+        }
+
+    def _update(self, page_id, body):
+        page = next((p for p in self.pages if p["id"] == page_id), None)
+        if page is None:
+            return Response({"object": "error", "code": "object_not_found"}, status=404)
+        posted = (body.get("properties") or {}).get("Posted", {}).get("checkbox")
+        if posted is not None:
+            page["posted"] = posted
+            page["last_edited_time"] = _iso()
+        return Response(self._row(page))
+
+    def handle(self, method, path, params, body):
+        match = re.fullmatch(r"/v1/pages/([^/]+)", path)
+        if method == "PATCH" and match:
+            return self._update(match.group(1), body)
+        if method != "POST" or not re.fullmatch(r"/v1/databases/[^/]+/query", path):
+            return None
+
+        pages = self.pages
+        query_filter = body.get("filter") or {}
+        since = query_filter.get("last_edited_time", {}).get("on_or_after")
+        if since:
+            pages = [p for p in pages if p["last_edited_time"] >= since]
+        if query_filter.get("property") == "Posted":
+            wanted = query_filter.get("checkbox", {}).get("equals")
+            pages = [p for p in pages if p["posted"] == wanted]
+
+        start = int(body.get("start_cursor") or 0)
+        size = min(int(body.get("page_size") or 100), 100)
+        batch = pages[start:start + size]
+        has_more = start + size < len(pages)
+        property_ids = params.get("filter_properties")
+        if isinstance(property_ids, str):
+            property_ids = [property_ids]
+        return Response({
+            "object": "list",
+            "results": [self._row(p, property_ids) for p in batch],
+            "has_more": has_more,
+            "next_cursor": str(start + size) if has_more else None,
+        })
+
+
+# ---------------------------------------------------------------------
+# OpenRouter (chat completions + embeddings)
+# ---------------------------------------------------------------------
+
+
+class FakeOpenRouter(FakeService):
+    """
+    Chat completions (plain, streamed and structured) and embeddings.
+
+    Embeddings hash each word into a `dim`-sized vector, so texts sharing
+    words are similar. `token_latency` delays each streamed chunk.
+    """
+
+    name = "openrouter"
+
+    def __init__(self, dim=256, token_latency=0.0, post_words=60, **kwargs):
+        super().__init__(**kwargs)
+        self.dim = dim
+        self.token_latency = token_latency
+        self.post_words = post_words
+        self._calls = 0
+
+    def embed(self, text):
+        vec = [0.0] * self.dim
+        for word in _WORD_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def _embeddings(self, body):
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        data = []
+        for i, text in enumerate(inputs):
+            vec = self.embed(text)
+            if body.get("encoding_format") == "base64":
+                vec = base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vec})
+        tokens = sum(len(t) // 4 for t in inputs)
+        return Response({
+            "object": "list",
+            "data": data,
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _post_text(self, prompt):
+        with self._lock:
+            self._calls += 1
+            nonce = self._calls
+        rng = random.Random(f"{self.seed}:{nonce}:{prompt[:200]}")
+        words = []
+        while len(words) < self.post_words:
+            words.extend(f"Have you met a {rng.choice(_TOPICS)}?".split())
+        return " ".join(words[:self.post_words]) + "."
+
+    def _structured(self, prompt):
+        rng = random.Random(f"{self.seed}:{prompt[:200]}")
+        return json.dumps({"responses": [
+            {
+                "post_id": post_id,
+                "response_text": f"A gentle note on {rng.choice(_TOPICS)} for post {post_id}.",
+                "is_company_related": rng.random() < 0.5,
+                "relevance_score": round(rng.uniform(0.3, 0.95), 2),
+                "reasoning": "Overlaps with unusual career paths.",
+            }
+            for post_id in re.findall(r"Post id=(\S+?):", prompt)
+        ]})
+
+    def _chat(self, body):
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        structured = bool(body.get("response_format"))
+        content = self._structured(prompt) if structured else self._post_text(prompt)
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        }
+        completion_id = f"gen-{uuid.uuid4().hex[:12]}"
+
+        if not body.get("stream"):
+            return Response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        def events():
+            words = content.split(" ")
+            for i in range(0, len(words), 3):
+                last = i + 3 >= len(words)
+                delta = " ".join(words[i:i + 3]) + ("" if last else " ")
+                choice = {"index": 0, "delta": {"content": delta}, "finish_reason": "stop" if last else None}
+                chunk = {"id": completion_id, "choices": [choice]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            yield f"data: {json.dumps({'id': completion_id, 'choices': [], 'usage': usage})}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+
+        return Response(
+            chunks=events(), content_type="text/event-stream", chunk_delay=self.token_latency
+        )
+
+    def handle(self, method, path, params, body):
+        if method == "POST" and path.endswith("/chat/completions"):
+            return self._chat(body)
+        if method == "POST" and path.endswith("/embeddings"):
+            return self._embeddings(body)
+        return None
+
+
+# ---------------------------------------------------------------------
+# Telegram
+# ---------------------------------------------------------------------
+
+
+class FakeTelegram(FakeService):
+    """
+    Bot API subset. Every review message (one with an inline keyboard) is
+    answered after `review_delay` seconds: approved, or with probability
+    `reject_rate` rejected, with the reason sent as a reply to the prompt.
+    """
+
+    name = "telegram"
+
+    def __init__(self, review_delay=0.0, reject_rate=0.0, long_poll_cap=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.review_delay = review_delay
+        self.reject_rate = reject_rate
+        self.long_poll_cap = long_poll_cap
+        self._message_id = 1000
+        self._update_id = 0
+        self._updates = []
+        self._cond = threading.Condition()
+
+    def _next_message_id(self):
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def _queue(self, update, delay=0.0):
+        def push():
+            with self._cond:
+                self._update_id += 1
+                self._updates.append({"update_id": self._update_id, **update})
+                self._cond.notify_all()
+
+        if delay:
+            threading.Timer(delay, push).start()
+        else:
+            push()
+
+    def _send_message(self, body):
+        message_id = self._next_message_id()
+        chat = {"id": int(body.get("chat_id") or 0), "type": "private"}
+        markup = body.get("reply_markup") or {}
+
+        if markup.get("inline_keyboard"):
+            action = "reject" if self._random() < self.reject_rate else "approve"
+            self._queue({"callback_query": {
+                "id": str(message_id),
+                "data": action,
+                "message": {"message_id": message_id, "chat": chat},
+            }}, delay=self.review_delay)
+        elif markup.get("force_reply"):
+            self._queue({"message": {
+                "message_id": self._next_message_id(),
+                "chat": chat,
+                "text": "Too generic for the feed.",
+                "reply_to_message": {"message_id": message_id},
+            }})
+
+        return Response({"ok": True, "result": {"message_id": message_id, "chat": chat}})
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = min(float(params.get("timeout") or 0), self.long_poll_cap)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                pending = [u for u in self._updates if u["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            # Updates below the offset are confirmed and can be dropped
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        return Response({"ok": True, "result": pending})
+
+    def handle(self, method, path, params, body):
+        match = re.fullmatch(r"/bot[^/]+/(\w+)", path)
+        if not match:
+            return None
+        api_method = match.group(1)
+        if api_method == "sendMessage":
+            return self._send_message(body)
+        if api_method == "getUpdates":
+            return self._get_updates({**params, **body})
+        if api_method in ("answerCallbackQuery", "setWebhook", "deleteWebhook"):
+            return Response({"ok": True, "result": True})
+        return None
+
+
+# ---------------------------------------------------------------------
+# Replicate
+# ---------------------------------------------------------------------
+
+
+class FakeReplicate(FakeService):
+    """Predictions API: each prediction succeeds after `predict_latency`."""
+
+    name = "replicate"
+
+    def __init__(self, predict_latency=0.0, image_size=512, **kwargs):
+        super().__init__(**kwargs)
+        self.predict_latency = predict_latency
+        self.image = _png(image_size, self.seed)
+        self._predictions = {}
+
+    def handle(self, method, path, params, body):
+        if method == "POST" and re.fullmatch(r"/v1(/models/[^/]+/[^/]+)?/predictions", path):
+            if self.predict_latency:
+                time.sleep(self.predict_latency)
+            prediction_id = uuid.uuid4().hex
+            prediction = {
+                "id": prediction_id,
+                "model": "fake/model",
+                "version": body.get("version", ""),
+                "status": "succeeded",
+                "input": body.get("input", {}),
+                "output": [f"{self.url}/files/{prediction_id}.png"],
+                "logs": "",
+                "error": None,
+                "metrics": {"predict_time": self.predict_latency},
+                "created_at": _iso(),
+                "started_at": _iso(),
+                "completed_at": _iso(),
+                "urls": {
+                    "get": f"{self.url}/v1/predictions/{prediction_id}",
+                    "cancel": f"{self.url}/v1/predictions/{prediction_id}/cancel",
+                },
+            }
+            with self._lock:
+                self._predictions[prediction_id] = prediction
+            return Response(prediction, status=201)
+
+        match = re.fullmatch(r"/v1/predictions/(\w+)", path)
+        if method == "GET" and match:
+            with self._lock:
+                prediction = self._predictions.get(match.group(1))
+            return Response(prediction) if prediction else None
+
+        if method == "GET" and path.startswith("/files/"):
+            return Response(self.image, content_type="image/png")
+        return None
+
+
+# ---------------------------------------------------------------------
+# Mastodon
+# ---------------------------------------------------------------------
+
+
+class FakeMastodon(FakeService):
+    """
+    Instance info, media uploads, statuses and search. Every search returns
+    up to `posts_per_search` statuses newer than `min_id`, so repeated runs
+    keep finding new posts.
+    """
+
+    name = "mastodon"
+
+    def __init__(self, posts_per_search=10, **kwargs):
+        super().__init__(**kwargs)
+        self.posts_per_search = posts_per_search
+        self._next_id = 100000
+        self._media = {}
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def _account(self, name):
+        return {
+            "id": str(abs(hash(name)) % 10**9),
+            "username": name,
+            "acct": f"{name}@fake.local",
+            "display_name": name.title(),
+            "bot": False,
+            "created_at": _iso(0),
+            "url": f"{self.url}/@{name}",
+        }
+
+    def _status(self, status_id, content, account, in_reply_to_id=None, media=None):
+        return {
+            "id": str(status_id),
+            "uri": f"{self.url}/statuses/{status_id}",
+            "url": f"{self.url}/@{account['username']}/{status_id}",
+            "created_at": _iso(),
+            "content": content,
+            "language": "en",
+            "visibility": "public",
+            "reblog": None,
+            "in_reply_to_id": in_reply_to_id,
+            "account": account,
+            "media_attachments": media or [],
+            "mentions": [],
+            "tags": [],
+            "emojis": [],
+        }
+
+    def _search(self, params):
+        query = params.get("q", "")
+        min_id = int(params.get("min_id") or 0)
+        rng = random.Random(f"{self.seed}:{query}:{min_id}")
+        statuses = []
+        for _ in range(self.posts_per_search):
+            status_id = self._new_id()
+            topic = rng.choice(_TOPICS)
+            content = (
+                f"<p>Thinking about a {topic} {query} lately. Anyone found an odd "
+                f"path into {rng.choice(_TOPICS)} or {rng.choice(_TOPICS)}?</p>"
+            )
+            statuses.append(self._status(status_id, content, self._account(f"user{status_id % 97}")))
+        statuses.reverse()  # newest first, like the real API
+        return Response({"accounts": [], "hashtags": [], "statuses": statuses})
+
+    def _media_attachment(self, media_id):
+        return {
+            "id": str(media_id),
+            "type": "image",
+            "url": f"{self.url}/media/{media_id}",
+            "preview_url": f"{self.url}/media/{media_id}/small",
+            "description": None,
+            "blurhash": None,
+            "meta": {},
+        }
+
+    def handle(self, method, path, params, body):
+        path = path.rstrip("/")
+        if method == "GET" and path in ("/api/v1/instance", "/api/v2/instance"):
+            return Response({
+                "uri": "fake.local",
+                "domain": "fake.local",
+                "title": "Fake Mastodon",
+                "version": "4.2.0",
+                "urls": {},
+                "configuration": {},
+            })
+        if method == "GET" and path == "/api/v2/search":
+            return self._search(params)
+        if method == "POST" and path in ("/api/v1/media", "/api/v2/media"):
+            media = self._media_attachment(self._new_id())
+            with self._lock:
+                self._media[media["id"]] = media
+            return Response(media)
+        match = re.fullmatch(r"/api/v1/media/(\d+)", path)
+        if method in ("GET", "PUT") and match:
+            with self._lock:
+                media = self._media.get(match.group(1))
+            return Response(media) if media else None
+        if method == "POST" and path == "/api/v1/statuses":
+            media = [self._media_attachment(i) for i in body.get("media_ids") or []]
+            status = self._status(
+                self._new_id(), f"<p>{body.get('status', '')}</p>",
+                self._account("hiddenclasses"),
+                in_reply_to_id=body.get("in_reply_to_id"), media=media,
+            )
+            return Response(status)
+        return None
+
+
+SERVICES = {
+    cls.name: cls
+    for cls in (FakeNotion, FakeOpenRouter, FakeTelegram, FakeReplicate, FakeMastodon)
+}
+
+
+def start_fakes(config=None, seed=0):
+    """
+    Start one of each fake. `config` maps a service name to keyword
+    arguments for it (e.g. {"openrouter": {"latency": 0.3}}).
+    Returns {name: service}.
+    """
+    config = config or {}
+    return {
+        name: cls(seed=seed, **config.get(name, {})).start()
+        for name, cls in SERVICES.items()
+    }
+
+
+def fake_env(fakes):
+    """Environment variables pointing the clients at `fakes`."""
+    return {
+        "NOTION_API_URL": f"{fakes['notion'].url}/v1",
+        "NOTION_API_KEY": "fake-notion-key",
+        "NOTION_DATABASE_ID": "fake-database",
+        "OPENROUTER_BASE_URL": f"{fakes['openrouter'].url}/api/v1",
+        "OPENROUTER_API_KEY": "fake-openrouter-key",
+        "TELEGRAM_API_URL": fakes["telegram"].url,
+        "TELEGRAM_BOT_TOKEN": "123:fake",
+        "TELEGRAM_CHAT_ID": "4242",
+        "TELEGRAM_WEBHOOK_SECRET": "fake-webhook-secret",
+        "REPLICATE_BASE_URL": fakes["replicate"].url,
+        "REPLICATE_API_TOKEN": "fake-replicate-token",
+        "MASTODON_BASE_URL": fakes["mastodon"].url,
+        "MASTODON_ACCESS_TOKEN": "fake-mastodon-token",
+    }
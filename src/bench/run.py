@@ -0,0 +1,340 @@
+"""
+Offline end-to-end benchmark.
+
+Starts the fakes from `bench.fakes`, points every client at them and runs
+the pipelines in a scratch directory (so no real index, cache or review
+database is touched):
+
+    build    rag.build_index: a full build, then an incremental sync
+    post     main.main, end to end including an auto-approved review
+    replies  reply_engine.main with replies posted
+    api      the FastAPI app under `--concurrency` concurrent /run calls,
+             with health checks measured alongside
+
+Per-stage p50/p95/p99 and throughput are written to a JSON file. Pass
+`--compare` an earlier result to see the change per stage.
+
+    python -m bench.run --runs 20 --set openrouter.latency=0.3
+    python -m bench.run --compare bench_results/previous.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench.fakes import SERVICES, fake_env, start_fakes
+
+SCENARIOS = ("build", "post", "replies", "api")
+RESULTS_DIR = Path(__file__).resolve().parents[2] / "bench_results"
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_s": round(sum(ordered) / len(ordered), 4),
+        "p50_s": round(pick(0.50), 4),
+        "p95_s": round(pick(0.95), 4),
+        "p99_s": round(pick(0.99), 4),
+        "max_s": round(ordered[-1], 4),
+    }
+
+
+class Recorder:
+    """Collects run and stage durations for one scenario."""
+
+    def __init__(self):
+        self.totals = []
+        self.stages = {}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            self.stages.setdefault(name, []).append(seconds)
+
+    def timed(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.errors.append(repr(e))
+        finally:
+            with self._lock:
+                self.totals.append(time.perf_counter() - started)
+
+    def summary(self, wall_s):
+        return {
+            "runs": len(self.totals),
+            "errors": len(self.errors),
+            "error_samples": self.errors[:5],
+            "wall_s": round(wall_s, 3),
+            "throughput_per_s": round(len(self.totals) / wall_s, 3) if wall_s else 0.0,
+            "total": percentiles(self.totals),
+            "stages": {name: percentiles(s) for name, s in sorted(self.stages.items())},
+        }
+
+
+def _scenario(fn):
+    def run(args, fakes):
+        rec = Recorder()
+        started = time.perf_counter()
+        fn(args, fakes, rec)
+        return rec.summary(time.perf_counter() - started)
+
+    run.__name__ = fn.__name__
+    return run
+
+
+@_scenario
+def bench_build(args, fakes, rec):
+    from rag import build_index
+
+    rec.timed(build_index.main, spec=args.index_spec)
+    rec.record_stage("full_build", rec.totals[-1])
+    for _ in range(max(1, args.runs // 5)):
+        fakes["notion"].edit(0.05)
+        rec.timed(build_index.main, incremental=True)
+        rec.record_stage("incremental_build", rec.totals[-1])
+
+
+@_scenario
+def bench_post(args, fakes, rec):
+    import main
+
+    for _ in range(args.runs):
+        rec.timed(main.main, record_stage=rec.record_stage)
+
+
+@_scenario
+def bench_replies(args, fakes, rec):
+    import reply_engine
+
+    for _ in range(args.runs):
+        rec.timed(reply_engine.main, post_replies=True)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@_scenario
+def bench_api(args, fakes, rec):
+    import requests
+    import uvicorn
+
+    import api
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    base = f"http://127.0.0.1:{port}"
+    session = requests.Session()
+    done = threading.Event()
+
+    def probe_health():
+        while not done.is_set():
+            started = time.perf_counter()
+            session.get(f"{base}/", timeout=10)
+            rec.record_stage("health", time.perf_counter() - started)
+            time.sleep(0.05)
+
+    def run_job():
+        started = time.perf_counter()
+        job_id = session.post(f"{base}/run", timeout=10).json()["job_id"]
+        rec.record_stage("submit", time.perf_counter() - started)
+        while True:
+            job = session.get(f"{base}/jobs/{job_id}", timeout=10).json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.05)
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"].strip().splitlines()[-1])
+        for name, seconds in (job.get("stages") or {}).items():
+            rec.record_stage(f"job.{name}", seconds)
+        rec.record_stage("job", time.perf_counter() - started)
+
+        # Approve through the webhook, as Telegram would
+        draft = job["result"]["draft"]
+        started = time.perf_counter()
+        session.post(f"{base}/telegram/webhook", json={
+            "update_id": draft,
+            "callback_query": {
+                "id": str(draft),
+                "data": "approve",
+                "message": {"message_id": draft, "chat": {"id": os.environ["TELEGRAM_CHAT_ID"]}},
+            },
+        }, headers={
+            "X-Telegram-Bot-Api-Secret-Token": os.environ["TELEGRAM_WEBHOOK_SECRET"],
+        }, timeout=10)
+        rec.record_stage("webhook", time.perf_counter() - started)
+
+    prober = threading.Thread(target=probe_health, daemon=True)
+    prober.start()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for _ in range(args.runs):
+                pool.submit(rec.timed, run_job)
+    finally:
+        done.set()
+        prober.join()
+        server.should_exit = True
+        thread.join()
+
+
+BENCHMARKS = {
+    "build": bench_build,
+    "post": bench_post,
+    "replies": bench_replies,
+    "api": bench_api,
+}
+
+
+def _parse_overrides(items):
+    """["openrouter.latency=0.3", ...] -> {"openrouter": {"latency": 0.3}}"""
+    config = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        service, _, option = key.partition(".")
+        if service not in SERVICES and service != "all":
+            raise SystemExit(f"Unknown service {service!r}")
+        config.setdefault(service, {})[option] = json.loads(value)
+    shared = config.pop("all", {})
+    return {name: {**shared, **config.get(name, {})} for name in SERVICES}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, previous):
+    """Print the p50/p95 change of every stage present in both results."""
+    for scenario, current in result["scenarios"].items():
+        before = previous.get("scenarios", {}).get(scenario)
+        if not before:
+            continue
+        rows = [("total", current["total"], before["total"])] + [
+            (name, stats, before["stages"][name])
+            for name, stats in current["stages"].items()
+            if name in before["stages"]
+        ]
+        print(f"\n{scenario} vs {previous.get('commit') or 'previous'}:")
+        for name, now, then in rows:
+            if not now.get("count") or not then.get("count"):
+                continue
+            deltas = "  ".join(
+                f"{q} {now[f'{q}_s']:.3f}s ({(now[f'{q}_s'] / then[f'{q}_s'] - 1) * 100:+.0f}%)"
+                if then[f"{q}_s"] else f"{q} {now[f'{q}_s']:.3f}s"
+                for q in ("p50", "p95")
+            )
+            print(f"  {name:28} {deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4, help="api scenario clients")
+    parser.add_argument("--pages", type=int, default=200, help="Notion database size")
+    parser.add_argument("--index-spec", default="flat")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="SERVICE.OPTION=VALUE",
+        help="fake service option, e.g. openrouter.latency=0.3 or all.error_rate=0.01",
+    )
+    parser.add_argument("--out", help="result file (default: bench_results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    for name in scenarios:
+        if name not in BENCHMARKS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+
+    # Paths are relative to where we were started, not the scratch dir
+    out = Path(args.out).resolve() if args.out else None
+    previous = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    config = _parse_overrides(args.set)
+    config["notion"].setdefault("pages", args.pages)
+    fakes = start_fakes(config, seed=args.seed)
+    os.environ.update(fake_env(fakes))
+
+    workdir = tempfile.mkdtemp(prefix="hiddenclasses-bench-")
+    os.environ.setdefault("IMAGE_OUTPUT_DIR", os.path.join(workdir, "generated_images"))
+    os.chdir(workdir)
+    print(f"Benchmarking {', '.join(scenarios)} in {workdir}")
+
+    result = {
+        "commit": _git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "args": vars(args),
+        "fakes": config,
+        "scenarios": {},
+    }
+    try:
+        if "build" not in scenarios and {"post", "api"} & set(scenarios):
+            # Retrieval needs an index
+            from rag import build_index
+
+            build_index.main(spec=args.index_spec)
+
+        for name in scenarios:
+            print(f"\n=== {name} ===")
+            summary = BENCHMARKS[name](args, fakes)
+            result["scenarios"][name] = summary
+            total = summary["total"]
+            print(
+                f"{name}: {summary['runs']} runs, {summary['errors']} errors, "
+                f"p50 {total.get('p50_s', 0):.3f}s p95 {total.get('p95_s', 0):.3f}s "
+                f"p99 {total.get('p99_s', 0):.3f}s, {summary['throughput_per_s']:.2f}/s"
+            )
+    finally:
+        import http_client
+
+        result["http"] = http_client.latency_snapshot()
+        result["requests"] = {name: fake.stats() for name, fake in fakes.items()}
+        for fake in fakes.values():
+            fake.stop()
+
+    out = out or RESULTS_DIR / (
+        f"{datetime.now():%Y%m%d-%H%M%S}-{result['commit'] or 'local'}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"\nResults written to {out}")
+
+    if previous:
+        compare(result, previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+http_client.py
+
+Shared HTTP transport for the Notion, OpenRouter and Telegram clients.
+
+- One keep-alive `requests.Session` (connection pool) per host.
+- Default (connect, read) timeouts on every call.
+- Jittered exponential-backoff retries on connection errors, timeouts and
+  429/5xx, for idempotent calls only (GET & co., or `idempotent=True`).
+- Per-endpoint latency histograms (`latency_snapshot()`, and exported
+  through `tracing` as `http_request_seconds`).
+- `arequest`, an asyncio variant on a pooled `httpx.AsyncClient` (one per
+  event loop; `aclose()` it before the loop ends). httpx is imported on
+  first use.
+- `get_openrouter_client()`, one shared OpenAI SDK client whose requests
+  go through the same timeouts and histograms.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+from tracing import LatencyHistogram
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 20.0
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe_latency(endpoint, seconds, error=False):
+    with _histograms_lock:
+        hist = _histograms.get(endpoint)
+        if hist is None:
+            hist = _histograms[endpoint] = LatencyHistogram()
+        hist.observe(seconds, error)
+    tracing.note_call(endpoint, seconds, error)
+
+
+def latency_snapshot():
+    """{endpoint: histogram summary} for every endpoint called so far."""
+    with _histograms_lock:
+        return {name: hist.snapshot() for name, hist in _histograms.items()}
+
+
+@tracing.register_collector
+def _http_metrics():
+    with _histograms_lock:
+        return [
+            ("histogram", "http_request_seconds", {"endpoint": name}, hist)
+            for name, hist in _histograms.items()
+        ]
+
+
+def _default_timeout():
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+def _endpoint(method, url, endpoint):
+    # Label by host unless the caller names the endpoint; paths may hold
+    # secrets (the Telegram bot token) or unbounded ids.
+    return f"{method} {endpoint or urlsplit(url).netloc}"
+
+
+def _backoff(attempt, response=None):
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+# ---------------------------------------------------------------------
+# Sync transport
+# ---------------------------------------------------------------------
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url):
+    """The pooled keep-alive session for `url`'s host."""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount(key, adapter)
+                _sessions[key] = session
+    return session
+
+
+def request(method, url, *, endpoint=None, idempotent=None, retries=None, timeout=None, **kwargs):
+    """
+    Send a request through the shared pool and return the `requests.Response`.
+
+    Callers still call `raise_for_status()`. `idempotent=True` opts a POST
+    (e.g. a Notion database query) into retries.
+    """
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    retries = (HTTP_MAX_RETRIES if retries is None else retries) if idempotent else 0
+    label = _endpoint(method, url, endpoint)
+    session = get_session(url)
+
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout or _default_timeout(), **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            observe_latency(label, time.perf_counter() - started, error=True)
+            if attempt == retries:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+
+        retryable = response.status_code in RETRY_STATUSES
+        observe_latency(label, time.perf_counter() - started, error=response.status_code >= 400)
+        tracing.count(
+            "http_response_bytes", int(response.headers.get("content-length") or 0), endpoint=label
+        )
+        if not retryable or attempt == retries:
+            return response
+        # Give the connection back before retrying (with stream=True the
+        # body is otherwise never read)
+        response.close()
+        time.sleep(_backoff(attempt, response))
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+# ---------------------------------------------------------------------
+# Async transport
+# ---------------------------------------------------------------------
+
+_async_clients = {}
+
+
+def _async_client():
+    import httpx
+
+    # httpx connections are bound to an event loop, so keep one pool per loop
+    loop = asyncio.get_running_loop()
+    for closed in [other for other in _async_clients if other.is_closed()]:
+        # Loops that ended without `aclose()`; their sockets are gone with them
+        del _async_clients[closed]
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_keepalive_connections=HTTP_POOL_SIZE),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose():
+    """Close the running event loop's client; call before the loop ends."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def arequest(method, url, *, endpoint=None, idempotent=None, retries=None, **kwargs):
+    """Async counterpart of `request`; returns an `httpx.Response`."""
+    import httpx
+
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    retries = (HTTP_MAX_RETRIES if retries is None else retries) if idempotent else 0
+    label = _endpoint(method, url, endpoint)
+    client = _async_client()
+
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            observe_latency(label, time.perf_counter() - started, error=True)
+            if attempt == retries:
+                raise
+            await asyncio.sleep(_backoff(attempt))
+            continue
+
+        retryable = response.status_code in RETRY_STATUSES
+        observe_latency(label, time.perf_counter() - started, error=response.status_code >= 400)
+        if not retryable or attempt == retries:
+            return response
+        await asyncio.sleep(_backoff(attempt, response))
+
+
+# ---------------------------------------------------------------------
+# Shared OpenRouter (OpenAI SDK) client
+# ---------------------------------------------------------------------
+
+
+@lru_cache(maxsize=None)
+def _timed_transport_class():
+    import httpx
+
+    class _TimedTransport(httpx.HTTPTransport):
+        """Records SDK requests in the latency histograms."""
+
+        def handle_request(self, request):
+            label = f"{request.method} {request.url.host}{request.url.path}"
+            started = time.perf_counter()
+            try:
+                response = super().handle_request(request)
+            except httpx.TransportError:
+                observe_latency(label, time.perf_counter() - started, error=True)
+                raise
+            observe_latency(label, time.perf_counter() - started, error=response.status_code >= 400)
+            return response
+
+    return _TimedTransport
+
+
+_openrouter_client = None
+_openrouter_lock = threading.Lock()
+
+
+def get_openrouter_client():
+    """
+    The process-wide OpenAI SDK client pointed at OpenRouter. The SDK
+    handles its own retries; use `.with_options(max_retries=...)` to change
+    them without losing the shared connection pool.
+    """
+    global _openrouter_client
+    if _openrouter_client is None:
+        with _openrouter_lock:
+            if _openrouter_client is None:
+                import httpx
+                from openai import OpenAI
+
+                _openrouter_client = OpenAI(
+                    base_url=OPENROUTER_BASE_URL,
+                    api_key=os.environ["OPENROUTER_API_KEY"],
+                    timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                    http_client=httpx.Client(
+                        transport=_timed_transport_class()(
+                            limits=httpx.Limits(max_keepalive_connections=HTTP_POOL_SIZE)
+                        ),
+                    ),
+                )
+    return _openrouter_client
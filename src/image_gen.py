@@ -1,15 +1,46 @@
 # src/image_generator.py
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
 from pathlib import Path
-import replicate
 
-OUTPUT_DIR = Path(__file__).parent.parent / "generated_images"
-OUTPUT_DIR.mkdir(exist_ok=True)
+import tracing
+
+OUTPUT_DIR = Path(
+    os.getenv("IMAGE_OUTPUT_DIR", Path(__file__).parent.parent / "generated_images")
+)
 
 MODEL_ID = (
     "sundai-club/flux-orangecat:"
     "8a1f20975a367c8c0f0538062bc99456f6cfd5b6b7a433a30ec45433aa494552"
 )
 
+MODEL_PARAMS = {
+    "model": "schnell",
+    "go_fast": True,
+    "lora_scale": 1.5,
+    "megapixels": "1",
+    "num_outputs": 1,
+    "aspect_ratio": "1:1",
+    "output_format": "png",
+    "guidance_scale": 3,
+    "output_quality": 80,
+    "prompt_strength": 0.8,
+    "extra_lora_scale": 1.5,
+    "num_inference_steps": 4,
+}
+
+# Retention: keep the directory under this size, but never delete images
+# younger than the minimum age or used by drafts queued or under review
+# (which callers pass in as `in_use`)
+IMAGE_DIR_MAX_BYTES = int(os.getenv("IMAGE_DIR_MAX_BYTES", str(200 * 1024 * 1024)))
+IMAGE_MIN_AGE = float(os.getenv("IMAGE_MIN_AGE", str(24 * 3600)))
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+
 
 def make_image_prompt(post_text: str) -> str:
     """Generate a HiddenClasses-themed prompt with 'orangecat' as the main subject."""
@@ -22,33 +53,150 @@ Inspired by: {post_text}
 """
 
 
-def generate_image(post_text: str) -> Path:
-    """Generate an image for HiddenClasses using the 'schnell' model."""
-    prompt = make_image_prompt(post_text)
-
-    output = replicate.run(
-        MODEL_ID,
-        input={
-            "model": "schnell",
-            "prompt": prompt,
-            "go_fast": True,
-            "lora_scale": 1.5,
-            "megapixels": "1",
-            "num_outputs": 1,
-            "aspect_ratio": "1:1",
-            "output_format": "png",
-            "guidance_scale": 3,
-            "output_quality": 80,
-            "prompt_strength": 0.8,
-            "extra_lora_scale": 1.5,
-            "num_inference_steps": 4,
-        },
-    )
+def _model_input(post_text: str, seed: int = None) -> dict:
+    model_input = {**MODEL_PARAMS, "prompt": make_image_prompt(post_text)}
+    if seed is not None:
+        model_input["seed"] = seed
+    return model_input
+
+
+def image_path_for(model_input: dict, nonce: str = None) -> Path:
+    """
+    Content-addressed output path: a hash of the model and its full input.
+    A `nonce` gives a fresh generation its own path, so it never
+    overwrites an image a draft may still reference.
+    """
+    key = {"model": MODEL_ID, "input": model_input}
+    if nonce is not None:
+        key["nonce"] = nonce
+    key = json.dumps(key, sort_keys=True)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return OUTPUT_DIR / f"{digest}.{model_input['output_format']}"
+
+
+def _cached(image_path: Path) -> bool:
+    if image_path.exists():
+        # Refresh the mtime so retention treats it as recently used
+        image_path.touch()
+        tracing.count("image_cache", result="hit")
+        return True
+    tracing.count("image_cache", result="miss")
+    return False
+
+
+def enforce_retention(keep: Path = None, in_use=()):
+    """
+    Delete the least recently used images until the directory fits the
+    cap, sparing `keep` and the image paths in `in_use`.
+    """
+    now = time.time()
+    files = [(p, p.stat()) for p in OUTPUT_DIR.iterdir() if p.is_file()]
+    total = sum(st.st_size for _, st in files)
+    if total <= IMAGE_DIR_MAX_BYTES:
+        return
+
+    # By stem, so the processed copies `media.prepare_image` writes are kept too
+    in_use = {Path(p).stem for p in in_use}
+    if keep is not None:
+        in_use.add(keep.stem)
+
+    for path, st in sorted(files, key=lambda f: f[1].st_mtime):
+        if total <= IMAGE_DIR_MAX_BYTES:
+            break
+        if path.stem in in_use or now - st.st_mtime < IMAGE_MIN_AGE:
+            continue
+        path.unlink(missing_ok=True)
+        total -= st.st_size
+
+
+def _prepare_output_dir():
+    OUTPUT_DIR.mkdir(exist_ok=True)
+
+
+def _temp_file():
+    # Unique per writer: two generations of the same hash must not interleave
+    return tempfile.NamedTemporaryFile(dir=OUTPUT_DIR, suffix=".tmp", delete=False)
+
 
-    # Output is already a PNG, Mastodon-compatible
-    image_path = OUTPUT_DIR / "hiddenclass.png"
+def _write_chunks(image_path: Path, chunks):
+    with _temp_file() as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(f.name, image_path)
+    tracing.count("image_bytes", image_path.stat().st_size)
 
-    with open(image_path, "wb") as f:
-        f.write(output[0].read())
 
+def _output_path(model_input: dict, fresh: bool) -> Path:
+    return image_path_for(model_input, nonce=uuid.uuid4().hex if fresh else None)
+
+
+def generate_image(post_text: str, seed: int = None, fresh: bool = False, in_use=None) -> Path:
+    """Generate an image for HiddenClasses using the 'schnell' model.
+
+    Output files are named by a hash of the prompt and model parameters,
+    so the same prompt is served from disk unless `fresh` is set (a fresh
+    image gets a path of its own). `in_use` holds the image paths of live
+    drafts, which retention must not delete; without it, no old images are
+    deleted.
+    """
+    model_input = _model_input(post_text, seed)
+    image_path = _output_path(model_input, fresh)
+    if not fresh and _cached(image_path):
+        return image_path
+
+    import replicate
+
+    _prepare_output_dir()
+    with tracing.span("replicate"):
+        output = replicate.run(MODEL_ID, input=model_input)
+
+        # Output is already a PNG, Mastodon-compatible; stream it to disk in chunks
+        _write_chunks(image_path, output[0])
+    if in_use is not None:
+        enforce_retention(keep=image_path, in_use=in_use)
     return image_path
+
+
+async def agenerate_image(
+    post_text: str, seed: int = None, fresh: bool = False, in_use=None
+) -> Path:
+    """Async `generate_image`, using Replicate's async API."""
+    model_input = _model_input(post_text, seed)
+    image_path = _output_path(model_input, fresh)
+    if not fresh and _cached(image_path):
+        return image_path
+
+    import replicate
+
+    _prepare_output_dir()
+    output = await replicate.async_run(MODEL_ID, input=model_input)
+
+    with _temp_file() as f:
+        async for chunk in output[0]:
+            f.write(chunk)
+    os.replace(f.name, image_path)
+    tracing.count("image_bytes", image_path.stat().st_size)
+    if in_use is not None:
+        enforce_retention(keep=image_path, in_use=in_use)
+    return image_path
+
+
+async def agenerate_images(
+    post_texts, variants: int = 1, concurrency: int = IMAGE_CONCURRENCY, in_use=None
+):
+    """
+    Generate `variants` images (distinct seeds) for each post text, at most
+    `concurrency` at a time. Returns one list of paths per post text.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text, seed):
+        async with semaphore:
+            return await agenerate_image(
+                text, seed=seed if variants > 1 else None, in_use=in_use
+            )
+
+    results = await asyncio.gather(
+        *(one(text, seed) for text in post_texts for seed in range(variants))
+    )
+    return [results[i:i + variants] for i in range(0, len(results), variants)]
@@ -0,0 +1,245 @@
+"""
+jobs.py
+
+Persistent job queue for pipeline runs triggered over the API.
+
+Jobs are stored in SQLite so queued work survives restarts, and run on a
+bounded thread pool. A worker claims a job atomically before running it,
+so several API processes can share one store. Jobs left running by a
+process that has died are marked failed rather than re-run, since their
+side effects (a review message, a published status) may already have
+happened. Handlers receive a `record_stage(name, seconds)`
+callback plus the job's keyword params; stage timings are saved with the
+job as they complete.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+JOBS_DB_FILE = os.getenv("JOBS_DB_FILE", "jobs.sqlite")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+INTERRUPTED_ERROR = "interrupted: the worker process exited while the job was running"
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(owner):
+    """Whether the worker `owner` may still be running the job."""
+    if not owner:
+        # Claimed before owners were recorded
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        # Another host's worker; only it can tell
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    def __init__(self, path=JOBS_DB_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                stages TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT
+            )
+            """
+        )
+        # Job stores created before jobs took params or recorded their owner
+        for column in ("params TEXT NOT NULL DEFAULT '{}'", "owner TEXT"):
+            try:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cur
+
+    def create(self, kind, params=None):
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(params or {}), QUEUED, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self, job_id):
+        """Move a queued job to running for this process; False if another worker has it."""
+        cur = self._execute(
+            "UPDATE jobs SET status = ?, started_at = ?, owner = ? WHERE id = ? AND status = ?",
+            (RUNNING, time.time(), _owner(), job_id, QUEUED),
+        )
+        return cur.rowcount == 1
+
+    def record_stage(self, job_id, name, seconds):
+        with self._lock:
+            row = self._conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            stages = json.loads(row[0])
+            stages[name] = round(seconds, 3)
+            self._conn.execute(
+                "UPDATE jobs SET stages = ? WHERE id = ?", (json.dumps(stages), job_id)
+            )
+            self._conn.commit()
+
+    def finish(self, job_id, result=None, error=None):
+        self._execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+            (
+                FAILED if error else SUCCEEDED,
+                time.time(),
+                json.dumps(result) if result is not None else None,
+                error,
+                job_id,
+            ),
+        )
+
+    def status_counts(self):
+        """{status: number of jobs}, e.g. the queue depth under "queued"."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: n for status, n in rows}
+
+    def fail_interrupted(self):
+        """Mark running jobs whose worker process has died as failed; returns their ids."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchall()
+        interrupted = [job_id for job_id, owner in rows if not _process_alive(owner)]
+        for job_id in interrupted:
+            self._execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ? AND status = ?",
+                (FAILED, time.time(), INTERRUPTED_ERROR, job_id, RUNNING),
+            )
+        return interrupted
+
+    def pending(self):
+        """Ids of queued jobs, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class JobQueue:
+    """
+    Runs jobs from a `JobStore` on at most `workers` threads.
+
+    `handlers` maps a job kind to a callable taking `record_stage` and
+    the job's params as keyword arguments.
+    """
+
+    def __init__(self, handlers, store=None, workers=JOB_WORKERS):
+        self.handlers = handlers
+        # Opened in `start`, so constructing a queue touches no files
+        self.store = store
+        self.workers = workers
+        self._pool = None
+        tracing.register_collector(self._metrics)
+
+    def _metrics(self):
+        if self.store is None:
+            return []
+        counts = self.store.status_counts()
+        return [
+            ("gauge", "jobs", {"status": status}, counts.get(status, 0))
+            for status in (QUEUED, RUNNING)
+        ]
+
+    def start(self):
+        if self.store is None:
+            self.store = JobStore()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        for job_id in self.store.fail_interrupted():
+            print(f"Job {job_id} was interrupted by a restart; marked failed")
+        for job_id in self.store.pending():
+            self._pool.submit(self._run, job_id)
+
+    def shutdown(self):
+        if self._pool is not None:
+            # Unstarted jobs stay queued in the store and resume on next start
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, kind, **params):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        job_id = self.store.create(kind, params)
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _run(self, job_id):
+        if not self.store.claim(job_id):
+            return
+        job = self.store.get(job_id)
+        handler = self.handlers[job["kind"]]
+
+        def record_stage(name, seconds):
+            self.store.record_stage(job_id, name, seconds)
+
+        started = time.perf_counter()
+        try:
+            result = handler(record_stage, **job["params"])
+        except Exception:
+            self.store.finish(job_id, error=traceback.format_exc())
+            failed = True
+        else:
+            self.store.finish(job_id, result=result)
+            failed = False
+        tracing.observe("job_seconds", time.perf_counter() - started, error=failed, kind=job["kind"])
@@ -0,0 +1,183 @@
+"""
+llm_cache.py
+
+Opt-in response cache for LLM completions, keyed by
+(model, hash of the whitespace-normalised prompt, params). Entries expire
+after a TTL and the table is LRU-bounded. An optional semantic lookup
+reuses a cached response when a new prompt's embedding is nearly
+identical to a cached one for the same model and params.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import tracing
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "0") == "1"
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", "llm_cache.sqlite")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD", "0.97"))
+
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def _digest(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def params_hash(model, params):
+    return _digest(model, json.dumps(params or {}, sort_keys=True))
+
+
+def cache_key(model, prompt, params=None):
+    return _digest(params_hash(model, params), normalize_prompt(prompt))
+
+
+class LLMCache:
+    def __init__(self, path=LLM_CACHE_FILE, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                params_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                embedding BLOB,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            CREATE INDEX IF NOT EXISTS responses_params ON responses (params_hash);
+            """
+        )
+        self._conn.commit()
+
+    def _hit(self, key, response, tokens, semantic=False):
+        self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        self.hits += 1
+        self.semantic_hits += semantic
+        self.tokens_saved += tokens
+        return response
+
+    def get(self, model, prompt, params=None, embedding=None):
+        """
+        Cached response for this prompt, or None. With `embedding`, falls
+        back to the closest cached prompt above the semantic threshold.
+        """
+        key = cache_key(model, prompt, params)
+        oldest = time.time() - self.ttl
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, tokens FROM responses WHERE key = ? AND created_at >= ?",
+                (key, oldest),
+            ).fetchone()
+            if row:
+                return self._hit(key, *row)
+
+            if embedding is not None:
+                match = self._nearest(params_hash(model, params), embedding, oldest)
+                if match:
+                    return self._hit(*match, semantic=True)
+
+            self.misses += 1
+            return None
+
+    def _nearest(self, scope, embedding, oldest):
+        rows = self._conn.execute(
+            "SELECT key, response, tokens, embedding FROM responses "
+            "WHERE params_hash = ? AND created_at >= ? AND embedding IS NOT NULL",
+            (scope, oldest),
+        ).fetchall()
+        if not rows:
+            return None
+
+        import numpy as np
+
+        query = np.asarray(embedding, dtype=np.float32)
+        matrix = np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+        sims = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-9)
+        best = int(np.argmax(sims))
+        if sims[best] < LLM_CACHE_SEMANTIC_THRESHOLD:
+            return None
+        return rows[best][:3]
+
+    def put(self, model, prompt, response, params=None, tokens=0, embedding=None):
+        now = time.time()
+        blob = None
+        if embedding is not None:
+            import numpy as np
+
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, params_hash, response, tokens, embedding, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(model, prompt, params), params_hash(model, params),
+                 response, tokens, blob, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the process-wide `LLMCache`."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+
+@tracing.register_collector
+def _cache_metrics():
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return tracing.cache_samples("llm", stats) + [
+        ("counter", "llm_cache_semantic_hits", {}, stats["semantic_hits"]),
+        ("counter", "llm_cache_tokens_saved", {}, stats["tokens_saved"]),
+    ]
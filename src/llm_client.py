@@ -1,18 +1,181 @@
-import requests
+import json
 import os
+import time
+
+import http_client
+import tracing
+from llm_cache import LLM_CACHE_ENABLED, get_llm_cache
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_URL = f"{http_client.OPENROUTER_BASE_URL}/chat/completions"
+DEFAULT_MODEL = "nvidia/nemotron-3-nano-30b-a3b"
 
-def call_llm(prompt):
-    payload = {
-        "model": "nvidia/nemotron-3-nano-30b-a3b",
-        "messages": [{"role": "user", "content": prompt}],
-    }
-    headers = {
+
+def _headers():
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
     }
-    response = requests.post(OPENROUTER_URL, json=payload, headers=headers)
+
+
+def _payload(prompt, model, params):
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        **params,
+    }
+
+
+def _estimate_tokens(*texts):
+    # ~4 characters per token, for when the API reports no usage
+    return sum(len(t) for t in texts) // 4
+
+
+def _complete(prompt, model, params, timings):
+    started = time.perf_counter()
+    # Completions have no side effects, so they are safe to retry
+    response = http_client.post(
+        OPENROUTER_URL, json=_payload(prompt, model, params), headers=_headers(),
+        endpoint="openrouter.chat", idempotent=True,
+    )
     response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"]
+    data = response.json()
+    elapsed = time.perf_counter() - started
+    timings.update(ttft_s=elapsed, total_s=elapsed, stopped_early=False)
+
+    choice = data["choices"][0]
+    text = choice["message"]["content"]
+    tokens = (data.get("usage") or {}).get("total_tokens") or _estimate_tokens(prompt, text)
+    return text, tokens, choice.get("finish_reason") != "length"
+
+
+def stream_llm(prompt, model=DEFAULT_MODEL, usage=None, status=None, **params):
+    """
+    Yield text deltas of a streamed (SSE) completion. Closing the generator
+    early closes the connection, which stops generation upstream.
+    If given, `usage` is filled from the final chunk when the API sends one,
+    and `status` receives the `finish_reason` and `done` (True once the
+    stream's [DONE] marker arrived).
+    """
+    response = http_client.post(
+        OPENROUTER_URL,
+        json={
+            **_payload(prompt, model, params),
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        },
+        headers=_headers(), endpoint="openrouter.chat_stream", idempotent=True,
+        stream=True,
+    )
+    try:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            # Blank keep-alives and ": OPENROUTER PROCESSING" comments
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                if status is not None:
+                    status["done"] = True
+                break
+            chunk = json.loads(data)
+            if usage is not None and chunk.get("usage"):
+                usage.update(chunk["usage"])
+            for choice in chunk.get("choices", []):
+                if status is not None and choice.get("finish_reason"):
+                    status["finish_reason"] = choice["finish_reason"]
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+    finally:
+        response.close()
+
+
+def _complete_stream(prompt, model, params, timings, max_chars):
+    """
+    (text, tokens, whole). A stream stopped at `max_chars` counts as whole;
+    one cut off by the token limit or a dropped connection does not.
+    """
+    started = time.perf_counter()
+    usage, status = {}, {}
+    parts, length = [], 0
+    stopped = False
+    ttft = None
+
+    stream = stream_llm(prompt, model, usage=usage, status=status, **params)
+    try:
+        for delta in stream:
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(delta)
+            length += len(delta)
+            if max_chars is not None and length > max_chars:
+                stopped = True
+                break
+    finally:
+        stream.close()
+
+    total = time.perf_counter() - started
+    timings.update(ttft_s=ttft if ttft is not None else total, total_s=total, stopped_early=stopped)
+    text = "".join(parts)
+    # A closed stream reports no usage; count what was sent and received
+    tokens = usage.get("total_tokens") or _estimate_tokens(prompt, text)
+    whole = stopped or (
+        (status.get("done") or status.get("finish_reason"))
+        and status.get("finish_reason") != "length"
+    )
+    return text, tokens, bool(whole)
+
+
+def call_llm(prompt, model=DEFAULT_MODEL, cache=None, fresh=False, semantic=False,
+             stream=False, max_chars=None, timings=None, **params):
+    """
+    Run a single-turn chat completion and return the text.
+
+    `cache` opts into the response cache (default: LLM_CACHE_ENABLED).
+    `fresh=True` skips the lookup but still stores the new response.
+    `semantic=True` also reuses responses to near-identical prompts.
+    `stream=True` streams the completion and, with `max_chars`, stops
+    reading once the text exceeds it (the caller trims the overshoot).
+    Such responses are cached under a key that includes `max_chars`;
+    responses cut off by the token limit or a dropped stream are not
+    cached. If given, `timings` receives ttft_s, total_s, stopped_early
+    and cached. Extra keyword arguments (e.g. temperature) go into the request and
+    the cache key.
+    """
+    if timings is None:
+        timings = {}
+    timings["cached"] = False
+
+    def complete():
+        if stream:
+            text, tokens, whole = _complete_stream(prompt, model, params, timings, max_chars)
+        else:
+            text, tokens, whole = _complete(prompt, model, params, timings)
+        tracing.count("llm_tokens", tokens, model=model)
+        return text, tokens, whole
+
+    if cache is None:
+        cache = LLM_CACHE_ENABLED
+    if not cache:
+        return complete()[0]
+
+    llm_cache = get_llm_cache()
+    # A stream stopped at max_chars is only a prefix of the full completion
+    cache_params = {**params, "max_chars": max_chars} if stream and max_chars else params
+    embedding = None
+    if semantic:
+        from rag.embeddings import embed_texts
+
+        embedding = embed_texts([prompt])[0]
+
+    if not fresh:
+        cached = llm_cache.get(model, prompt, cache_params, embedding=embedding)
+        if cached is not None:
+            timings.update(ttft_s=0.0, total_s=0.0, stopped_early=False, cached=True)
+            return cached
+
+    text, tokens, whole = complete()
+    if whole:
+        llm_cache.put(model, prompt, text, cache_params, tokens=tokens, embedding=embedding)
+    return text
@@ -1,32 +1,112 @@
-from notion_api import fetch_first_row
+import time
+from contextlib import contextmanager
+
+import tracing
+from notion_api import fetch_next_row, fetch_rows
 from post_generator import generate_post
 from image_gen import generate_image
-from mastodon_client import publish_post
-from telegram_client import send_review_message, wait_for_decision
+from review_store import get_review_store
+from review_worker import discard_rejected_uploads, publish_draft, send_for_review
+from telegram_client import wait_for_decision
 from rag.retriever import retrieve_context
 
-def main():
+
+@contextmanager
+def _stage(record_stage, name):
+    started = time.perf_counter()
+    try:
+        with tracing.span(name):
+            yield
+    finally:
+        if record_stage is not None:
+            record_stage(name, time.perf_counter() - started)
+
+
+def _next_row(store):
+    """The next row to post that has no draft queued, in review or published."""
+    active = store.active_page_ids()
+    row = fetch_next_row()
+    if row["id"] not in active:
+        return row
+    # Over-fetch by the rows we will skip, as pregenerate does
+    for row in fetch_rows(len(active) + 1):
+        if row["id"] not in active:
+            return row
+    raise ValueError("Every row to post already has a draft in review")
+
+
+@tracing.trace_run("post")
+def main(record_stage=None, wait=True, fresh=None):
+    """
+    Run the posting pipeline once.
+
+    With `wait=False` the draft is handed to Telegram review and the
+    function returns immediately; `review_worker` publishes it once it is
+    approved. `record_stage(name, seconds)`, if given, is called as each
+    stage ends. `fresh=True` bypasses the LLM cache; by default it is set
+    when an earlier draft for the same row was rejected, so a rerun does
+    not return the rejected post from cache. Rows that already have a
+    draft in review are skipped, so repeated runs draft the next ones.
+    """
+    store = get_review_store()
+
     # 1. Fetch content
-    content, examples = fetch_first_row()
+    with _stage(record_stage, "notion"):
+        row = _next_row(store)
+    content, examples = row["content"], row["examples"]
+    if fresh is None:
+        fresh = store.was_rejected(row["id"])
 
     # 2. Retrieve relevant Notion context (RAG)
-    context = retrieve_context(content, k=5)
+    with _stage(record_stage, "retrieval"):
+        context = retrieve_context(content, k=5)
 
     # 3. Generate post + image (but DO NOT publish yet)
-    post_text = generate_post(content, examples, context)
-    image_path = generate_image(post_text)
+    llm_timings = {}
+    with _stage(record_stage, "generate_post"):
+        post_text = generate_post(content, examples, context, fresh=fresh, timings=llm_timings)
+    if llm_timings.get("ttft_s") is not None:
+        print(
+            f"LLM: first token after {llm_timings['ttft_s']:.2f}s, "
+            f"total {llm_timings['total_s']:.2f}s"
+        )
+        tracing.record_span("llm_ttft", llm_timings["ttft_s"])
+        if record_stage is not None:
+            record_stage("llm_ttft", llm_timings["ttft_s"])
+    with _stage(record_stage, "generate_image"):
+        image_path = generate_image(post_text, in_use=store.image_paths_in_use())
 
     # 4. Send to Telegram for human review
-    send_review_message(post_text)
-    decision = wait_for_decision()
+    with _stage(record_stage, "send_review"):
+        message_id = send_for_review(post_text, image_path=image_path, page_id=row["id"])
+
+    if not wait:
+        print(f"📨 Draft {message_id} sent for review")
+        return {"draft": message_id, "state": "pending", "post_text": post_text}
+
+    with _stage(record_stage, "review"):
+        decision = wait_for_decision(message_id)
 
     # 5. Gate publishing on approval
+    published = False
     if decision["decision"] == "approve":
-        publish_post(post_text, image_path=image_path)
-        print("✅ Post approved and published")
+        with _stage(record_stage, "publish"):
+            published = publish_draft(store, store.get(message_id))
+        if published:
+            print("✅ Post approved and published")
+        else:
+            print("❌ Post approved but publishing failed:", store.get(message_id)["error"])
     else:
+        discard_rejected_uploads([message_id])
         print("❌ Post rejected:", decision["reason"])
         print("🗑️ Post discarded (not published)")
 
+    return {
+        "draft": message_id,
+        "decision": decision["decision"],
+        "published": published,
+        "post_text": post_text,
+    }
+
 if __name__ == "__main__":
     main()
@@ -1,28 +1,100 @@
-from mastodon import Mastodon
+import threading
+import time
+
 from dotenv import load_dotenv
 import os
 
-mastodon = Mastodon(
-    access_token=os.getenv("MASTODON_ACCESS_TOKEN"),
-    api_base_url=os.getenv("MASTODON_BASE_URL")
-)
+import tracing
+
+# Calls left in the rate-limit window below which we wait for the reset
+RATELIMIT_RESERVE = 5
+
+mastodon = None
+_mastodon_lock = threading.Lock()
+
+
+def get_mastodon():
+    """Return the shared, lazily created Mastodon client."""
+    global mastodon
+    if mastodon is None:
+        with _mastodon_lock:
+            if mastodon is None:
+                from mastodon import Mastodon
+
+                mastodon = Mastodon(
+                    access_token=os.getenv("MASTODON_ACCESS_TOKEN"),
+                    api_base_url=os.getenv("MASTODON_BASE_URL")
+                )
+    return mastodon
+
+
+def respect_ratelimit(client):
+    """Sleep until the rate-limit window resets if few calls are left in it."""
+    remaining = getattr(client, "ratelimit_remaining", None)
+    reset = getattr(client, "ratelimit_reset", None)
+    if remaining is not None and reset is not None and remaining <= RATELIMIT_RESERVE:
+        time.sleep(max(0.0, reset - time.time()))
+
+
+def upload_media(image_path: str) -> dict:
+    """
+    Process and upload an image, waiting until Mastodon has finished
+    processing it so the media can be attached right away.
+
+    Returns {id, blurhash, focus} (blurhash/focus are None when they could
+    not be computed locally).
+    """
+    from media import prepare_image
+
+    prepared = prepare_image(image_path)
+    client = get_mastodon()
+    respect_ratelimit(client)
+    with tracing.span("mastodon_upload"):
+        media = client.media_post(
+            str(prepared["path"]),
+            mime_type=prepared["mime_type"],
+            focus=prepared["focus"],
+            synchronous=True,
+        )
+    tracing.count("media_upload_bytes", os.path.getsize(prepared["path"]))
+    return {
+        "id": str(media["id"]),
+        "blurhash": prepared["blurhash"],
+        "focus": prepared["focus"],
+    }
+
+
+def is_media_missing(error) -> bool:
+    """
+    True if `error` is Mastodon refusing a status because an attached media
+    id is unknown or expired (unattached uploads are removed after a while).
+    Mastodon.py raises these as MastodonAPIError with args
+    (message, status code, reason, error text).
+    """
+    args = getattr(error, "args", ())
+    status = args[1] if len(args) > 1 else None
+    detail = " ".join(str(a) for a in args[2:]).lower()
+    return status in (404, 422) and "media" in detail
+
 
-def publish_post(text: str, image_path: str = None) -> dict:
+def publish_post(text: str, image_path: str = None, media_id: str = None) -> dict:
     """
     Publish a post to Mastodon.
     
     Args:
         text: The post content.
         image_path: Optional path to an image file to attach.
+        media_id: Id of an already uploaded image to attach instead.
 
     Returns:
         The Mastodon status response.
     """
-    media_ids = None
-    if image_path:
+    client = get_mastodon()
+    if media_id is None and image_path:
         # Upload image first
-        media = mastodon.media_post(image_path)
-        media_ids = [media]
+        media_id = upload_media(image_path)["id"]
+    media_ids = [media_id] if media_id else None
 
     # Post text with optional image
-    return mastodon.status_post(text, media_ids=media_ids)
+    with tracing.span("mastodon_status"):
+        return client.status_post(text, media_ids=media_ids)
@@ -1,10 +1,25 @@
 import os
-import requests
+import time
+
 from dotenv import load_dotenv
+
+import http_client
+from notion_cache import get_notion_cache
 load_dotenv()
 
 NOTION_API_KEY = os.getenv("NOTION_API_KEY")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
+# Checkbox property ticked on rows once their post is published. The
+# posting pipeline reads the oldest row without it. Set it empty to always
+# read the first row.
+NOTION_POSTED_PROPERTY = os.getenv("NOTION_POSTED_PROPERTY", "Posted")
+# After Notion rejects the checkbox filter (no such property), how long
+# (seconds) to read rows unfiltered before trying it again
+POSTED_FILTER_RETRY = 24 * 3600
+
+# Properties the posting pipeline reads; queries are projected onto them
+ROW_PROPERTIES = ("Content", "Example Posts")
 
 HEADERS = {
     "Authorization": f"Bearer {NOTION_API_KEY}",
@@ -13,44 +28,217 @@ HEADERS = {
 }
 
 
-def fetch_first_row():
-    """Query the Notion database using the HTTP API (avoids SDK incompatibilities).
+def _row_fields(row):
+    """(content, examples) from the first rich-text run of each property."""
+    # Access the properties safely
+    content_prop = row.get("properties", {}).get("Content", {}).get("rich_text", [])
+    examples_prop = row.get("properties", {}).get("Example Posts", {}).get("rich_text", [])
+
+    content = content_prop[0].get("plain_text", "") if content_prop else ""
+    examples = examples_prop[0].get("plain_text", "") if examples_prop else ""
+
+    return content, examples
+
+
+def _property_ids(row):
+    """Ids of ROW_PROPERTIES in a query result, or None if any is missing."""
+    props = row.get("properties", {})
+    ids = [props.get(name, {}).get("id") for name in ROW_PROPERTIES]
+    return ids if all(ids) else None
+
+
+def _property_ids_key():
+    return f"property_ids:{NOTION_DATABASE_ID}"
+
+
+def _posted_filter_key():
+    return f"posted_filter_unsupported:{NOTION_DATABASE_ID}:{NOTION_POSTED_PROPERTY}"
+
+
+def _posted_filter_enabled(cache):
+    if not NOTION_POSTED_PROPERTY:
+        return False
+    rejected_at = cache.peek(_posted_filter_key()) if cache else None
+    return rejected_at is None or time.time() - rejected_at > POSTED_FILTER_RETRY
 
-    Returns (content, examples) strings from the first row.
+
+def _rejects_posted_filter(res):
+    """True if a 400 says the NOTION_POSTED_PROPERTY filter is invalid."""
+    try:
+        error = res.json()
+    except ValueError:
+        return False
+    return (
+        error.get("code") == "validation_error"
+        and NOTION_POSTED_PROPERTY in (error.get("message") or "")
+    )
+
+
+def _query(page_size, queue=True, headers=HEADERS):
+    """
+    Query `page_size` rows, projected onto ROW_PROPERTIES. With `queue`,
+    only rows not yet posted, oldest first.
+
+    Property ids for `filter_properties` are learned from the first
+    unprojected response and kept in the Notion cache; if they no longer
+    match (a property was renamed), the query is repeated without them.
+    Likewise, if Notion rejects the filter because the database has no
+    NOTION_POSTED_PROPERTY checkbox, the query is repeated unfiltered and
+    the filter skipped for a while. Any other error is raised.
     """
-    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
-    res = requests.post(url, headers=HEADERS)
+    url = f"{NOTION_API_URL}/databases/{NOTION_DATABASE_ID}/query"
+    cache = get_notion_cache()
+    payload = {"page_size": page_size}
+    if queue and _posted_filter_enabled(cache):
+        payload["filter"] = {"property": NOTION_POSTED_PROPERTY, "checkbox": {"equals": False}}
+        payload["sorts"] = [{"timestamp": "created_time", "direction": "ascending"}]
+
+    property_ids = cache.peek(_property_ids_key()) if cache else None
+    params = {"filter_properties": property_ids} if property_ids else None
+
+    res = http_client.post(
+        url, headers=headers, params=params, json=payload,
+        endpoint="notion.query", idempotent=True,
+    )
+    if res.status_code == 304:
+        return res, None
+    if res.status_code == 400 and "filter" in payload and cache and _rejects_posted_filter(res):
+        print(
+            f"⚠️ Notion rejected the {NOTION_POSTED_PROPERTY!r} checkbox filter; "
+            "reading rows in database order"
+        )
+        cache.put(_posted_filter_key(), time.time())
+        return _query(page_size, queue, headers)
     res.raise_for_status()
 
-    response = res.json()
-    results = response.get("results", [])
+    results = res.json().get("results", [])
+    if cache and results:
+        learned = _property_ids(results[0])
+        if learned is None and property_ids:
+            cache.delete(_property_ids_key())
+            return _query(page_size, queue, headers)
+        if learned and learned != property_ids:
+            cache.put(_property_ids_key(), learned)
+    return res, results
+
+
+def _row_dict(row):
+    content, examples = _row_fields(row)
+    return {"id": row.get("id"), "content": content, "examples": examples}
+
+
+def _cached_row(key, queue):
+    """
+    The first row of `_query(1, queue)` as {id, content, examples}.
+
+    Served from the shared Notion cache while fresh, so a warm run makes
+    no request; otherwise one query for a single projected row.
+    """
+    cache = get_notion_cache()
+    entry = cache.lookup(key) if cache else None
+    if entry and entry["fresh"]:
+        return entry["value"]
+
+    headers = HEADERS
+    if entry and entry["etag"]:
+        headers = {**HEADERS, "If-None-Match": entry["etag"]}
+    res, results = _query(1, queue, headers)
+    if results is None:
+        # 304 Not Modified
+        cache.touch(key)
+        return entry["value"]
     if not results:
         raise ValueError("No rows found in Notion database!")
 
     row = results[0]
+    value = _row_dict(row)
+    if cache:
+        version = f"{row.get('id')}@{row.get('last_edited_time')}"
+        if entry and row.get("last_edited_time") and entry["version"] == version:
+            cache.touch(key)
+        else:
+            cache.put(key, value, etag=res.headers.get("ETag"), version=version)
+    return value
 
-    # Access the properties safely
-    content_prop = row.get("properties", {}).get("Content", {}).get("rich_text", [])
-    examples_prop = row.get("properties", {}).get("Example Posts", {}).get("rich_text", [])
 
-    content = content_prop[0].get("plain_text", "") if content_prop else ""
-    examples = examples_prop[0].get("plain_text", "") if examples_prop else ""
+def _next_row_key():
+    return f"next_row:{NOTION_DATABASE_ID}:{NOTION_POSTED_PROPERTY}"
 
-    return content, examples
+
+def fetch_next_row():
+    """The next row to post, as an {id, content, examples} dict."""
+    return _cached_row(_next_row_key(), queue=True)
+
+
+def fetch_first_row():
+    """Return (content, examples) strings from the next row to post."""
+    row = fetch_next_row()
+    return row["content"], row["examples"]
+
+
+def fetch_business_context():
+    """
+    Content of the first row in database order, the HiddenClasses
+    description. Unaffected by which rows have been posted.
+    """
+    return _cached_row(f"business_context:{NOTION_DATABASE_ID}", queue=False)["content"]
+
+
+def fetch_rows(count):
+    """
+    Fetch the next `count` rows to post in one query.
+
+    Returns a list of {id, content, examples} dicts.
+    """
+    _, results = _query(min(count, 100))
+    return [_row_dict(row) for row in results[:count]]
 
 
-def fetch_all_pages():
+def mark_posted(page_id):
     """
-    Fetch all rows from the Notion database.
-    Returns a list of dicts with {id, title, content}.
+    Tick NOTION_POSTED_PROPERTY on a published row, so the queue moves on,
+    and drop the cached next row. Returns False if there is no property
+    to set.
     """
+    cache = get_notion_cache()
+    if cache:
+        cache.delete(_next_row_key())
+    if not NOTION_POSTED_PROPERTY or not page_id:
+        return False
+
+    res = http_client.request(
+        "PATCH", f"{NOTION_API_URL}/pages/{page_id}", headers=HEADERS,
+        json={"properties": {NOTION_POSTED_PROPERTY: {"checkbox": True}}},
+        endpoint="notion.pages.update", idempotent=True,
+    )
+    res.raise_for_status()
+    if cache:
+        # Another process may have cached the row while the update was in flight
+        cache.delete(_next_row_key())
+    return True
 
-    url = f"https://api.notion.com/v1/databases/{NOTION_DATABASE_ID}/query"
-    pages = []
+
+def iter_pages(edited_since=None):
+    """
+    Yield rows of the Notion database as {id, title, content,
+    last_edited_time} dicts, one API page (up to 100 rows) at a time.
+
+    If `edited_since` (ISO 8601 timestamp) is given, only rows edited on or
+    after it are returned.
+    """
+
+    url = f"{NOTION_API_URL}/databases/{NOTION_DATABASE_ID}/query"
     payload = {}
+    if edited_since:
+        payload["filter"] = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": edited_since},
+        }
 
     while True:
-        res = requests.post(url, headers=HEADERS, json=payload)
+        res = http_client.post(
+            url, headers=HEADERS, json=payload, endpoint="notion.query", idempotent=True
+        )
         res.raise_for_status()
         data = res.json()
 
@@ -71,11 +259,12 @@ def fetch_all_pages():
             )
 
             if full_text.strip():
-                pages.append({
+                yield {
                     "id": row["id"],
                     "title": title or "Untitled",
-                    "content": full_text
-                })
+                    "content": full_text,
+                    "last_edited_time": row.get("last_edited_time"),
+                }
 
         # Pagination
         if data.get("has_more"):
@@ -83,8 +272,40 @@ def fetch_all_pages():
         else:
             break
 
-    return pages
 
+def fetch_all_pages(edited_since=None):
+    """All rows of `iter_pages` as a list."""
+    return list(iter_pages(edited_since))
+
+
+def fetch_page_ids():
+    """
+    Return the set of ids of all live rows in the Notion database.
+
+    Only the title property is requested, so this is a cheap listing used
+    to detect deleted pages during incremental index updates.
+    """
+    url = f"{NOTION_API_URL}/databases/{NOTION_DATABASE_ID}/query"
+    params = {"filter_properties": "title"}
+    ids = set()
+    payload = {"page_size": 100}
+
+    while True:
+        res = http_client.post(
+            url, headers=HEADERS, params=params, json=payload,
+            endpoint="notion.query", idempotent=True,
+        )
+        res.raise_for_status()
+        data = res.json()
+
+        ids.update(row["id"] for row in data.get("results", []))
+
+        if data.get("has_more"):
+            payload["start_cursor"] = data["next_cursor"]
+        else:
+            break
+
+    return ids
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+"""
+notion_cache.py
+
+Read cache for small Notion queries, shared by every process on the host
+(the posting pipeline, the reply engine and the API) through one SQLite
+file. Entries are fresh for a TTL; after that the caller re-queries and,
+when the response carries the same version (the row's last_edited_time)
+or the server answers 304 to the stored ETag, the entry is revalidated
+rather than replaced.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import tracing
+
+NOTION_CACHE_ENABLED = os.getenv("NOTION_CACHE_ENABLED", "1") == "1"
+NOTION_CACHE_FILE = os.getenv("NOTION_CACHE_FILE", "notion_cache.sqlite")
+NOTION_CACHE_TTL = float(os.getenv("NOTION_CACHE_TTL", "300"))
+
+
+class NotionCache:
+    def __init__(self, path=NOTION_CACHE_FILE, ttl=NOTION_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                etag TEXT,
+                version TEXT,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def lookup(self, key):
+        """
+        {value, etag, version, fresh} for `key`, or None. Only fresh
+        entries count as hits; a stale one is for the caller to revalidate.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, etag, version, fetched_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            fresh = time.time() - row[3] < self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return {"value": json.loads(row[0]), "etag": row[1], "version": row[2], "fresh": fresh}
+
+    def peek(self, key):
+        """The value stored for `key` regardless of age, without counting a lookup."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, etag=None, version=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, etag, version, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), etag, version, time.time()),
+            )
+            self._conn.commit()
+
+    def touch(self, key):
+        """Mark a stale entry as revalidated: fresh for another TTL."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET fetched_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.revalidated += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_notion_cache():
+    """Return the process-wide `NotionCache`, or None when disabled."""
+    global _cache
+    if not NOTION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = NotionCache()
+    return _cache
+
+
+@tracing.register_collector
+def _cache_metrics():
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return tracing.cache_samples("notion", stats) + [
+        ("counter", "notion_cache_revalidated", {}, stats["revalidated"]),
+    ]
@@ -1,11 +1,23 @@
 # src/post_generator.py
 from llm_client import call_llm
+from text_utils import trim_to_sentence
 
-def generate_post(content, examples, context=""):
+MASTODON_CHAR_LIMIT = 500
+DISCLAIMER = "\n\n⚠️This post was generated using AI."
+
+
+def generate_post(content, examples, context="", fresh=False, stream=True, timings=None):
     """
     Generate a Mastodon post using the content, example posts,
     and optional RAG context from Notion.
+
+    The text is kept within the Mastodon limit minus the disclaimer: when
+    streaming, generation stops as soon as the budget is exceeded, and
+    the result is trimmed to a sentence boundary. If the LLM cache is
+    enabled, `fresh=True` forces a new completion. `timings` receives the
+    LLM's time-to-first-token and total latency.
     """
+    budget = MASTODON_CHAR_LIMIT - len(DISCLAIMER)
     prompt = f"""
 You are HiddenClasses, an AI that creates playful, exploratory career posts.
 
@@ -18,7 +30,8 @@ Content to post:
 Example posts:
 {examples}
 
-Write ONE Mastodon post (max 500 characters), playful, curious, and encouraging.
+Write ONE Mastodon post (max {budget} characters), playful, curious, and encouraging.
 """
     # send prompt to LLM and return text
-    return call_llm(prompt) + "\n\n⚠️This post was generated using AI."
+    text = call_llm(prompt, fresh=fresh, stream=stream, max_chars=budget, timings=timings)
+    return trim_to_sentence(text, budget) + DISCLAIMER
@@ -0,0 +1,100 @@
+"""
+pregenerate.py
+
+Batch mode for the posting pipeline: fetch several Notion rows in one
+query, retrieve their context in one batched search, then generate text
+and images concurrently. As soon as a post's text is ready its image is
+started, so image generation for post N overlaps text generation for
+post N+1. Finished drafts go into the persistent ready queue in
+`review_store`, which `review_worker` drains into Telegram review.
+
+    python pregenerate.py --count 5
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from image_gen import generate_image
+from notion_api import fetch_rows
+from post_generator import generate_post
+from rag.retriever import assemble_context, retrieve_context_batch
+from review_store import get_review_store
+
+PREGENERATE_COUNT = int(os.getenv("PREGENERATE_COUNT", "3"))
+TEXT_CONCURRENCY = int(os.getenv("PREGENERATE_TEXT_CONCURRENCY", "3"))
+IMAGE_CONCURRENCY = int(os.getenv("PREGENERATE_IMAGE_CONCURRENCY", "2"))
+
+
+def pregenerate(count=PREGENERATE_COUNT, record_stage=None, fresh=False):
+    """
+    Generate up to `count` drafts and queue them for review. Rows that
+    already have a draft (queued, in review or decided) are skipped.
+    `fresh=True` bypasses the LLM cache. Returns the number of drafts
+    queued.
+    """
+    store = get_review_store()
+
+    started = time.perf_counter()
+    drafted = store.drafted_page_ids()
+    # Over-fetch by the rows we will skip, so they do not crowd out new ones
+    rows = [row for row in fetch_rows(count + len(drafted)) if row["id"] not in drafted][:count]
+    if record_stage:
+        record_stage("notion", time.perf_counter() - started)
+    if not rows:
+        print("Nothing to generate; every row already has a draft.")
+        return 0
+
+    started = time.perf_counter()
+    hits = retrieve_context_batch([row["content"] for row in rows], k=5)
+    contexts = [assemble_context(row_hits) for row_hits in hits]
+    if record_stage:
+        record_stage("retrieval", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    queued = 0
+    # Images of live drafts, which image retention must keep
+    in_use = store.image_paths_in_use()
+    with ThreadPoolExecutor(max_workers=TEXT_CONCURRENCY) as text_pool, \
+            ThreadPoolExecutor(max_workers=IMAGE_CONCURRENCY) as image_pool:
+        text_futures = {
+            text_pool.submit(generate_post, row["content"], row["examples"], context, fresh): row
+            for row, context in zip(rows, contexts)
+        }
+
+        image_futures = {}
+        for future in as_completed(text_futures):
+            row = text_futures[future]
+            try:
+                post_text = future.result()
+            except Exception as e:
+                print(f"❌ Text generation failed for {row['id']}: {e!r}")
+                continue
+            future = image_pool.submit(generate_image, post_text, in_use=in_use)
+            image_futures[future] = (row, post_text)
+
+        for future in as_completed(image_futures):
+            row, post_text = image_futures[future]
+            try:
+                image_path = future.result()
+            except Exception as e:
+                print(f"❌ Image generation failed for {row['id']}: {e!r}")
+                continue
+            store.enqueue_ready(post_text, image_path, page_id=row["id"])
+            queued += 1
+            print(f"📥 Draft for {row['id']} queued for review")
+
+    if record_stage:
+        record_stage("generate", time.perf_counter() - started)
+    return queued
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-generate drafts for review")
+    parser.add_argument("--count", type=int, default=PREGENERATE_COUNT)
+    parser.add_argument("--fresh", action="store_true", help="Bypass the LLM cache")
+    args = parser.parse_args()
+
+    print(f"✅ {pregenerate(args.count, fresh=args.fresh)} drafts queued")
@@ -1,10 +1,102 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import tracing
+from notion_api import fetch_all_pages, fetch_page_ids, iter_pages
 from rag.notion_ingest import ingest_notion
-from rag.vector_store import build_vector_store
+from rag.sync_state import SyncState
+from rag.index_specs import INDEX_SPECS
+from rag.vector_store import (
+    INDEX_FILE,
+    build_vector_store,
+    index_spec,
+    supports_incremental,
+    update_vector_store,
+)
+
+
+def _sync_started():
+    # Notion's last_edited_time has minute granularity, so start the next
+    # window a minute early; re-seen pages hit the embedding cache.
+    started = datetime.now(timezone.utc) - timedelta(minutes=1)
+    return started.replace(second=0, microsecond=0).isoformat()
+
+
+def full_build(state, spec="flat", search_params=None):
+    started = _sync_started()
+    state.pages = {}
+    state.fingerprints = {}
+    # Pages are fetched and chunked as the embedding stage drains the
+    # pipeline, so Notion fetches overlap with embedding requests and no
+    # more than one Notion response of page bodies is held at a time
+    build_vector_store(ingest_notion(iter_pages(), state), spec=spec, search_params=search_params)
+
+    state.cursor = started
+    state.save()
+
 
-def main():
-    documents = ingest_notion()
-    build_vector_store(documents)
+def incremental_build(state):
+    started = _sync_started()
+    with tracing.span("notion_fetch"):
+        changed = fetch_all_pages(edited_since=state.cursor)
+        deleted = set(state.pages) - fetch_page_ids()
+    print(f"{len(changed)} changed and {len(deleted)} deleted pages since {state.cursor}")
+
+    # Release first so that chunks only the changed pages used are not
+    # matched as duplicates of themselves
+    remove_ids = state.release(deleted | {p["id"] for p in changed})
+    with tracing.span("chunk"):
+        documents = list(ingest_notion(changed, state))
+
+    # Shared chunks whose page is gone are attributed to a page still using them
+    relabel = {
+        vid: {"page_id": page_id, "title": state.pages[page_id].get("title")}
+        for vid, page_id in state.orphaned().items()
+    }
+    if documents or remove_ids or relabel:
+        update_vector_store(documents, remove_ids, relabel)
+
+    state.cursor = started
+    state.save()
+
+
+@tracing.trace_run("build_index")
+def main(incremental=False, spec="flat", search_params=None):
+    state = SyncState.load()
+    if incremental and state.cursor and os.path.exists(INDEX_FILE):
+        if supports_incremental():
+            incremental_build(state)
+            print("✅ RAG index built")
+            return
+        spec = index_spec()
+        print(f"A {spec} index cannot remove vectors; doing a full rebuild")
+    full_build(state, spec=spec, search_params=search_params)
     print("✅ RAG index built")
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the Notion RAG index")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-embed pages edited since the last build",
+    )
+    parser.add_argument(
+        "--index-spec",
+        choices=INDEX_SPECS,
+        default="flat",
+        help="FAISS index type for full builds (default: flat)",
+    )
+    parser.add_argument(
+        "--search-params",
+        default=None,
+        help='Search-time parameters, e.g. "nprobe=32" or "efSearch=128"',
+    )
+    args = parser.parse_args()
+
+    main(
+        incremental=args.incremental,
+        spec=args.index_spec,
+        search_params=args.search_params,
+    )
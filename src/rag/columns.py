@@ -0,0 +1,140 @@
+# src/rag/columns.py
+"""
+Compact columnar file format for the RAG metadata.
+
+Layout: 8-byte magic, 8-byte little-endian header length, a JSON header,
+then the raw column buffers, each aligned to 64 bytes. String columns are
+one UTF-8 blob plus an int64 offsets array, numeric columns are plain
+numpy buffers. Columns usually share a row count (`rows` is the first
+column's), but need not. Reading memory-maps the file, so columns are
+zero-copy views and rows are decoded only when asked for.
+"""
+
+import json
+import os
+
+import numpy as np
+
+MAGIC = b"HCCOLS01"
+ALIGN = 64
+
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+def write_columns(path, columns, attrs=None):
+    """
+    Write `columns` ({name: list[str] | np.ndarray}) to `path` atomically.
+
+    `attrs` is a small JSON-serialisable dict stored in the header.
+    """
+    rows = None
+    entries = {}
+    buffers = []
+    pos = 0
+
+    def add_buffer(data):
+        nonlocal pos
+        start = pos
+        buffers.append(data)
+        pos += len(data)
+        padding = _pad(pos)
+        if padding:
+            buffers.append(b"\0" * padding)
+            pos += padding
+        return [start, len(data)]
+
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray):
+            arr = np.ascontiguousarray(values)
+            n = arr.shape[0]
+            entries[name] = {
+                "kind": "array",
+                "dtype": arr.dtype.str,
+                "shape": list(arr.shape),
+                "data": add_buffer(arr.tobytes()),
+            }
+        else:
+            encoded = [str(v).encode("utf-8") for v in values]
+            n = len(encoded)
+            offsets = np.zeros(n + 1, dtype="<i8")
+            offsets[1:] = np.cumsum([len(b) for b in encoded])
+            entries[name] = {
+                "kind": "str",
+                "offsets": add_buffer(offsets.tobytes()),
+                "data": add_buffer(b"".join(encoded)),
+            }
+
+        entries[name]["rows"] = n
+        if rows is None:
+            rows = n
+
+    header = json.dumps(
+        {"rows": rows or 0, "columns": entries, "attrs": attrs or {}}
+    ).encode("utf-8")
+    header += b" " * _pad(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for data in buffers:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+class ColumnFile:
+    """Read-only, memory-mapped view of a file written by `write_columns`."""
+
+    def __init__(self, path):
+        self.path = path
+        self._buf = np.memmap(path, dtype=np.uint8, mode="r")
+
+        if bytes(self._buf[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a column file")
+
+        header_len = int.from_bytes(bytes(self._buf[8:16]), "little")
+        self._data_start = 16 + header_len
+        header = json.loads(bytes(self._buf[16:self._data_start]))
+
+        self.rows = header["rows"]
+        self.attrs = header["attrs"]
+        self._columns = header["columns"]
+        self._offsets = {}
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def _slice(self, span):
+        start = self._data_start + span[0]
+        return self._buf[start:start + span[1]]
+
+    def array(self, name):
+        """Return a numeric column as a zero-copy numpy view."""
+        col = self._columns[name]
+        if col["kind"] != "array":
+            raise TypeError(f"Column {name!r} is a string column")
+        return self._slice(col["data"]).view(col["dtype"]).reshape(col["shape"])
+
+    def string(self, name, row):
+        """Decode a single value of a string column."""
+        offsets = self._offsets.get(name)
+        if offsets is None:
+            offsets = self._slice(self._columns[name]["offsets"]).view("<i8")
+            self._offsets[name] = offsets
+
+        start, end = int(offsets[row]), int(offsets[row + 1])
+        data = self._slice(self._columns[name]["data"])
+        return bytes(data[start:end]).decode("utf-8")
+
+    def row(self, row, names=None):
+        """Decode one row as a dict (all string columns by default)."""
+        names = names or [
+            name for name, col in self._columns.items() if col["kind"] == "str"
+        ]
+        return {name: self.string(name, row) for name in names}
@@ -0,0 +1,86 @@
+# src/rag/doc_store.py
+"""
+Document store kept next to the FAISS index.
+
+One row per chunk with its vector id, page id, title and text, stored in
+the columnar format from `rag.columns` and sorted by vector id. Search
+hits are resolved by bisecting the memory-mapped id column, and only the
+rows that were hit are decoded.
+"""
+
+import os
+
+import numpy as np
+
+from rag.columns import ColumnFile, write_columns
+
+DOC_FIELDS = ("page_id", "title", "text")
+
+
+def write_doc_store(path, vector_ids, metadatas, texts, attrs=None):
+    """Write one row per chunk, sorted by vector id."""
+    vector_ids = np.asarray(vector_ids, dtype=np.int64)
+    order = np.argsort(vector_ids, kind="stable")
+    write_columns(path, {
+        "vector_id": vector_ids[order],
+        "page_id": [metadatas[i]["page_id"] for i in order],
+        "title": [metadatas[i]["title"] for i in order],
+        "text": [texts[i] for i in order],
+    }, attrs=attrs)
+
+
+class DocStore:
+    """Read-only, lazily decoded view of a document store file."""
+
+    def __init__(self, path):
+        self._file = ColumnFile(path)
+        self.attrs = self._file.attrs
+
+    def __len__(self):
+        return len(self._file)
+
+    def vector_ids(self):
+        return self._file.array("vector_id")
+
+    def rows_for_ids(self, ids):
+        """Map vector ids to row numbers (-1 where unknown)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vector_ids = self.vector_ids()
+        if not len(vector_ids):
+            return np.full_like(ids, -1)
+        rows = np.searchsorted(vector_ids, ids)
+        rows = np.minimum(rows, len(vector_ids) - 1)
+        found = (ids >= 0) & (vector_ids[rows] == ids)
+        return np.where(found, rows, -1)
+
+    def row(self, row, fields=DOC_FIELDS):
+        return self._file.row(int(row), fields)
+
+
+class LegacyDocStore:
+    """
+    The old pickled `rag_index_meta.npy` (page_id/title only, no text),
+    addressed by position because those indexes had no id map.
+    """
+
+    attrs = {}
+
+    def __init__(self, path):
+        self._rows = list(np.load(path, allow_pickle=True))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows_for_ids(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return np.where(ids < len(self._rows), ids, -1)
+
+    def row(self, row, fields=DOC_FIELDS):
+        doc = {"text": "", **self._rows[row]}
+        return {field: doc.get(field, "") for field in fields}
+
+
+def open_doc_store(path, legacy_path=None):
+    if os.path.exists(path) or legacy_path is None or not os.path.exists(legacy_path):
+        return DocStore(path)
+    return LegacyDocStore(legacy_path)
@@ -0,0 +1,165 @@
+# src/rag/embedding_cache.py
+"""
+Persistent embedding cache keyed by (model, sha256(text)).
+
+Vectors are stored as raw float32 blobs in SQLite. Every hit refreshes the
+row's `last_used`, and once the table grows past `max_entries` the least
+recently used rows are evicted.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import tracing
+
+EMBEDDING_CACHE_FILE = os.getenv("EMBEDDING_CACHE_FILE", "rag_embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# SQLite's default limit on bound parameters is 999
+_QUERY_BATCH = 500
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_FILE, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, key)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model, texts):
+        """Return a list aligned with `texts`: float32 vectors, or None on a miss."""
+        keys = [text_key(t) for t in texts]
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_BATCH):
+                batch = keys[start:start + _QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings "
+                    f"WHERE model = ? AND key IN ({placeholders})",
+                    [model, *batch],
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+
+            vectors = [found.get(key) for key in keys]
+            hits = sum(v is not None for v in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+
+        return vectors
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = [
+            (model, text_key(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            # REPLACE counts as one change whether or not the row existed,
+            # so count the new keys up front
+            existing = self._existing_keys(model, [row[1] for row in rows])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._size += len({row[1] for row in rows} - existing)
+            self._evict()
+            self._conn.commit()
+
+    def _existing_keys(self, model, keys):
+        found = set()
+        for start in range(0, len(keys), _QUERY_BATCH):
+            batch = keys[start:start + _QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                key for (key,) in self._conn.execute(
+                    f"SELECT key FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model, *batch],
+                )
+            )
+        return found
+
+    def _evict(self):
+        excess = self._size - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, key) IN ("
+            "SELECT model, key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Return the process-wide `EmbeddingCache`."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+@tracing.register_collector
+def _cache_metrics():
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return tracing.cache_samples("embedding", stats) + [
+        ("gauge", "embedding_cache_entries", {}, stats["entries"]),
+    ]
@@ -0,0 +1,194 @@
+# src/rag/embeddings.py
+"""
+Embedding calls against OpenRouter.
+
+`embed_texts` is the simple, cached entry point used for queries.
+`embed_stream` is the build-time pipeline: it splits texts into
+token-budgeted batches, keeps a bounded number of requests in flight,
+backs off on 429/5xx and yields vectors as each batch completes.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import openai
+from dotenv import load_dotenv
+
+import tracing
+from http_client import get_openrouter_client
+from rag.embedding_cache import get_embedding_cache
+
+load_dotenv()
+
+DEFAULT_MODEL = "text-embedding-3-small"
+
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("EMBED_BATCH_MAX_ITEMS", "256"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_MAX_RETRIES = 6
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+class _RateGate:
+    """Shared pause: after a 429, every worker waits before its next request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def defer(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+_gate = _RateGate()
+
+
+def _retry_delay(error, attempt):
+    retry_after = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(30.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _is_retryable(error):
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+_client = None
+
+
+def _embedding_client():
+    # Shared pool, but retries are handled by `_embed_remote`
+    global _client
+    if _client is None:
+        _client = get_openrouter_client().with_options(max_retries=0)
+    return _client
+
+
+# Helper: get embeddings from OpenRouter
+def _embed_remote(texts, model):
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        _gate.wait()
+        try:
+            response = _embedding_client().embeddings.create(
+                model=model,
+                input=texts
+            )
+            usage = getattr(response, "usage", None)
+            tracing.count("embedding_tokens", getattr(usage, "total_tokens", 0), model=model)
+            return [d.embedding for d in response.data]
+        except openai.OpenAIError as e:
+            if attempt == EMBED_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retry_delay(e, attempt)
+            if getattr(e, "status_code", None) == 429:
+                _gate.defer(delay)
+            print(f"Embedding request failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_texts(texts, model=DEFAULT_MODEL, use_cache=True):
+    """
+    Embed `texts`, consulting the on-disk embedding cache first.
+
+    Only cache misses (deduplicated) are sent to OpenRouter.
+    """
+    if not use_cache:
+        return _embed_remote(texts, model)
+
+    cache = get_embedding_cache()
+    vectors = cache.get_many(model, texts)
+
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        fresh = dict(zip(missing, _embed_remote(missing, model)))
+        cache.put_many(model, missing, [fresh[t] for t in missing])
+        vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+
+    return vectors
+
+
+def token_batches(texts, max_tokens=EMBED_BATCH_TOKENS, max_items=EMBED_BATCH_MAX_ITEMS):
+    """
+    Yield (start, batch) from any iterable of texts, each batch within the
+    token and item budget. Texts are pulled only as batches are needed.
+    """
+    start, batch, tokens = 0, [], 0
+    for text in texts:
+        n = estimate_tokens(text)
+        if batch and (tokens + n > max_tokens or len(batch) >= max_items):
+            yield start, batch
+            start, batch, tokens = start + len(batch), [], 0
+        batch.append(text)
+        tokens += n
+    if batch:
+        yield start, batch
+
+
+def embed_stream(texts, model=DEFAULT_MODEL, max_in_flight=EMBED_MAX_IN_FLIGHT, stats=None):
+    """
+    Embed `texts` (any iterable, e.g. a generator still fetching them)
+    batch by batch, yielding (start, float32 matrix) in completion order.
+    At most `max_in_flight` batches run concurrently, and only their texts
+    are held here.
+
+    If given, `stats` is filled with chunk/token counts and elapsed time.
+    """
+    batches = token_batches(texts)
+    started = time.perf_counter()
+    chunks = tokens = 0
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = {}
+
+        def submit_next():
+            item = next(batches, None)
+            if item is not None:
+                start, batch = item
+                pending[pool.submit(embed_texts, batch, model)] = item
+
+        for _ in range(max_in_flight):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                start, batch = pending.pop(future)
+                vectors = np.asarray(future.result(), dtype=np.float32)
+                chunks += len(batch)
+                tokens += sum(estimate_tokens(t) for t in batch)
+                submit_next()
+                yield start, vectors
+
+    if stats is not None:
+        stats.update(chunks=chunks, tokens=tokens, seconds=time.perf_counter() - started)
+
+
+def format_throughput(stats):
+    seconds = max(stats.get("seconds", 0.0), 1e-9)
+    return (
+        f"{stats['chunks']} chunks / ~{stats['tokens']} tokens in {seconds:.1f}s "
+        f"({stats['chunks'] / seconds:.1f} chunks/s, {stats['tokens'] / seconds:.0f} tokens/s)"
+    )
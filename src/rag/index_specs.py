@@ -0,0 +1,103 @@
+# src/rag/index_specs.py
+"""
+FAISS index types selectable at build time.
+
+Every spec is wrapped in an IDMap2 so incremental updates can address
+vectors by id. IVF and scalar/product-quantized specs need a training pass
+over the vectors before anything can be added; their search-time knobs
+(nprobe / efSearch) are applied after the build and stored with the index.
+"""
+
+import math
+import time
+
+import faiss
+import numpy as np
+
+INDEX_SPECS = ("flat", "hnsw", "ivf", "ivfpq", "sq8")
+
+DEFAULT_SEARCH_PARAMS = {
+    "hnsw": "efSearch=64",
+    "ivf": "nprobe=16",
+    "ivfpq": "nprobe=16",
+}
+
+# Specs that must see every vector before any can be added
+TRAINED_SPECS = ("ivf", "ivfpq", "sq8")
+
+# Specs whose index cannot drop vectors, so incremental updates need a rebuild
+NO_REMOVAL_SPECS = ("hnsw",)
+
+# faiss wants ~39 training points per IVF list and 256 per PQ codebook entry
+_MIN_POINTS_PER_LIST = 39
+_PQ_CENTROIDS = 256
+
+
+def _nlist(n):
+    return max(1, min(int(4 * math.sqrt(n)), n // _MIN_POINTS_PER_LIST))
+
+
+def _pq_m(dim):
+    for m in (64, 48, 32, 16, 8, 4):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def factory_string(spec, dim, n):
+    """Return the faiss index_factory description for `spec` over `n` vectors."""
+    if spec == "flat":
+        return "Flat"
+    if spec == "hnsw":
+        return "HNSW32"
+    if spec == "sq8":
+        return "SQ8"
+    if spec == "ivf":
+        return f"IVF{_nlist(n)},Flat"
+    if spec == "ivfpq":
+        return f"IVF{_nlist(n)},PQ{_pq_m(dim)}"
+    raise ValueError(f"Unknown index spec {spec!r}; expected one of {INDEX_SPECS}")
+
+
+def resolve_spec(spec, n):
+    """Fall back to a flat index when there is too little data to train `spec`."""
+    if spec == "ivfpq" and n < _PQ_CENTROIDS:
+        print(f"Only {n} vectors; too few to train {spec}, using flat")
+        return "flat"
+    if spec == "ivf" and n < _MIN_POINTS_PER_LIST:
+        print(f"Only {n} vectors; too few to train {spec}, using flat")
+        return "flat"
+    return spec
+
+
+def make_index(spec, dim, n):
+    return faiss.index_factory(dim, f"IDMap2,{factory_string(spec, dim, n)}")
+
+
+def apply_search_params(index, params):
+    if params:
+        faiss.ParameterSpace().set_index_parameters(index, params)
+
+
+def recall_report(index, baseline, ids, k=10, queries=100, seed=0):
+    """
+    Compare `index` with the exact `baseline` using stored vectors as queries.
+
+    Returns {"recall": recall@k, "ann_ms": ..., "flat_ms": ...} with
+    per-query latencies in milliseconds.
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(ids, size=min(queries, len(ids)), replace=False)
+    query_vecs = np.vstack([baseline.reconstruct(int(i)) for i in sample])
+    k = min(k, len(ids))
+
+    started = time.perf_counter()
+    _, exact = baseline.search(query_vecs, k)
+    flat_ms = (time.perf_counter() - started) * 1000 / len(sample)
+
+    started = time.perf_counter()
+    _, approx = index.search(query_vecs, k)
+    ann_ms = (time.perf_counter() - started) * 1000 / len(sample)
+
+    hits = sum(len(set(a) & set(e)) for a, e in zip(approx, exact))
+    return {"recall": hits / (k * len(sample)), "ann_ms": ann_ms, "flat_ms": flat_ms}
@@ -0,0 +1,115 @@
+# src/rag/lexical.py
+"""
+In-process BM25 index over the RAG chunks.
+
+Postings are stored CSR-style in the columnar format from `rag.columns`:
+terms are identified by a 64-bit hash (sorted, so lookup is a bisection),
+`term_offsets` points into flat `post_rows` / `post_tf` arrays, and
+`doc_ids` maps row numbers back to FAISS vector ids. Loading is a memory
+map plus a JSON header, so it takes milliseconds regardless of size.
+"""
+
+import hashlib
+import re
+
+import numpy as np
+
+from rag.columns import ColumnFile, write_columns
+
+LEXICAL_FILE = "rag_index_bm25.cols"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1]
+
+
+def term_hash(term):
+    return int.from_bytes(
+        hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def build_lexical_index(vector_ids, texts, path=LEXICAL_FILE):
+    """Build and save a BM25 index over `texts` (one row per chunk)."""
+    postings = {}
+    doc_len = np.zeros(len(texts), dtype=np.int32)
+
+    for row, text in enumerate(texts):
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        doc_len[row] = sum(counts.values())
+        for token, tf in counts.items():
+            postings.setdefault(term_hash(token), []).append((row, tf))
+
+    hashes = np.array(sorted(postings), dtype=np.uint64)
+    term_offsets = np.zeros(len(hashes) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(postings[int(h)]) for h in hashes])
+
+    post_rows = np.empty(term_offsets[-1], dtype=np.int32)
+    post_tf = np.empty(term_offsets[-1], dtype=np.uint16)
+    for t, h in enumerate(hashes):
+        entries = postings[int(h)]
+        start = term_offsets[t]
+        post_rows[start:start + len(entries)] = [row for row, _ in entries]
+        post_tf[start:start + len(entries)] = [min(tf, 0xFFFF) for _, tf in entries]
+
+    write_columns(path, {
+        "doc_ids": np.asarray(vector_ids, dtype=np.int64),
+        "doc_len": doc_len,
+        "term_hashes": hashes,
+        "term_offsets": term_offsets,
+        "post_rows": post_rows,
+        "post_tf": post_tf,
+    }, attrs={"avg_len": float(doc_len.mean()) if len(doc_len) else 0.0})
+
+
+class LexicalIndex:
+    def __init__(self, path=LEXICAL_FILE):
+        cols = ColumnFile(path)
+        self.avg_len = cols.attrs["avg_len"] or 1.0
+        self.doc_ids = cols.array("doc_ids")
+        self.doc_len = cols.array("doc_len")
+        self.term_hashes = cols.array("term_hashes")
+        self.term_offsets = cols.array("term_offsets")
+        self.post_rows = cols.array("post_rows")
+        self.post_tf = cols.array("post_tf")
+
+    def _postings(self, term):
+        h = np.uint64(term_hash(term))
+        t = int(np.searchsorted(self.term_hashes, h))
+        if t >= len(self.term_hashes) or self.term_hashes[t] != h:
+            return None
+        start, end = self.term_offsets[t], self.term_offsets[t + 1]
+        return self.post_rows[start:end], self.post_tf[start:end]
+
+    def search(self, query, k=5):
+        """Return [(vector_id, bm25 score)] for the top-k chunks."""
+        n_docs = len(self.doc_ids)
+        if not n_docs:
+            return []
+
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            rows, tf = postings
+            idf = np.log(1.0 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            tf = tf.astype(np.float32)
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[rows] / self.avg_len)
+            scores[rows] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (int(self.doc_ids[row]), float(scores[row]))
+            for row in top
+            if scores[row] > 0
+        ]
@@ -1,24 +1,155 @@
-from notion_api import fetch_all_pages
+"""
+Notion ingest as a generator pipeline: pages -> chunks -> dedup.
+
+Pages are streamed from Notion one API page at a time and split into
+chunks sized in tokens of the embedding model's encoding. Chunks that
+repeat an already stored one (exactly, or nearly by SimHash) are not
+yielded again; the page records the existing vector id instead, so each
+shared chunk is embedded and stored once with several page references.
+Its text and metadata are those of the page that stored it first: a hit
+on it reports that page, or once that page is deleted, a page that still
+shares the chunk (see `SyncState.orphaned`).
+"""
+
+import hashlib
+import os
+from functools import lru_cache
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def ingest_notion():
-    pages = fetch_all_pages()
-    documents = []
+import tracing
+from notion_api import iter_pages
+from rag.sync_state import SyncState, vector_id
+from text_utils import hamming, simhash
+
+# Encoding of text-embedding-3-small
+EMBEDDING_ENCODING = os.getenv("EMBEDDING_ENCODING", "cl100k_base")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "128"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+
+NEAR_DUP_DISTANCE = 3
+# SimHash is unreliable on a handful of words
+NEAR_DUP_MIN_CHARS = 120
+# 64-bit fingerprints are split into 16-bit bands; two fingerprints within
+# NEAR_DUP_DISTANCE bits of each other share at least one band
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+
+
+@lru_cache(maxsize=None)
+def get_splitter():
+    """Token-sized splitter, shared by all ingests in the process."""
+    try:
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=EMBEDDING_ENCODING,
+            chunk_size=CHUNK_TOKENS,
+            chunk_overlap=CHUNK_OVERLAP_TOKENS,
+        )
+    except Exception as e:
+        # Without tiktoken, or when its encoding cannot be downloaded,
+        # size by ~4 characters per token
+        print(f"Token splitter unavailable ({e.__class__.__name__}: {e}); splitting by characters")
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_TOKENS * 4,
+            chunk_overlap=CHUNK_OVERLAP_TOKENS * 4,
+        )
+
+
+def chunk_page(page, splitter=None):
+    """Split one Notion page into documents, numbering its chunks."""
+    splitter = splitter or get_splitter()
+    return [
+        {
+            "text": chunk,
+            "metadata": {
+                "page_id": page["id"],
+                "title": page["title"],
+                "chunk": n,
+            }
+        }
+        for n, chunk in enumerate(splitter.split_text(page["content"]))
+    ]
+
+
+def fingerprint(text):
+    """[digest, simhash] of a chunk; simhash is None for short chunks."""
+    normalized = " ".join(text.split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+    return [digest, simhash(normalized) if len(normalized) >= NEAR_DUP_MIN_CHARS else None]
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=100
-    )
+
+def _bands(fp):
+    mask = (1 << _BAND_BITS) - 1
+    return [(i, (fp >> (i * _BAND_BITS)) & mask) for i in range(_BANDS)]
+
+
+class ChunkDeduper:
+    """Finds the stored chunk a new chunk duplicates, exactly or nearly."""
+
+    def __init__(self, fingerprints=None):
+        self._exact = {}
+        self._bands = {}
+        self.exact = self.near = 0
+        for vid, (digest, fp) in (fingerprints or {}).items():
+            self.add(int(vid), digest, fp)
+
+    def match(self, digest, fp):
+        """Vector id of a stored duplicate, or None."""
+        vid = self._exact.get(digest)
+        if vid is not None:
+            self.exact += 1
+            return vid
+        if fp is None:
+            return None
+        for band in _bands(fp):
+            for vid, other in self._bands.get(band, ()):
+                if hamming(fp, other) <= NEAR_DUP_DISTANCE:
+                    self.near += 1
+                    return vid
+        return None
+
+    def add(self, vid, digest, fp):
+        self._exact.setdefault(digest, vid)
+        if fp is not None:
+            for band in _bands(fp):
+                self._bands.setdefault(band, []).append((vid, fp))
+
+
+def ingest_notion(pages=None, state=None, dedup=True):
+    """
+    Yield the documents to embed for `pages` (default: the whole database,
+    streamed from Notion), with `metadata["vector_id"]` set.
+
+    Each page is recorded in `state` with the vector ids it references,
+    including those of duplicates stored for other pages.
+    """
+    if pages is None:
+        pages = iter_pages()
+    if state is None:
+        state = SyncState()
+    deduper = ChunkDeduper(state.fingerprints) if dedup else None
 
     for page in pages:
-        chunks = splitter.split_text(page["content"])
-        for chunk in chunks:
-            documents.append({
-                "text": chunk,
-                "metadata": {
-                    "page_id": page["id"],
-                    "title": page["title"]
-                }
-            })
-
-    return documents
+        seq = state.new_seq()
+        documents = chunk_page(page)
+        vectors = []
+        for doc in documents:
+            vid = vector_id(seq, doc["metadata"]["chunk"])
+            if deduper is not None:
+                digest, fp = fingerprint(doc["text"])
+                existing = deduper.match(digest, fp)
+                if existing is not None:
+                    vectors.append(existing)
+                    continue
+                deduper.add(vid, digest, fp)
+                state.fingerprints[str(vid)] = [digest, fp]
+            doc["metadata"]["vector_id"] = vid
+            vectors.append(vid)
+            yield doc
+        state.record(page, seq, len(documents), vectors)
+
+    if deduper is not None:
+        tracing.count("duplicate_chunks", deduper.exact, kind="exact")
+        tracing.count("duplicate_chunks", deduper.near, kind="near")
+        if deduper.exact or deduper.near:
+            print(f"Skipped {deduper.exact} exact and {deduper.near} near-duplicate chunks")
@@ -1,9 +1,114 @@
-from rag.vector_store import similarity_search
+# rag.vector_store and rag.embeddings load faiss, numpy and openai, so
+# they are imported on first retrieval; importing this module (and the
+# pipelines that use it) stays cheap.
 
-def retrieve_context(query, k=5):
+# Default token budget for the context handed to the LLM
+CONTEXT_MAX_TOKENS = 1200
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+# Reciprocal rank fusion damping constant and per-ranker candidate depth
+RRF_K = 60
+HYBRID_CANDIDATES = 4
+
+
+def reciprocal_rank_fusion(rankings, k=5, rrf_k=RRF_K):
+    """Fuse ranked hit lists; each hit's `score` becomes its fused RRF score."""
+    fused = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits):
+            entry = fused.setdefault(hit["vector_id"], {**hit, "score": 0.0})
+            entry["score"] += 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.values(), key=lambda h: h["score"], reverse=True)[:k]
+
+
+def retrieve(query, k=5, mode="hybrid"):
+    """
+    Return the top-k hits as {text, score, title, page_id, vector_id} dicts.
+
+    `mode` is "vector" (embedding search), "lexical" (local BM25 only, no
+    network call) or "hybrid" (both, fused by reciprocal rank). If the
+    embedding API fails, vector and hybrid modes fall back to lexical.
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+
+    import openai
+
+    from rag.vector_store import lexical_search, similarity_search
+
+    if mode == "lexical":
+        return lexical_search(query, k=k)
+
+    depth = k * HYBRID_CANDIDATES if mode == "hybrid" else k
+    try:
+        vector_hits = similarity_search(query, k=depth)
+    except openai.OpenAIError as e:
+        print(f"Embedding search failed ({e.__class__.__name__}); using lexical retrieval")
+        return lexical_search(query, k=k)
+
+    if mode == "vector":
+        return vector_hits
+
+    lexical_hits = lexical_search(query, k=depth)
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], k=k)
+
+
+def assemble_context(hits, max_tokens=CONTEXT_MAX_TOKENS):
+    """
+    Pack the best-scoring chunks into one context string of at most
+    roughly `max_tokens` tokens. Chunks that do not fit are skipped, so a
+    long chunk does not crowd out shorter, lower-ranked ones.
+    """
+    from rag.embeddings import estimate_tokens
+
+    parts = []
+    used = 0
+    for hit in sorted(hits, key=lambda h: h["score"], reverse=True):
+        text = hit.get("text", "").strip()
+        if not text:
+            continue
+        part = f"[{hit['title']}]\n{text}" if hit.get("title") else text
+        cost = estimate_tokens(part)
+        if used + cost > max_tokens:
+            continue
+        parts.append(part)
+        used += cost
+    return "\n\n".join(parts)
+
+
+def retrieve_context(query, k=5, max_tokens=CONTEXT_MAX_TOKENS, mode="hybrid"):
     """
-    Return concatenated top-k most relevant Notion chunks.
+    Return the most relevant Notion chunks for `query`, packed into a
+    token-budgeted context string.
     """
-    docs = similarity_search(query, k=k)
-    combined_text = "\n\n".join([doc.get("text", "") for doc in docs])
-    return combined_text
+    return assemble_context(retrieve(query, k=k, mode=mode), max_tokens=max_tokens)
+
+
+def retrieve_context_batch(queries, k=5, dedup=False):
+    """
+    Retrieve top-k chunks for several queries with one embedding request
+    and one FAISS search.
+
+    Returns one list of hits ({text, title, page_id, vector_id, score})
+    per query. With `dedup`, for callers that merge the results, a chunk
+    found by several queries is kept only in the result set of the query
+    it scored best for.
+    """
+    from rag.vector_store import similarity_search_batch
+
+    results = similarity_search_batch(queries, k=k)
+    if not dedup:
+        return results
+
+    best = {}
+    for q, hits in enumerate(results):
+        for hit in hits:
+            current = best.get(hit["vector_id"])
+            if current is None or hit["score"] > current[1]:
+                best[hit["vector_id"]] = (q, hit["score"])
+
+    return [
+        [hit for hit in hits if best[hit["vector_id"]][0] == q]
+        for q, hits in enumerate(results)
+    ]
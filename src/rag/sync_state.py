@@ -0,0 +1,120 @@
+# src/rag/sync_state.py
+"""
+Persistent cursor and page bookkeeping for incremental index updates.
+
+Each ingested page gets a sequence number; the FAISS id of chunk `n` of a
+page is `(seq << CHUNK_BITS) | n`. Duplicate chunks are stored once, so a
+page also records the ids it shares with other pages, and a vector is
+only removed once no remaining page references it. A shared vector is
+attributed to the page that stored it (the one whose seq is in its id)
+while that page exists, and then to a remaining page (`orphaned`).
+"""
+
+import json
+import os
+
+SYNC_STATE_FILE = "rag_sync_state.json"
+
+CHUNK_BITS = 16
+
+
+def vector_id(seq, chunk):
+    if chunk >= 1 << CHUNK_BITS:
+        raise ValueError(f"Page has more than {1 << CHUNK_BITS} chunks")
+    return (seq << CHUNK_BITS) | chunk
+
+
+class SyncState:
+    def __init__(self, cursor=None, next_seq=0, pages=None, fingerprints=None):
+        self.cursor = cursor
+        self.next_seq = next_seq
+        # page_id -> {"seq": int, "chunks": int, "last_edited_time": str,
+        #             "title": str, "vectors": [referenced vector ids]}
+        self.pages = pages or {}
+        # str(vector_id) -> [digest, simhash] of every stored chunk
+        self.fingerprints = fingerprints or {}
+
+    @classmethod
+    def load(cls, path=SYNC_STATE_FILE):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def save(self, path=SYNC_STATE_FILE):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "cursor": self.cursor,
+                    "next_seq": self.next_seq,
+                    "pages": self.pages,
+                    "fingerprints": self.fingerprints,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _page_vectors(page):
+        if "vectors" in page:
+            return page["vectors"]
+        # State written before chunks were deduplicated
+        return [vector_id(page["seq"], n) for n in range(page["chunks"])]
+
+    def vector_ids(self, page_ids):
+        """All vector ids referenced by `page_ids`."""
+        ids = []
+        for page_id in page_ids:
+            page = self.pages.get(page_id)
+            if page:
+                ids.extend(self._page_vectors(page))
+        return ids
+
+    def drop(self, page_ids):
+        for page_id in page_ids:
+            self.pages.pop(page_id, None)
+
+    def release(self, page_ids):
+        """
+        Drop `page_ids` and return the vector ids no remaining page
+        references, i.e. the ones to remove from the index.
+        """
+        candidates = set(self.vector_ids(page_ids))
+        self.drop(page_ids)
+        for page in self.pages.values():
+            candidates.difference_update(self._page_vectors(page))
+        for vid in candidates:
+            self.fingerprints.pop(str(vid), None)
+        return sorted(candidates)
+
+    def orphaned(self):
+        """
+        {vector_id: page_id} for vectors whose own page is gone but which
+        another page still references; hits on them belong to that page.
+        """
+        live_seqs = {page["seq"] for page in self.pages.values()}
+        orphans = {}
+        for page_id, page in self.pages.items():
+            for vid in self._page_vectors(page):
+                if vid >> CHUNK_BITS not in live_seqs:
+                    orphans.setdefault(vid, page_id)
+        return orphans
+
+    def new_seq(self):
+        """
+        Sequence number for a page being (re-)ingested. Re-ingested pages
+        get a fresh one, since chunks of their old one may still be shared.
+        """
+        seq = self.next_seq
+        self.next_seq += 1
+        return seq
+
+    def record(self, page, seq, chunks, vectors):
+        self.pages[page["id"]] = {
+            "seq": seq,
+            "chunks": chunks,
+            "last_edited_time": page.get("last_edited_time"),
+            "title": page.get("title"),
+            "vectors": list(dict.fromkeys(vectors)),
+        }
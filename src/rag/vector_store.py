@@ -1,58 +1,336 @@
 # src/rag/vector_store.py
 
 import os
+import threading
+import time
+
 import faiss
 import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
-load_dotenv()
 
-# Create OpenRouter client
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ["OPENROUTER_API_KEY"]
+import tracing
+from rag.doc_store import DocStore, open_doc_store, write_doc_store
+from rag.embedding_cache import get_embedding_cache
+from rag.embeddings import embed_stream, embed_texts, format_throughput
+from rag.lexical import LEXICAL_FILE, LexicalIndex, build_lexical_index
+from rag.index_specs import (
+    DEFAULT_SEARCH_PARAMS,
+    NO_REMOVAL_SPECS,
+    TRAINED_SPECS,
+    apply_search_params,
+    make_index,
+    recall_report,
+    resolve_spec,
 )
 
+load_dotenv()
+
 INDEX_FILE = "rag_index.faiss"
-METADATA_FILE = "rag_index_meta.npy"
+METADATA_FILE = "rag_index_meta.cols"
+LEGACY_METADATA_FILE = "rag_index_meta.npy"
+
+# How often (seconds) a resident store stats the index file for a rebuild
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+def _atomic_write_index(index, path):
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
 
-# Helper: get embeddings from OpenRouter
-def embed_texts(texts, model="text-embedding-3-small"):
-    response = client.embeddings.create(
-        model=model,
-        input=texts
+def _save(index, vector_ids, metadatas, texts, attrs):
+    # Index last: resident stores reload when the index file changes
+    with tracing.span("save_index"):
+        write_doc_store(METADATA_FILE, vector_ids, metadatas, texts, attrs=attrs)
+        build_lexical_index(vector_ids, texts, LEXICAL_FILE)
+        _atomic_write_index(index, INDEX_FILE)
+
+
+def _document_ids(documents):
+    return np.array(
+        [d["metadata"].get("vector_id", i) for i, d in enumerate(documents)],
+        dtype=np.int64,
     )
-    return [d.embedding for d in response.data]
+
+
+def _collect(documents, ids, metadatas, texts):
+    """Pass the texts of `documents` on, keeping what the doc store needs."""
+    for i, doc in enumerate(documents):
+        ids.append(doc["metadata"].get("vector_id", i))
+        metadatas.append(doc["metadata"])
+        texts.append(doc["text"])
+        yield doc["text"]
+
 
 # Build vector store from documents
-def build_vector_store(documents):
-    texts = [d["text"] for d in documents]
-    metadatas = [d["metadata"] for d in documents]
+def build_vector_store(documents, spec="flat", search_params=None):
+    """
+    Embed `documents` and write a fresh index of type `spec`
+    (flat, hnsw, ivf, ivfpq or sq8; see rag.index_specs).
+
+    `documents` may be a generator; it is drained as batches are embedded,
+    and vectors go straight into the index. Only specs that need training
+    buffer the vectors until all have been seen.
 
-    print(f"Embedding {len(texts)} documents...")
-    vectors = embed_texts(texts)
+    `search_params` (e.g. "nprobe=32") overrides the spec's default
+    search-time parameters. For approximate specs a recall/latency
+    comparison with an exact flat index is printed.
+    """
+    ids, metadatas, texts = [], [], []
+    trained = spec in TRAINED_SPECS
+    index = baseline = None
+    buffered = []
+    throughput = {}
 
-    dim = len(vectors[0])
-    index = faiss.IndexFlatL2(dim)
-    index.add(np.array(vectors).astype("float32"))
+    print(f"Embedding documents into a {spec} index...")
+    with tracing.span("embed"):
+        stream = embed_stream(_collect(documents, ids, metadatas, texts), stats=throughput)
+        for start, vectors in stream:
+            batch_ids = np.asarray(ids[start:start + len(vectors)], dtype=np.int64)
+            if trained:
+                buffered.append((batch_ids, vectors))
+                continue
+            if index is None:
+                dim = vectors.shape[1]
+                index = make_index(spec, dim, len(ids))
+                if spec != "flat":
+                    baseline = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+            index.add_with_ids(vectors, batch_ids)
+            if baseline is not None:
+                baseline.add_with_ids(vectors, batch_ids)
+    if not texts:
+        raise ValueError("No documents to index")
+    print(f"Embedded {format_throughput(throughput)}")
+    ids = np.asarray(ids, dtype=np.int64)
 
-    # Save index & metadata
-    faiss.write_index(index, INDEX_FILE)
-    np.save(METADATA_FILE, metadatas)
+    if trained:
+        # The number of IVF lists depends on how many vectors there are
+        spec = resolve_spec(spec, len(ids))
+        vector_ids = np.concatenate([batch_ids for batch_ids, _ in buffered])
+        vectors = np.vstack([batch for _, batch in buffered])
+        del buffered
+        dim = vectors.shape[1]
+        index = make_index(spec, dim, len(ids))
+        if spec != "flat":
+            baseline = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+            baseline.add_with_ids(vectors, vector_ids)
+        if not index.is_trained:
+            started = time.perf_counter()
+            with tracing.span("train_index"):
+                index.train(vectors)
+            print(f"Trained {spec} index in {time.perf_counter() - started:.1f}s")
+        index.add_with_ids(vectors, vector_ids)
+        del vectors
 
+    if search_params is None:
+        search_params = DEFAULT_SEARCH_PARAMS.get(spec, "")
+    apply_search_params(index, search_params)
+
+    if baseline is not None:
+        with tracing.span("recall_report"):
+            report = recall_report(index, baseline, ids)
+        print(
+            f"{spec} ({search_params or 'default params'}): "
+            f"recall@10 {report['recall']:.3f}, "
+            f"{report['ann_ms']:.3f} ms/query vs {report['flat_ms']:.3f} ms/query flat"
+        )
+
+    _save(index, ids, metadatas, texts, attrs={"spec": spec, "search_params": search_params})
+
+    stats = get_embedding_cache().stats()
+    print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
     print(f"✅ RAG index built with {len(texts)} vectors")
     return index, metadatas
 
-# Load vector store
-def load_vector_store():
+
+def index_spec(metadata_file=METADATA_FILE):
+    """Spec of the saved index ("flat" for indexes built before specs existed)."""
+    if not os.path.exists(metadata_file):
+        return "flat"
+    return DocStore(metadata_file).attrs.get("spec", "flat")
+
+
+def supports_incremental(metadata_file=METADATA_FILE):
+    return index_spec(metadata_file) not in NO_REMOVAL_SPECS
+
+
+def update_vector_store(documents, remove_ids, relabel=None):
+    """
+    Apply an incremental update to the saved index.
+
+    Vectors in `remove_ids` (deleted or edited pages) are dropped, then
+    `documents` are embedded and added under their `vector_id`. `relabel`
+    ({vector_id: {"page_id", "title"}}) re-attributes kept rows; a None
+    value leaves that field unchanged.
+    """
     index = faiss.read_index(INDEX_FILE)
-    metadatas = np.load(METADATA_FILE, allow_pickle=True)
-    return index, metadatas
+    if not isinstance(index, faiss.IndexIDMap2):
+        raise ValueError("Index has no id map; run a full rebuild first")
+    old_docs = DocStore(METADATA_FILE)
+
+    remove_ids = np.asarray(sorted(set(remove_ids)), dtype=np.int64)
+    removed = index.remove_ids(remove_ids) if len(remove_ids) else 0
+
+    texts = [d["text"] for d in documents]
+    metadatas = [d["metadata"] for d in documents]
+    ids = _document_ids(documents)
+
+    if texts:
+        print(f"Embedding {len(texts)} changed documents...")
+        throughput = {}
+        with tracing.span("embed"):
+            for start, vectors in embed_stream(texts, stats=throughput):
+                index.add_with_ids(vectors, ids[start:start + len(vectors)])
+        print(f"Embedded {format_throughput(throughput)}")
+
+    # Carry over the rows of untouched pages
+    old_ids = old_docs.vector_ids()
+    keep = np.flatnonzero(~np.isin(old_ids, remove_ids))
+    kept = [old_docs.row(i) for i in keep]
+    for vid, row in zip(old_ids[keep].tolist(), kept):
+        fields = (relabel or {}).get(vid, {})
+        row.update({name: value for name, value in fields.items() if value is not None})
+
+    _save(
+        index,
+        np.concatenate([old_ids[keep], ids]),
+        kept + metadatas,
+        [row["text"] for row in kept] + texts,
+        attrs=old_docs.attrs,
+    )
+
+    print(f"✅ RAG index updated: -{removed} / +{len(texts)} vectors ({index.ntotal} total)")
+    return index
+
+
+# Load vector store
+def load_vector_store(index_file=INDEX_FILE, metadata_file=METADATA_FILE):
+    """Read the index (memory-mapped where faiss supports it) and doc store."""
+    index = faiss.read_index(
+        index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    )
+    docs = open_doc_store(metadata_file, LEGACY_METADATA_FILE)
+    apply_search_params(index, docs.attrs.get("search_params"))
+    return index, docs
+
+
+def _load_snapshot(index_file, metadata_file, lexical_file):
+    index, docs = load_vector_store(index_file, metadata_file)
+    lexical = LexicalIndex(lexical_file) if os.path.exists(lexical_file) else None
+    return index, docs, lexical
+
+
+class VectorStore:
+    """
+    Long-lived, read-only view of the RAG index.
+
+    The index, doc store and BM25 index are loaded once and kept resident. At most every
+    `check_interval` seconds the index file's mtime is compared with the
+    loaded one, and a new snapshot is swapped in after `build_index` has
+    written a fresh index. Queries in between touch no disk.
+    """
+
+    def __init__(self, index_file=INDEX_FILE, metadata_file=METADATA_FILE,
+                 lexical_file=LEXICAL_FILE, check_interval=RELOAD_CHECK_INTERVAL):
+        self.index_file = index_file
+        self.metadata_file = metadata_file
+        self.lexical_file = lexical_file
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._mtime = None
+        self._next_check = 0.0
+
+    def _current(self):
+        now = time.monotonic()
+        if self._snapshot is not None and now < self._next_check:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now < self._next_check:
+                return self._snapshot
+
+            mtime = os.stat(self.index_file).st_mtime_ns
+            if mtime != self._mtime:
+                self._snapshot = _load_snapshot(
+                    self.index_file, self.metadata_file, self.lexical_file
+                )
+                self._mtime = mtime
+            self._next_check = now + self.check_interval
+            return self._snapshot
+
+    def search(self, query_vecs, k=5):
+        """
+        Search a (n, dim) float32 matrix in one `index.search` call.
+
+        Returns, per query, hits ({text, title, page_id, vector_id, score};
+        score is 1 - d/2 for squared L2 distance d, i.e. cosine similarity
+        for the unit-length embeddings we store). Only hit rows are decoded,
+        each once however many queries found it.
+        """
+        index, docs, _ = self._current()
+        with tracing.span("faiss_search"):
+            distances, ids = index.search(query_vecs, k)
+        rows = docs.rows_for_ids(ids)
+        decoded = {r: docs.row(r) for r in set(rows.ravel().tolist()) if r >= 0}
+        return [
+            [
+                {
+                    **decoded[r],
+                    "vector_id": int(i),
+                    "score": float(1.0 - d / 2.0),
+                }
+                for r, i, d in zip(row_rows, row_ids, row_distances)
+                if r >= 0
+            ]
+            for row_rows, row_ids, row_distances in zip(rows, ids, distances)
+        ]
+
+    def search_lexical(self, query, k=5):
+        """
+        BM25 search; needs no embedding call. Hits carry the BM25 `score`.
+        Returns [] for indexes built before the BM25 index existed.
+        """
+        _, docs, lexical = self._current()
+        if lexical is None:
+            return []
+
+        with tracing.span("bm25_search"):
+            matches = lexical.search(query, k)
+        rows = docs.rows_for_ids([vector_id for vector_id, _ in matches])
+        return [
+            {**docs.row(r), "vector_id": vector_id, "score": score}
+            for r, (vector_id, score) in zip(rows, matches)
+            if r >= 0
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store():
+    """Return the process-wide resident `VectorStore`."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = VectorStore()
+    return _store
+
 
 # Retrieve top-k similar documents
 def similarity_search(query, k=5, model="text-embedding-3-small"):
-    index, metadatas = load_vector_store()
-    query_vec = np.array(embed_texts([query], model=model)).astype("float32")
-    distances, ids = index.search(query_vec, k)
-    results = [metadatas[i] for i in ids[0]]
-    return results
+    return similarity_search_batch([query], k=k, model=model)[0]
+
+
+def similarity_search_batch(queries, k=5, model="text-embedding-3-small"):
+    """Embed all `queries` in one request and search them together."""
+    query_vecs = np.array(embed_texts(list(queries), model=model)).astype("float32")
+    return get_vector_store().search(query_vecs, k)
+
+
+def lexical_search(query, k=5):
+    return get_vector_store().search_lexical(query, k)
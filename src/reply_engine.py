@@ -6,15 +6,21 @@ low-pressure replies as HiddenClasses using structured LLM outputs.
 """
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List
 
 from dotenv import load_dotenv
-from mastodon import Mastodon
-from openai import OpenAI
 from pydantic import BaseModel
 
-from notion_api import fetch_first_row
+import tracing
+from http_client import get_openrouter_client
+from mastodon_client import get_mastodon, respect_ratelimit
+from notion_api import fetch_business_context
+from reply_ledger import DRY_RUN, EVALUATED, FAILED, FILTERED, REPLIED, ReplyLedger
+from reply_prefilter import prefilter
+from text_utils import trim_to_sentence
 
 # ---------------------------------------------------------------------
 # Environment
@@ -23,8 +29,6 @@ from notion_api import fetch_first_row
 load_dotenv(Path(__file__).parent.parent / ".env")
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-MASTODON_ACCESS_TOKEN = os.getenv("MASTODON_ACCESS_TOKEN")
-MASTODON_BASE_URL = os.getenv("MASTODON_BASE_URL")
 
 # ---------------------------------------------------------------------
 # Search configuration (HiddenClasses-specific)
@@ -42,6 +46,19 @@ SEARCH_KEYWORDS = [
 
 MAX_POSTS = 5
 MIN_RELEVANCE_SCORE = 0.6
+REPLY_CHAR_LIMIT = 400
+
+# Candidates fetched for the local pre-filter, which passes PREFILTER_TOP_N on
+SEARCH_CANDIDATES = 40
+
+# Posts per structured-output call, and how many calls run at once
+REPLY_BATCH_SIZE = int(os.getenv("REPLY_BATCH_SIZE", "5"))
+REPLY_BATCH_CONCURRENCY = int(os.getenv("REPLY_BATCH_CONCURRENCY", "3"))
+REPLY_MODEL = "nvidia/nemotron-3-nano-30b-a3b:free"
+
+# Bounded fan-out for keyword searches and reply publishing
+SEARCH_CONCURRENCY = 4
+REPLY_CONCURRENCY = 2
 
 # ---------------------------------------------------------------------
 # Structured LLM outputs
@@ -49,6 +66,7 @@ MIN_RELEVANCE_SCORE = 0.6
 
 
 class LLMResponse(BaseModel):
+    post_id: str
     response_text: str
     is_company_related: bool
     relevance_score: float
@@ -75,65 +93,80 @@ class GeneratedResponse(BaseModel):
 
 
 def get_business_context() -> str:
-    """Pull HiddenClasses description from Notion."""
-    content, _ = fetch_first_row()
-    return content
-
-
-def search_mastodon(keywords: List[str]) -> List[dict]:
-    """Search Mastodon and return unique recent posts."""
-    mastodon = Mastodon(
-        access_token=MASTODON_ACCESS_TOKEN,
-        api_base_url=MASTODON_BASE_URL,
-    )
-
+    """Pull HiddenClasses description from Notion (via the shared Notion cache)."""
+    return fetch_business_context()
+
+
+def _search_keyword(keyword: str, since_id=None) -> List[dict]:
+    mastodon = get_mastodon()
+    respect_ratelimit(mastodon)
+    results = mastodon.search(keyword, result_type="statuses", min_id=since_id)
+    return results.get("statuses", [])
+
+
+def search_mastodon(
+    keywords: List[str],
+    max_posts: int = MAX_POSTS,
+    ledger: ReplyLedger = None,
+    dry_run: bool = False,
+    fetched: dict = None,
+) -> List[dict]:
+    """
+    Search Mastodon and return unique recent posts.
+
+    Keywords are searched concurrently; results are merged and
+    deduplicated as each search completes, stopping at `max_posts`.
+    With a `ledger`, each keyword only fetches statuses newer than its
+    high-water mark and already-evaluated statuses are skipped. If given,
+    `fetched` collects {keyword: [status ids]} for advancing the marks.
+    """
     posts = []
     seen_ids = set()
 
-    for keyword in keywords:
-        results = mastodon.search(keyword, result_type="statuses")
-        statuses = results.get("statuses", [])
-
-        for status in statuses:
-            if status["id"] in seen_ids:
-                continue
-
-            seen_ids.add(status["id"])
-            posts.append(
-                {
-                    "id": str(status["id"]),
-                    "content": status["content"],
-                    "author": status["account"]["acct"],
-                    "url": status["url"],
-                }
-            )
-
-            if len(posts) >= MAX_POSTS:
-                return posts
+    pool = ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY)
+    try:
+        futures = {
+            pool.submit(_search_keyword, keyword, ledger.since_id(keyword) if ledger else None): keyword
+            for keyword in keywords
+        }
+
+        for future in as_completed(futures):
+            keyword = futures[future]
+            statuses = future.result()
+            if fetched is not None:
+                fetched[keyword] = [str(status["id"]) for status in statuses]
+
+            for status in statuses:
+                if status["id"] in seen_ids:
+                    continue
+
+                seen_ids.add(status["id"])
+                if ledger and ledger.is_known(status["id"], dry_run=dry_run):
+                    continue
+
+                posts.append(
+                    {
+                        "id": str(status["id"]),
+                        "content": status["content"],
+                        "author": status["account"]["acct"],
+                        "url": status["url"],
+                        "keyword": keyword,
+                        "language": status.get("language"),
+                        "is_boost": status.get("reblog") is not None,
+                    }
+                )
+
+                if len(posts) >= max_posts:
+                    return posts
+    finally:
+        # Don't wait for slower keywords once we have enough posts
+        pool.shutdown(wait=False, cancel_futures=True)
 
     return posts
 
 
-def generate_responses(posts: List[dict], business_context: str) -> List[GeneratedResponse]:
-    """Generate replies using structured output."""
-    if not posts:
-        return []
-
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=OPENROUTER_API_KEY,
-    )
-
-    posts_text = "\n\n".join(
-        f"Post {i + 1}:\n{p['content']}" for i, p in enumerate(posts)
-    )
-
-    completion = client.beta.chat.completions.parse(
-        model="nvidia/nemotron-3-nano-30b-a3b:free",
-        messages=[
-            {
-                "role": "system",
-                "content": f"""
+def _system_prompt(business_context: str) -> str:
+    return f"""
 You are the voice of HiddenClasses.
 
 HiddenClasses is an AI-run media project that surfaces overlooked,
@@ -149,7 +182,7 @@ Guidelines:
 - Never tell someone what they *should* do
 - Replies should feel like a thoughtful side note
 - Mention HiddenClasses only if genuinely relevant
-- Max 400 characters
+- Max {REPLY_CHAR_LIMIT} characters
 - Calm, warm, human tone
 
 For each post:
@@ -157,13 +190,27 @@ For each post:
 - Assign a relevance score (0.0–1.0)
 - Explain your reasoning briefly
 - Write the reply text
-""",
-            },
+"""
+
+
+def _generate_chunk(posts: List[dict], business_context: str, report: list) -> List[GeneratedResponse]:
+    """One structured-output call; responses are matched to posts by id."""
+    client = get_openrouter_client()
+
+    posts_text = "\n\n".join(
+        f"Post id={p['id']}:\n{p.get('text') or p['content']}" for p in posts
+    )
+
+    started = time.perf_counter()
+    completion = client.beta.chat.completions.parse(
+        model=REPLY_MODEL,
+        messages=[
+            {"role": "system", "content": _system_prompt(business_context)},
             {
                 "role": "user",
                 "content": f"""
 Generate responses for the following Mastodon posts.
-Return one response per post in order.
+Return exactly one response per post, with `post_id` set to the post's id.
 
 Posts:
 {posts_text}
@@ -172,51 +219,200 @@ Posts:
         ],
         response_format=LLMResponseBatch,
     )
+    usage = completion.usage
+    if usage:
+        tracing.count("llm_tokens", usage.total_tokens, model=REPLY_MODEL)
+    report.append(
+        {
+            "posts": len(posts),
+            "latency_s": round(time.perf_counter() - started, 3),
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0,
+        }
+    )
 
-    llm_responses = completion.choices[0].message.parsed.responses
-
-    return [
-        GeneratedResponse(
+    by_id = {p["id"]: p for p in posts}
+    responses = {}
+    for llm_resp in completion.choices[0].message.parsed.responses:
+        post = by_id.get(llm_resp.post_id.strip())
+        if post is None or post["id"] in responses:
+            continue
+        fields = llm_resp.model_dump(exclude={"post_id"})
+        fields["response_text"] = trim_to_sentence(fields["response_text"], REPLY_CHAR_LIMIT)
+        responses[post["id"]] = GeneratedResponse(
             original_post_id=post["id"],
             original_post_content=post["content"],
             original_post_author=post["author"],
-            **llm_resp.model_dump(),
+            **fields,
+        )
+    return [responses[p["id"]] for p in posts if p["id"] in responses]
+
+
+def _generate_with_recovery(
+    posts: List[dict], business_context: str, report: list, retry: bool = True
+) -> List[GeneratedResponse]:
+    """
+    Run a chunk; if the call fails or answers none of its posts, split it
+    in half and run each half on its own (a single post gets one retry).
+    Posts the model skipped are rerun as their own chunk. Posts still
+    unanswered after that are recorded in `report`.
+    """
+    try:
+        responses = _generate_chunk(posts, business_context, report)
+    except Exception as e:
+        report.append({"posts": len(posts), "error": repr(e)})
+        responses = []
+
+    answered = {r.original_post_id for r in responses}
+    missing = [p for p in posts if p["id"] not in answered]
+    if not missing:
+        return responses
+
+    if len(missing) < len(posts):
+        return responses + _generate_with_recovery(missing, business_context, report)
+    if len(posts) > 1:
+        mid = len(posts) // 2
+        return (
+            _generate_with_recovery(posts[:mid], business_context, report)
+            + _generate_with_recovery(posts[mid:], business_context, report)
         )
-        for post, llm_resp in zip(posts, llm_responses)
-    ]
+    if retry:
+        return _generate_with_recovery(posts, business_context, report, retry=False)
+
+    print(f"Giving up on post {posts[0]['id']}")
+    report.append({"posts": 1, "unanswered": [posts[0]["id"]]})
+    return []
+
+
+def generate_responses(
+    posts: List[dict],
+    business_context: str,
+    batch_size: int = REPLY_BATCH_SIZE,
+    report: list = None,
+) -> List[GeneratedResponse]:
+    """
+    Generate replies using structured output.
+
+    Posts are split into chunks of `batch_size` that run concurrently.
+    Each response carries its post id, so it can't be attached to the
+    wrong post, and a failed chunk only loses itself. If given, `report`
+    collects one {posts, latency_s, prompt_tokens, completion_tokens} (or
+    {posts, error}) entry per call, and a {posts, unanswered} entry per
+    post given up on.
+    """
+    if not posts:
+        return []
+    if report is None:
+        report = []
+
+    chunks = [posts[i:i + batch_size] for i in range(0, len(posts), batch_size)]
+    with ThreadPoolExecutor(max_workers=REPLY_BATCH_CONCURRENCY) as pool:
+        results = pool.map(
+            lambda chunk: _generate_with_recovery(chunk, business_context, report), chunks
+        )
+        return [resp for chunk_responses in results for resp in chunk_responses]
+
+
+def format_generation_report(report: list) -> str:
+    calls = [r for r in report if "latency_s" in r]
+    errors = sum("error" in r for r in report)
+    unanswered = sum(len(r.get("unanswered", ())) for r in report)
+    prompt = sum(r["prompt_tokens"] for r in calls)
+    completion = sum(r["completion_tokens"] for r in calls)
+    latencies = ", ".join(f"{r['latency_s']:.1f}s" for r in calls)
+    return (
+        f"{len(calls)} LLM calls ({errors} failed), "
+        f"{prompt} prompt + {completion} completion tokens, {unanswered} posts unanswered; "
+        f"latency per chunk: {latencies}"
+    )
 
 
 def post_reply(response: GeneratedResponse):
     """Post a reply to Mastodon."""
-    mastodon = Mastodon(
-        access_token=MASTODON_ACCESS_TOKEN,
-        api_base_url=MASTODON_BASE_URL,
-    )
+    mastodon = get_mastodon()
+    respect_ratelimit(mastodon)
 
     return mastodon.status_post(
         response.response_text,
         in_reply_to_id=int(response.original_post_id),
     )
 
+
+def publish_replies(responses: List[GeneratedResponse]) -> List[tuple]:
+    """
+    Publish replies with at most REPLY_CONCURRENCY in flight.
+
+    Returns (response, status or exception) pairs in completion order.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=REPLY_CONCURRENCY) as pool:
+        futures = {pool.submit(post_reply, resp): resp for resp in responses}
+        for future in as_completed(futures):
+            try:
+                results.append((futures[future], future.result()))
+            except Exception as e:
+                results.append((futures[future], e))
+    return results
+
+@tracing.trace_run("replies")
 def main(post_replies: bool = False):
     print("Loading HiddenClasses context from Notion...")
-    business_context = get_business_context()
+    with tracing.span("notion"):
+        business_context = get_business_context()
+
+    ledger = ReplyLedger()
+    fetched = {}
 
     print("Searching Mastodon...")
-    posts = search_mastodon(SEARCH_KEYWORDS)
-    print(f"Found {len(posts)} posts")
+    with tracing.span("mastodon_search"):
+        candidates = search_mastodon(
+            SEARCH_KEYWORDS,
+            max_posts=SEARCH_CANDIDATES,
+            ledger=ledger,
+            dry_run=not post_replies,
+            fetched=fetched,
+        )
+    print(f"Found {len(candidates)} new posts")
+    tracing.count("reply_candidates", len(candidates))
+
+    with tracing.span("prefilter"):
+        posts, dropped = prefilter(candidates, business_context)
+    # Dry-run drops only hide posts from other dry runs, as for evaluations
+    for post in dropped:
+        ledger.record(
+            post["id"], post["keyword"], post["author"], post.get("similarity"),
+            FILTERED if post_replies else DRY_RUN,
+        )
+    print(f"Pre-filter kept {len(posts)} posts for the LLM ({len(dropped)} dropped)")
 
     if not posts:
         print("No posts found.")
+        if post_replies:
+            for keyword, status_ids in fetched.items():
+                ledger.advance(keyword, status_ids)
         return
 
     print("Generating replies with LLM...")
-    responses = generate_responses(posts, business_context)
+    report = []
+    with tracing.span("generate_replies"):
+        responses = generate_responses(posts, business_context, report=report)
+    print(format_generation_report(report))
+
+    keywords = {p["id"]: p["keyword"] for p in posts}
+    for resp in responses:
+        ledger.record(
+            resp.original_post_id,
+            keywords.get(resp.original_post_id),
+            resp.original_post_author,
+            resp.relevance_score,
+            EVALUATED if post_replies else DRY_RUN,
+        )
 
     print("\n" + "=" * 60)
     print("GENERATED REPLIES")
     print("=" * 60)
 
+    to_post = []
     for resp in responses:
         print(f"\n→ Replying to @{resp.original_post_author}")
         print(f"Relevance: {resp.relevance_score:.2f}")
@@ -229,9 +425,23 @@ def main(post_replies: bool = False):
             and resp.relevance_score >= MIN_RELEVANCE_SCORE
             and resp.response_text.strip()
         ):
-            print("Posting reply...")
-            result = post_reply(resp)
-            print(f"Posted: {result['url']}")
+            to_post.append(resp)
+
+    if to_post:
+        print(f"\nPosting {len(to_post)} replies...")
+        with tracing.span("publish_replies"):
+            results = publish_replies(to_post)
+        for resp, result in results:
+            if isinstance(result, Exception):
+                ledger.set_reply_status(resp.original_post_id, FAILED)
+                print(f"Failed to reply to @{resp.original_post_author}: {result!r}")
+            else:
+                ledger.set_reply_status(resp.original_post_id, REPLIED, result["url"])
+                print(f"Posted: {result['url']}")
+
+    if post_replies:
+        for keyword, status_ids in fetched.items():
+            ledger.advance(keyword, status_ids)
 
     if not post_replies:
         print("\nDRY RUN — no replies posted.")
@@ -0,0 +1,111 @@
+"""
+reply_ledger.py
+
+Persistent record of every Mastodon status the reply engine has
+evaluated (score and reply status), plus a per-keyword high-water mark so
+later scans only fetch newer statuses. Known ids are also held in memory,
+so filtering candidates before the LLM costs no queries.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+REPLY_LEDGER_FILE = os.getenv("REPLY_LEDGER_FILE", "reply_ledger.sqlite")
+
+EVALUATED = "evaluated"
+DRY_RUN = "dry_run"
+FILTERED = "filtered"
+REPLIED = "replied"
+FAILED = "failed"
+
+
+class ReplyLedger:
+    def __init__(self, path=REPLY_LEDGER_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS statuses (
+                id TEXT PRIMARY KEY,
+                keyword TEXT,
+                author TEXT,
+                relevance_score REAL,
+                reply_status TEXT NOT NULL,
+                reply_url TEXT,
+                evaluated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS keyword_marks (
+                keyword TEXT PRIMARY KEY,
+                since_id TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self._known = dict(self._conn.execute("SELECT id, reply_status FROM statuses"))
+
+    def is_known(self, status_id, dry_run=False):
+        """
+        True if the status was already evaluated. Dry-run evaluations only
+        count for other dry runs, so a later `--post` run can still reply.
+        """
+        reply_status = self._known.get(str(status_id))
+        if reply_status is None:
+            return False
+        return dry_run or reply_status != DRY_RUN
+
+    def record(self, status_id, keyword, author, relevance_score, reply_status, reply_url=None):
+        status_id = str(status_id)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO statuses "
+                "(id, keyword, author, relevance_score, reply_status, reply_url, evaluated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (status_id, keyword, author, relevance_score, reply_status, reply_url, time.time()),
+            )
+            self._conn.commit()
+            self._known[status_id] = reply_status
+
+    def set_reply_status(self, status_id, reply_status, reply_url=None):
+        status_id = str(status_id)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE statuses SET reply_status = ?, reply_url = ? WHERE id = ?",
+                (reply_status, reply_url, status_id),
+            )
+            self._conn.commit()
+            self._known[status_id] = reply_status
+
+    def since_id(self, keyword):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT since_id FROM keyword_marks WHERE keyword = ?", (keyword,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def advance(self, keyword, fetched_ids):
+        """
+        Move `keyword`'s high-water mark over the fetched ids that are now
+        in the ledger. It stops at the first unevaluated id (e.g. one cut
+        off by MAX_POSTS), so that status is fetched again next time.
+        """
+        mark = None
+        for status_id in sorted(fetched_ids, key=int):
+            if not self.is_known(status_id):
+                break
+            mark = status_id
+        if mark is None:
+            return
+
+        with self._lock:
+            current = self._conn.execute(
+                "SELECT since_id FROM keyword_marks WHERE keyword = ?", (keyword,)
+            ).fetchone()
+            if current is None or int(mark) > int(current[0]):
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO keyword_marks (keyword, since_id) VALUES (?, ?)",
+                    (keyword, str(mark)),
+                )
+                self._conn.commit()
@@ -0,0 +1,100 @@
+"""
+reply_prefilter.py
+
+Cheap local stage in front of LLM scoring in the reply engine. Candidates
+are reduced to plain text; boosts, non-target languages and
+near-duplicates are dropped; the rest are ranked by embedding similarity
+to the HiddenClasses business context, and only the top-N above a
+threshold go on to the LLM.
+"""
+
+import os
+from typing import List, Tuple
+
+from text_utils import is_near_duplicate, simhash, strip_html
+
+TARGET_LANGUAGES = set(os.getenv("REPLY_LANGUAGES", "en").split(","))
+PREFILTER_MIN_SIMILARITY = float(os.getenv("PREFILTER_MIN_SIMILARITY", "0.25"))
+PREFILTER_TOP_N = int(os.getenv("PREFILTER_TOP_N", "5"))
+MIN_TEXT_LENGTH = 20
+
+
+def _cosine(query, matrix):
+    import numpy as np
+
+    query = query / (np.linalg.norm(query) or 1.0)
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    return matrix @ query / norms
+
+
+def prefilter(
+    posts: List[dict],
+    business_context: str,
+    top_n: int = PREFILTER_TOP_N,
+    min_similarity: float = PREFILTER_MIN_SIMILARITY,
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Return (kept, dropped). Kept posts gain `text` (plain text) and
+    `similarity`, best first. Dropped posts carry a `drop_reason`;
+    posts that pass every filter but miss the top-N are in neither list,
+    so they can be considered again on a later run.
+
+    Without a business context to rank against, or when the embedding
+    call fails, the first `top_n` candidates are kept unranked.
+    """
+    dropped = []
+    candidates = []
+    fingerprints = []
+
+    for post in posts:
+        text = strip_html(post["content"])
+        reason = None
+        if post.get("is_boost"):
+            reason = "boost"
+        elif post.get("language") and post["language"] not in TARGET_LANGUAGES:
+            reason = "language"
+        elif len(text) < MIN_TEXT_LENGTH:
+            reason = "too_short"
+        else:
+            fingerprint = simhash(text)
+            if is_near_duplicate(fingerprint, fingerprints):
+                reason = "near_duplicate"
+            fingerprints.append(fingerprint)
+
+        if reason:
+            dropped.append({**post, "text": text, "drop_reason": reason})
+        else:
+            candidates.append({**post, "text": text})
+
+    if not candidates:
+        return [], dropped
+    if not business_context.strip():
+        print("No business context to rank posts against; skipping similarity ranking")
+        return candidates[:top_n], dropped
+
+    # numpy and the embedding client load on first use, not at import
+    import numpy as np
+    import openai
+
+    from rag.embeddings import embed_texts
+
+    try:
+        vectors = np.asarray(
+            embed_texts([business_context] + [c["text"] for c in candidates]), dtype=np.float32
+        )
+    except openai.OpenAIError as e:
+        print(f"Embedding posts failed ({e!r}); passing {top_n} unranked posts on")
+        return candidates[:top_n], dropped
+    similarities = _cosine(vectors[0], vectors[1:])
+
+    ranked = sorted(zip(similarities, candidates), key=lambda x: x[0], reverse=True)
+    kept = []
+    for similarity, post in ranked:
+        post["similarity"] = float(similarity)
+        if similarity < min_similarity:
+            dropped.append({**post, "drop_reason": "low_similarity"})
+        elif len(kept) < top_n:
+            kept.append(post)
+
+    return kept, dropped
@@ -0,0 +1,264 @@
+"""
+review_store.py
+
+Persistent state machine for drafts under human review, keyed by the
+Telegram message id of the review message:
+
+    pending -> approved -> publishing -> published | failed
+    pending -> awaiting_reason -> rejected
+
+Drafts generated ahead of time wait in a `ready` queue until a reviewer
+slot frees up; sending one for review moves it into the state machine.
+
+It also keeps the Telegram `getUpdates` offset, so a single update
+consumer can resume without replaying or skipping updates.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import tracing
+
+REVIEW_DB_FILE = os.getenv("REVIEW_DB_FILE", "reviews.sqlite")
+
+PENDING = "pending"
+AWAITING_REASON = "awaiting_reason"
+APPROVED = "approved"
+REJECTED = "rejected"
+PUBLISHING = "publishing"
+PUBLISHED = "published"
+FAILED = "failed"
+
+DECIDED = (APPROVED, PUBLISHING, PUBLISHED, FAILED, REJECTED)
+
+
+class ReviewStore:
+    def __init__(self, path=REVIEW_DB_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS drafts (
+                message_id INTEGER PRIMARY KEY,
+                post_text TEXT NOT NULL,
+                image_path TEXT,
+                state TEXT NOT NULL,
+                reason TEXT,
+                prompt_message_id INTEGER,
+                status_url TEXT,
+                error TEXT,
+                media_id TEXT,
+                blurhash TEXT,
+                page_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS drafts_state ON drafts (state);
+            CREATE TABLE IF NOT EXISTS ready (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                page_id TEXT,
+                post_text TEXT NOT NULL,
+                image_path TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        for column in ("media_id", "blurhash", "page_id"):
+            try:
+                # Review stores created before images were uploaded during
+                # review, or before drafts recorded their Notion row
+                self._conn.execute(f"ALTER TABLE drafts ADD COLUMN {column} TEXT")
+            except sqlite3.OperationalError:
+                pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS drafts_page ON drafts (page_id)")
+        self._conn.commit()
+
+    def add_draft(self, message_id, post_text, image_path=None, page_id=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO drafts "
+                "(message_id, post_text, image_path, page_id, state, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (message_id, post_text, str(image_path) if image_path else None, page_id,
+                 PENDING, now, now),
+            )
+            self._conn.commit()
+
+    def get(self, message_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM drafts WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find(self, state=None, prompt_message_id=None):
+        """Drafts in `state` (and/or with a given reason prompt), oldest first."""
+        clauses, params = [], []
+        if state is not None:
+            clauses.append("state = ?")
+            params.append(state)
+        if prompt_message_id is not None:
+            clauses.append("prompt_message_id = ?")
+            params.append(prompt_message_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM drafts {where} ORDER BY created_at", params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def transition(self, message_id, from_states, to_state, **fields):
+        """
+        Move a draft to `to_state` if it is currently in one of
+        `from_states`. Returns False if it was not (already handled, or
+        claimed by another worker).
+        """
+        assignments = ", ".join(f"{name} = ?" for name in ["state", "updated_at", *fields])
+        placeholders = ",".join("?" * len(from_states))
+        with self._lock:
+            cur = self._conn.execute(
+                f"UPDATE drafts SET {assignments} "
+                f"WHERE message_id = ? AND state IN ({placeholders})",
+                [to_state, time.time(), *fields.values(), message_id, *from_states],
+            )
+            self._conn.commit()
+        return cur.rowcount == 1
+
+    def set_media(self, message_id, media_id, blurhash=None):
+        """Record the Mastodon media uploaded for a draft under review."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE drafts SET media_id = ?, blurhash = ?, updated_at = ? WHERE message_id = ?",
+                (media_id, blurhash, time.time(), message_id),
+            )
+            self._conn.commit()
+
+    def enqueue_ready(self, post_text, image_path=None, page_id=None):
+        """Add a generated draft to the queue of drafts awaiting review."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ready (page_id, post_text, image_path, created_at) VALUES (?, ?, ?, ?)",
+                (page_id, post_text, str(image_path) if image_path else None, time.time()),
+            )
+            self._conn.commit()
+
+    def was_rejected(self, page_id):
+        """True if a draft for the Notion row `page_id` was rejected in review."""
+        if not page_id:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM drafts WHERE page_id = ? AND state = ? LIMIT 1", (page_id, REJECTED)
+            ).fetchone()
+        return row is not None
+
+    def image_paths_in_use(self):
+        """Images of queued drafts and of drafts not yet published or rejected."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT image_path FROM ready UNION "
+                "SELECT image_path FROM drafts WHERE state IN (?, ?, ?, ?)",
+                (PENDING, AWAITING_REASON, APPROVED, PUBLISHING),
+            ).fetchall()
+        return {row[0] for row in rows if row[0]}
+
+    def drafted_page_ids(self):
+        """Notion rows with a draft queued, in review or already decided."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page_id FROM ready UNION SELECT page_id FROM drafts"
+            ).fetchall()
+        return {row[0] for row in rows if row[0]}
+
+    def active_page_ids(self):
+        """
+        Notion rows with a draft queued, in review, being published or
+        published; rows whose drafts were all rejected or failed may be
+        drafted again.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page_id FROM ready UNION "
+                "SELECT page_id FROM drafts WHERE state IN (?, ?, ?, ?, ?)",
+                (PENDING, AWAITING_REASON, APPROVED, PUBLISHING, PUBLISHED),
+            ).fetchall()
+        return {row[0] for row in rows if row[0]}
+
+    def ready_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ready").fetchone()[0]
+
+    def next_ready(self):
+        """The oldest ready draft, or None. Remove it once it has been sent."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM ready ORDER BY id LIMIT 1"
+            ).fetchone()
+        return dict(row) if row else None
+
+    def remove_ready(self, ready_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM ready WHERE id = ?", (ready_id,))
+            self._conn.commit()
+
+    def state_counts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM drafts GROUP BY state"
+            ).fetchall()
+        return {state: n for state, n in rows}
+
+    def in_review_count(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM drafts WHERE state IN (?, ?)", (PENDING, AWAITING_REASON)
+            ).fetchone()[0]
+
+    def get_offset(self):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = 'telegram_offset'"
+            ).fetchone()
+        return int(row[0]) if row else None
+
+    def set_offset(self, offset):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value) VALUES ('telegram_offset', ?)",
+                (str(offset),),
+            )
+            self._conn.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_review_store():
+    """Return the process-wide `ReviewStore`."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReviewStore()
+    return _store
+
+
+@tracing.register_collector
+def _review_metrics():
+    if _store is None:
+        return []
+    counts = _store.state_counts()
+    return [("gauge", "ready_drafts", {}, _store.ready_count())] + [
+        ("gauge", "drafts", {"state": state}, counts.get(state, 0))
+        for state in (PENDING, AWAITING_REASON, APPROVED, PUBLISHING)
+    ]
@@ -0,0 +1,159 @@
+"""
+review_worker.py
+
+Single consumer for Telegram review updates. It long-polls `getUpdates`
+from the persisted offset, moves drafts through the review state machine
+and publishes approved drafts to Mastodon. It also feeds pre-generated
+drafts from the ready queue into review, keeping at most
+REVIEW_MAX_PENDING in front of reviewers. Generation never waits on it.
+
+A draft's image is processed and uploaded to Mastodon in the background
+as soon as the draft is sent for review, so publishing an approved draft
+is a single `status_post` with the stored media id.
+
+    python review_worker.py
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mastodon_client import is_media_missing, publish_post, upload_media
+from notion_api import mark_posted
+from review_store import (
+    APPROVED,
+    AWAITING_REASON,
+    FAILED,
+    PUBLISHED,
+    PUBLISHING,
+    REJECTED,
+    get_review_store,
+)
+from telegram_client import UpdatePoller, send_review_message
+
+REVIEW_MAX_PENDING = int(os.getenv("REVIEW_MAX_PENDING", "1"))
+
+MEDIA_PREUPLOAD = os.getenv("MEDIA_PREUPLOAD", "1") == "1"
+
+_send_lock = threading.Lock()
+_upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="media-upload")
+_uploads = {}
+
+
+def _upload_for_draft(message_id, image_path):
+    media = upload_media(image_path)
+    get_review_store().set_media(message_id, media["id"], media["blurhash"])
+    return media["id"]
+
+
+def start_media_upload(message_id, image_path):
+    """Upload a draft's image in the background while it is under review."""
+    if MEDIA_PREUPLOAD and image_path:
+        _uploads[message_id] = _upload_pool.submit(_upload_for_draft, message_id, image_path)
+
+
+def send_for_review(post_text, image_path=None, page_id=None):
+    """Send a draft to Telegram review and start uploading its image."""
+    message_id = send_review_message(post_text, image_path=image_path, page_id=page_id)
+    start_media_upload(message_id, image_path)
+    return message_id
+
+
+def _forget_upload(message_id):
+    """Drop a draft's background upload once the draft no longer needs it."""
+    upload = _uploads.pop(message_id, None)
+    if upload is not None:
+        upload.cancel()
+
+
+def discard_rejected_uploads(message_ids, store=None):
+    """Forget the background uploads of drafts among `message_ids` that were rejected."""
+    store = store or get_review_store()
+    for message_id in message_ids:
+        draft = store.get(message_id)
+        if draft and draft["state"] in (AWAITING_REASON, REJECTED):
+            _forget_upload(message_id)
+
+
+def _media_id_for(draft):
+    """The pre-uploaded media id, waiting for an upload still in flight."""
+    upload = _uploads.pop(draft["message_id"], None)
+    if upload is not None:
+        try:
+            return upload.result()
+        except Exception as e:
+            print(f"⚠️ Background upload for draft {draft['message_id']} failed: {e!r}")
+            return None
+    return draft.get("media_id")
+
+
+def publish_draft(store, draft):
+    """Publish one approved draft; returns True if this call published it."""
+    message_id = draft["message_id"]
+    if not store.transition(message_id, [APPROVED], PUBLISHING):
+        return False  # claimed by another worker
+
+    try:
+        media_id = _media_id_for(draft)
+        try:
+            status = publish_post(
+                draft["post_text"], image_path=draft["image_path"], media_id=media_id
+            )
+        except Exception as e:
+            # Only when Mastodon refused the media: any other error (a
+            # timeout, a 5xx) may come after the status was created
+            if media_id is None or not is_media_missing(e):
+                raise
+            # Mastodon drops unattached media after a while; upload again
+            status = publish_post(draft["post_text"], image_path=draft["image_path"])
+    except Exception as e:
+        _forget_upload(message_id)
+        store.transition(message_id, [PUBLISHING], FAILED, error=repr(e))
+        print(f"❌ Publishing draft {message_id} failed: {e!r}")
+        return False
+
+    store.transition(message_id, [PUBLISHING], PUBLISHED, status_url=status.get("url"))
+    print(f"✅ Draft {message_id} published")
+    try:
+        mark_posted(draft.get("page_id"))
+    except Exception as e:
+        # The status is out; a stale flag only means the row may be drafted again
+        print(f"⚠️ Could not mark Notion row {draft.get('page_id')} as posted: {e!r}")
+    return True
+
+
+def publish_approved(record_stage=None):
+    """Publish every approved draft. Returns the number published."""
+    store = get_review_store()
+    return sum(publish_draft(store, draft) for draft in store.find(state=APPROVED))
+
+
+def send_ready_for_review(max_pending=REVIEW_MAX_PENDING):
+    """Send queued drafts to Telegram while fewer than `max_pending` are in review."""
+    store = get_review_store()
+    sent = 0
+    with _send_lock:
+        while store.in_review_count() < max_pending:
+            draft = store.next_ready()
+            if draft is None:
+                break
+            send_for_review(
+                draft["post_text"], image_path=draft["image_path"], page_id=draft["page_id"]
+            )
+            store.remove_ready(draft["id"])
+            sent += 1
+    return sent
+
+
+def run():
+    store = get_review_store()
+    poller = UpdatePoller(store)
+    print("Waiting for review decisions...")
+    while True:
+        send_ready_for_review()
+        discard_rejected_uploads(poller.poll(), store)
+        publish_approved()
+
+
+if __name__ == "__main__":
+    run()
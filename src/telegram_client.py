@@ -1,16 +1,60 @@
 import os
 import time
+from functools import lru_cache
+
 import requests
 
-BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
-CHAT_ID = os.environ["TELEGRAM_CHAT_ID"]
-BASE_URL = f"https://api.telegram.org/bot{BOT_TOKEN}"
+import http_client
+
+from review_store import (
+    APPROVED,
+    AWAITING_REASON,
+    DECIDED,
+    PENDING,
+    REJECTED,
+    get_review_store,
+)
+
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+# Registered with setWebhook; Telegram echoes it in the
+# X-Telegram-Bot-Api-Secret-Token header of every webhook call
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+# Polling loops call getUpdates at most this often (seconds) while nothing
+# changes, and back off exponentially up to POLL_BACKOFF_MAX after errors
+# (e.g. 409 while a webhook is set, 401 for a bad token, 5xx)
+POLL_INTERVAL = 1.0
+POLL_BACKOFF_MAX = 60.0
+
+
+@lru_cache(maxsize=None)
+def _bot():
+    """(base_url, chat_id), read from the environment on first use."""
+    token = os.environ["TELEGRAM_BOT_TOKEN"]
+    return f"{TELEGRAM_API_URL}/bot{token}", os.environ["TELEGRAM_CHAT_ID"]
+
+
+def _url(method):
+    return f"{_bot()[0]}/{method}"
+
+
+def _chat_id():
+    return _bot()[1]
+
+
+def send_message(text, **extra):
+    res = http_client.post(
+        _url("sendMessage"),
+        json={"chat_id": _chat_id(), "text": text, **extra},
+        endpoint="telegram.sendMessage",
+    )
+    res.raise_for_status()
+    return res.json()["result"]["message_id"]
 
 
-def send_review_message(post_text: str) -> int:
-    """Send post for approval with inline buttons."""
+def send_review_message(post_text: str, image_path=None, page_id=None) -> int:
+    """Send post for approval with inline buttons and register it as a pending draft."""
     payload = {
-        "chat_id": CHAT_ID,
+        "chat_id": _chat_id(),
         "text": f"📝 *Post Review*\n\n{post_text}",
         "parse_mode": "Markdown",
         "reply_markup": {
@@ -23,79 +67,201 @@ def send_review_message(post_text: str) -> int:
         },
     }
 
-    res = requests.post(f"{BASE_URL}/sendMessage", json=payload)
+    res = http_client.post(
+        _url("sendMessage"), json=payload, endpoint="telegram.sendMessage"
+    )
     res.raise_for_status()
-    return res.json()["result"]["message_id"]
+    message_id = res.json()["result"]["message_id"]
+    get_review_store().add_draft(message_id, post_text, image_path, page_id=page_id)
+    return message_id
 
 
-def get_updates(offset=None):
-    params = {"timeout": 30}
+def get_updates(offset=None, timeout=30):
+    params = {"timeout": timeout}
     if offset is not None:
         params["offset"] = offset
-    return requests.get(f"{BASE_URL}/getUpdates", params=params).json()
+    res = http_client.get(
+        _url("getUpdates"),
+        params=params,
+        endpoint="telegram.getUpdates",
+        # Long poll: the read timeout must outlast Telegram's own timeout
+        timeout=(http_client.HTTP_CONNECT_TIMEOUT, timeout + 10),
+    )
+    res.raise_for_status()
+    data = res.json()
+    if not data.get("ok"):
+        raise requests.HTTPError(f"getUpdates failed: {data.get('description')}", response=res)
+    return data
 
 
-def wait_for_decision():
-    """Block until user approves or rejects."""
-    last_update_id = None
+def set_webhook(url):
+    """Point the bot at `url`, with TELEGRAM_WEBHOOK_SECRET as its secret token."""
+    if not TELEGRAM_WEBHOOK_SECRET:
+        raise RuntimeError("TELEGRAM_WEBHOOK_SECRET must be set to register a webhook")
+    res = http_client.post(
+        _url("setWebhook"),
+        json={"url": url, "secret_token": TELEGRAM_WEBHOOK_SECRET},
+        endpoint="telegram.setWebhook",
+        idempotent=True,
+    )
+    res.raise_for_status()
+    return res.json()
 
-    while True:
-        updates = get_updates(last_update_id)
-
-        for update in updates.get("result", []):
-            last_update_id = update["update_id"] + 1
-
-            # Button click
-            if "callback_query" in update:
-                callback = update["callback_query"]
-                action = callback["data"]
-
-                # Acknowledge button click
-                requests.post(
-                    f"{BASE_URL}/answerCallbackQuery",
-                    json={"callback_query_id": callback["id"]},
-                )
-
-                if action == "approve":
-                    requests.post(
-                        f"{BASE_URL}/sendMessage",
-                        json={
-                            "chat_id": CHAT_ID,
-                            "text": "✅ Post approved.",
-                        },
-                    )
-                    return {"decision": "approve"}
-                    
-
-                if action == "reject":
-                    reason = ask_rejection_reason()
-                    return {
-                        "decision": "reject",
-                        "reason": reason,
-                    }
-
-        time.sleep(1)
-
-
-def ask_rejection_reason() -> str:
-    """Ask user for rejection reason."""
-    requests.post(
-        f"{BASE_URL}/sendMessage",
-        json={
-            "chat_id": CHAT_ID,
-            "text": "❌ Please reply with a short reason for rejection.",
-        },
+
+def _from_review_chat(message):
+    return str((message.get("chat") or {}).get("id")) == str(_chat_id())
+
+
+def _answer_callback(callback, text=None):
+    payload = {"callback_query_id": callback["id"]}
+    if text:
+        payload["text"] = text
+    http_client.post(
+        _url("answerCallbackQuery"),
+        json=payload,
+        endpoint="telegram.answerCallbackQuery",
+        idempotent=True,
     )
 
-    last_update_id = None
 
-    while True:
-        updates = get_updates(last_update_id)
+def _handle_callback(store, callback):
+    message = callback.get("message") or {}
+    if not _from_review_chat(message):
+        return None
+    message_id = message.get("message_id")
+    action = callback.get("data")
+    draft = store.get(message_id) if message_id is not None else None
 
-        for update in updates.get("result", []):
-            last_update_id = update["update_id"] + 1
+    if draft is None or draft["state"] != PENDING:
+        _answer_callback(callback, "This draft was already handled.")
+        return None
 
-            if "message" in update and update["message"].get("text"):
-                return update["message"]["text"]
+    _answer_callback(callback)
 
-        time.sleep(1)
+    if action == "approve" and store.transition(message_id, [PENDING], APPROVED):
+        send_message("✅ Post approved.", reply_to_message_id=message_id)
+        return message_id
+
+    if action == "reject" and store.transition(message_id, [PENDING], AWAITING_REASON):
+        prompt_id = ask_rejection_reason(message_id)
+        store.transition(
+            message_id, [AWAITING_REASON], AWAITING_REASON, prompt_message_id=prompt_id
+        )
+        return message_id
+
+    return None
+
+
+def _handle_text(store, message):
+    """A text message is the rejection reason for the draft it replies to,
+    or else for the oldest draft still waiting for one."""
+    replied = (message.get("reply_to_message") or {}).get("message_id")
+    drafts = []
+    if replied is not None:
+        drafts = store.find(prompt_message_id=replied) or [
+            d for d in [store.get(replied)] if d
+        ]
+    if not drafts:
+        drafts = store.find(state=AWAITING_REASON)
+
+    for draft in drafts:
+        if store.transition(
+            draft["message_id"], [AWAITING_REASON], REJECTED, reason=message["text"]
+        ):
+            return draft["message_id"]
+    return None
+
+
+def handle_update(update, store=None):
+    """
+    Dispatch one Telegram update to the draft it belongs to.
+
+    Used by both the long-poller and the webhook endpoint. Returns the
+    message id of the draft whose state changed, if any.
+    """
+    store = store or get_review_store()
+
+    if "callback_query" in update:
+        return _handle_callback(store, update["callback_query"])
+
+    message = update.get("message") or {}
+    if message.get("text") and _from_review_chat(message):
+        return _handle_text(store, message)
+
+    return None
+
+
+def poll_updates(store=None, timeout=30):
+    """
+    Long-poll `getUpdates` once from the persisted offset and dispatch the
+    results. The offset is saved after each update, so no update is
+    consumed twice or skipped across restarts.
+    """
+    store = store or get_review_store()
+    updates = get_updates(store.get_offset(), timeout=timeout)
+
+    changed = []
+    for update in updates.get("result", []):
+        message_id = handle_update(update, store)
+        if message_id is not None:
+            changed.append(message_id)
+        store.set_offset(update["update_id"] + 1)
+    return changed
+
+
+class UpdatePoller:
+    """
+    `poll_updates` for loops: a call that changed nothing returns no sooner
+    than POLL_INTERVAL after it started, and a failed one is logged and
+    followed by an exponential backoff instead of raising.
+    """
+
+    def __init__(self, store=None, timeout=30):
+        self.store = store or get_review_store()
+        self.timeout = timeout
+        self.failures = 0
+
+    def poll(self):
+        """Message ids of the drafts whose state changed ([] after an error)."""
+        started = time.monotonic()
+        try:
+            changed = poll_updates(self.store, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.failures += 1
+            delay = min(POLL_BACKOFF_MAX, POLL_INTERVAL * 2 ** self.failures)
+            print(f"⚠️ Polling Telegram failed ({e}); retrying in {delay:.0f}s")
+            time.sleep(delay)
+            return []
+        self.failures = 0
+        if not changed:
+            time.sleep(max(0.0, POLL_INTERVAL - (time.monotonic() - started)))
+        return changed
+
+
+def decision_for(draft):
+    """The {"decision", "reason"} view of a decided draft (None if undecided)."""
+    if draft is None or draft["state"] not in DECIDED:
+        return None
+    if draft["state"] == REJECTED:
+        return {"decision": "reject", "reason": draft["reason"]}
+    return {"decision": "approve"}
+
+
+def wait_for_decision(message_id):
+    """Block until the given draft is approved or rejected (CLI use)."""
+    store = get_review_store()
+    poller = UpdatePoller(store)
+    while True:
+        decision = decision_for(store.get(message_id))
+        if decision is not None:
+            return decision
+        poller.poll()
+
+
+def ask_rejection_reason(message_id) -> int:
+    """Ask user for rejection reason; returns the prompt's message id."""
+    return send_message(
+        "❌ Please reply to this message with a short reason for rejection.",
+        reply_to_message_id=message_id,
+        reply_markup={"force_reply": True},
+    )
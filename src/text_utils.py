@@ -0,0 +1,87 @@
+"""
+text_utils.py
+
+Small text helpers shared by the reply engine, post generation and RAG
+ingest: HTML to plain text, length trimming at sentence boundaries, and
+SimHash fingerprints for near-duplicate detection.
+"""
+
+import hashlib
+import re
+from html.parser import HTMLParser
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Block-level tags that should separate words when stripped
+_BREAK_TAGS = {"br", "p", "div", "li"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _BREAK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def strip_html(html: str) -> str:
+    """Plain text of a Mastodon status' HTML content."""
+    parser = _TextExtractor()
+    parser.feed(html or "")
+    parser.close()
+    text = "".join(parser.parts)
+    return re.sub(r"[ \t]+", " ", re.sub(r"\n\s*\n+", "\n", text)).strip()
+
+
+_SENTENCE_END_RE = re.compile(r"[.!?…](?=\s|$)|\n")
+
+
+def trim_to_sentence(text: str, limit: int) -> str:
+    """
+    Trim `text` to at most `limit` characters, cutting after the last full
+    sentence that fits. If that would drop more than half the budget, cut
+    at the last word boundary and add an ellipsis instead.
+    """
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+
+    head = text[:limit]
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(head)]
+    if ends and ends[-1] >= limit // 2:
+        return head[:ends[-1]].strip()
+
+    head = text[:limit - 1]
+    if " " in head:
+        head = head.rsplit(" ", 1)[0]
+    return head.rstrip(" ,;:-") + "…"
+
+
+def _shingles(text, size=3):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles."""
+    weights = [0] * 64
+    for shingle in _shingles(text):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def is_near_duplicate(fingerprint: int, seen, max_distance: int = 3) -> bool:
+    return any(hamming(fingerprint, other) <= max_distance for other in seen)
@@ -0,0 +1,291 @@
+"""
+tracing.py
+
+Lightweight in-process instrumentation:
+
+- `span(name)` times a pipeline stage or external call into the
+  `stage_seconds` histogram;
+- `count(name, n)` bumps a counter (tokens, bytes, cache results);
+- `register_collector(fn)` adds samples computed at scrape time (cache
+  hit rates, queue depths, the HTTP latency histograms);
+- `trace_run(name)` groups the spans and counters of one pipeline run
+  and writes them as a single JSON log line when the run ends.
+
+`render_prometheus()` exports everything in the Prometheus text format.
+With TRACING_ENABLED=0, spans and counters are no-ops and no run logs
+are written; collectors still answer scrapes.
+
+Runs are tracked through a context variable, so spans in worker threads
+(e.g. embedding batches) count towards the metrics but not the run log.
+"""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+# "-" writes run logs to stderr, an empty value disables them
+TRACE_LOG = os.getenv("TRACE_LOG", "-")
+METRIC_PREFIX = "hiddenclasses"
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+        self.errors += bool(error)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS], self.counts)),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_collectors = []
+_current_run = contextvars.ContextVar("trace_run", default=None)
+_NOOP = nullcontext()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+# ---------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------
+
+
+class Run:
+    def __init__(self, name, fields):
+        self.name = name
+        self.id = uuid.uuid4().hex[:12]
+        self.fields = fields
+        self.started = time.time()
+        self.spans = []
+        self.counters = {}
+        self.calls = {}
+        self.error = None
+
+
+def observe(name, seconds, error=False, **labels):
+    """Add one observation to the histogram `name` with `labels`."""
+    if not TRACING_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = LatencyHistogram()
+        hist.observe(seconds, error)
+
+
+def record_span(name, seconds, error=False):
+    """Record a stage duration measured elsewhere (e.g. time to first token)."""
+    if not TRACING_ENABLED:
+        return
+    observe("stage_seconds", seconds, error, stage=name)
+    run = _current_run.get()
+    if run is not None:
+        run.spans.append({"name": name, "duration_s": round(seconds, 4), "error": error})
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_span(self.name, time.perf_counter() - self.started, error=exc_type is not None)
+        return False
+
+
+def span(name):
+    """Context manager timing the stage `name`."""
+    return _Span(name) if TRACING_ENABLED else _NOOP
+
+
+def count(name, value=1, **labels):
+    """Add `value` to the counter `name` (exported as `<name>_total`)."""
+    if not TRACING_ENABLED or not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    run = _current_run.get()
+    if run is not None:
+        run.counters[name] = run.counters.get(name, 0) + value
+
+
+def note_call(endpoint, seconds, error=False):
+    """Attribute an external call to the current run's log (metrics are kept by the caller)."""
+    if not TRACING_ENABLED:
+        return
+    run = _current_run.get()
+    if run is None:
+        return
+    calls = run.calls.setdefault(endpoint, {"count": 0, "total_s": 0.0, "errors": 0})
+    calls["count"] += 1
+    calls["total_s"] = round(calls["total_s"] + seconds, 4)
+    calls["errors"] += bool(error)
+
+
+def _emit(record):
+    line = json.dumps(record, default=str)
+    if TRACE_LOG == "-":
+        print(line, file=sys.stderr, flush=True)
+    else:
+        with _lock, open(TRACE_LOG, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def trace_run(name, **fields):
+    """
+    Trace one pipeline run; usable as a decorator. On exit a JSON record
+    with its spans, counters and external calls is written to TRACE_LOG.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    run = Run(name, fields)
+    token = _current_run.set(run)
+    started = time.perf_counter()
+    try:
+        yield run
+    except BaseException as e:
+        run.error = repr(e)
+        raise
+    finally:
+        _current_run.reset(token)
+        duration = time.perf_counter() - started
+        observe("run_seconds", duration, error=run.error is not None, run=name)
+        if TRACE_LOG:
+            _emit({
+                "event": "run",
+                "run": name,
+                "run_id": run.id,
+                "started_at": run.started,
+                "duration_s": round(duration, 4),
+                "status": "error" if run.error else "ok",
+                "error": run.error,
+                **run.fields,
+                "spans": run.spans,
+                "counters": run.counters,
+                "calls": run.calls,
+            })
+
+
+# ---------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------
+
+
+def register_collector(fn):
+    """
+    Register `fn()` to be called at scrape time. It returns samples as
+    (kind, name, labels, value) tuples, where kind is "counter", "gauge"
+    or "histogram" (value is then a `LatencyHistogram`).
+    """
+    with _lock:
+        _collectors.append(fn)
+    return fn
+
+
+def cache_samples(cache, stats):
+    """Collector samples for a cache's `stats()` dict (hits, misses, hit_rate)."""
+    labels = {"cache": cache}
+    return [
+        ("counter", "cache_hits", labels, stats["hits"]),
+        ("counter", "cache_misses", labels, stats["misses"]),
+        ("gauge", "cache_hit_ratio", labels, round(stats["hit_rate"], 4)),
+    ]
+
+
+def _samples():
+    with _lock:
+        samples = [
+            ("histogram", name, dict(labels), hist)
+            for (name, labels), hist in _histograms.items()
+        ] + [
+            ("counter", name, dict(labels), value)
+            for (name, labels), value in _counters.items()
+        ]
+        collectors = list(_collectors)
+
+    for collector in collectors:
+        try:
+            samples.extend(collector())
+        except Exception as e:
+            print(f"Metrics collector {collector.__name__} failed: {e!r}", file=sys.stderr)
+    return samples
+
+
+def _labels(labels, **extra):
+    merged = {**labels, **extra}
+    if not merged:
+        return ""
+
+    def escape(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in merged.items()) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    by_name = {}
+    for kind, name, labels, value in _samples():
+        metric = f"{METRIC_PREFIX}_{name}"
+        if kind == "counter" and not metric.endswith("_total"):
+            metric += "_total"
+        by_name.setdefault((metric, kind), []).append((labels, value))
+
+    lines = []
+    for (metric, kind), samples in sorted(by_name.items()):
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, value in samples:
+            if kind != "histogram":
+                lines.append(f"{metric}{_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, value.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f"{metric}_bucket{_labels(labels, le=le)} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(labels)} {value.total}")
+            lines.append(f"{metric}_count{_labels(labels)} {value.count}")
+        if kind == "histogram":
+            lines.append(f"# TYPE {metric}_errors_total counter")
+            for labels, value in samples:
+                lines.append(f"{metric}_errors_total{_labels(labels)} {value.errors}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+# Keep imports from reading a developer's .env or reaching real services
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("NOTION_DATABASE_ID", "test-db")
+os.environ.setdefault("NOTION_CACHE_ENABLED", "0")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+
+EMBEDDING_DIM = 16
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Every store uses paths relative to the working directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def fake_vector(text):
+    """Deterministic unit vector; identical texts get identical vectors."""
+    import numpy as np
+
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Replace OpenRouter embedding calls and start from an empty cache."""
+    from rag import embedding_cache, embeddings
+
+    calls = []
+
+    def embed_remote(texts, model):
+        calls.append(list(texts))
+        return [fake_vector(t).tolist() for t in texts]
+
+    monkeypatch.setattr(embeddings, "_embed_remote", embed_remote)
+    monkeypatch.setattr(embedding_cache, "_cache", None)
+    return calls
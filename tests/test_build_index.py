@@ -0,0 +1,128 @@
+import os
+
+import pytest
+import requests
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from conftest import fake_vector
+from rag import build_index, notion_ingest
+from rag.sync_state import SyncState
+from rag.doc_store import DocStore
+from rag.vector_store import INDEX_FILE, METADATA_FILE, VectorStore, build_vector_store
+
+PAGES = [
+    {"id": "p1", "title": "Pricing", "content": "Our pricing is simple. " * 40,
+     "last_edited_time": "2026-01-01T00:00:00.000Z"},
+    {"id": "p2", "title": "Support", "content": "Support answers within a day. " * 40,
+     "last_edited_time": "2026-01-01T00:00:00.000Z"},
+]
+
+
+@pytest.fixture
+def no_tiktoken(monkeypatch):
+    """tiktoken installed, but its encoding cannot be downloaded."""
+
+    def from_tiktoken_encoder(*args, **kwargs):
+        raise requests.ConnectionError("openaipublic.blob.core.windows.net unreachable")
+
+    monkeypatch.setattr(
+        RecursiveCharacterTextSplitter, "from_tiktoken_encoder", from_tiktoken_encoder
+    )
+    notion_ingest.get_splitter.cache_clear()
+    yield
+    notion_ingest.get_splitter.cache_clear()
+
+
+def test_full_build_falls_back_to_character_splitter(no_tiktoken, fake_embeddings, monkeypatch):
+    monkeypatch.setattr(build_index, "iter_pages", lambda: iter(PAGES))
+    state = SyncState()
+
+    build_index.full_build(state)
+
+    docs = DocStore(METADATA_FILE)
+    assert len(docs) > len(PAGES)
+    assert set(state.pages) == {"p1", "p2"}
+    assert sorted(docs.vector_ids().tolist()) == sorted(state.vector_ids(["p1", "p2"]))
+    assert os.path.exists(INDEX_FILE)
+
+
+def _documents(n):
+    for i in range(n):
+        yield {
+            "text": f"chunk {i} about topic {i % 7}",
+            "metadata": {"page_id": f"p{i // 4}", "title": f"Page {i // 4}",
+                         "chunk": i % 4, "vector_id": (i // 4) << 16 | (i % 4)},
+        }
+
+
+@pytest.mark.parametrize("spec", ["flat", "hnsw", "sq8", "ivf"])
+def test_build_vector_store_consumes_a_generator(spec, fake_embeddings):
+    build_vector_store(_documents(300), spec=spec)
+
+    store = VectorStore(check_interval=0)
+    hits = store.search(fake_vector("chunk 42 about topic 0")[None, :], k=1)[0]
+    assert hits[0]["vector_id"] == (42 // 4) << 16 | (42 % 4)
+    assert hits[0]["page_id"] == "p10"
+    assert len(store._current()[1]) == 300
+
+
+def test_build_vector_store_rejects_no_documents(fake_embeddings):
+    with pytest.raises(ValueError):
+        build_vector_store(iter([]))
+
+
+SHARED = "Every HiddenClasses post ends with a question for the reader. " * 6
+PAGE_A = {"id": "a", "title": "Page A", "content": SHARED + "\n\n" + "Bookbinding basics. " * 20,
+          "last_edited_time": "2026-01-01T00:00:00.000Z"}
+PAGE_B = {"id": "b", "title": "Page B", "content": SHARED + "\n\n" + "Foley artistry. " * 25,
+          "last_edited_time": "2026-01-01T00:00:00.000Z"}
+
+
+def _hit(text):
+    return VectorStore(check_interval=0).search(fake_vector(text)[None, :], k=1)[0][0]
+
+
+def test_shared_chunk_follows_the_remaining_page(fake_embeddings, monkeypatch):
+    monkeypatch.setattr(build_index, "iter_pages", lambda: iter([PAGE_A, PAGE_B]))
+    state = SyncState()
+    build_index.full_build(state)
+
+    embedded = [t for call in fake_embeddings for t in call]
+    assert sum(t.strip() == SHARED.strip() for t in embedded) == 1
+    # Stored once, by the page that had it first
+    assert _hit(SHARED.strip())["page_id"] == "a"
+    assert len(DocStore(METADATA_FILE)) == 3
+
+    # Page A is deleted; B still uses the shared chunk
+    monkeypatch.setattr(build_index, "fetch_all_pages", lambda edited_since=None: [])
+    monkeypatch.setattr(build_index, "fetch_page_ids", lambda: {"b"})
+    build_index.incremental_build(state)
+
+    hit = _hit(SHARED.strip())
+    assert (hit["page_id"], hit["title"]) == ("b", "Page B")
+    assert len(DocStore(METADATA_FILE)) == 2
+    assert set(state.pages) == {"b"}
+
+
+def test_incremental_build_replaces_edited_chunks(fake_embeddings, monkeypatch):
+    monkeypatch.setattr(build_index, "iter_pages", lambda: iter([PAGE_A, PAGE_B]))
+    state = SyncState()
+    build_index.full_build(state)
+    old_ids = set(DocStore(METADATA_FILE).vector_ids().tolist())
+
+    edited = {**PAGE_B, "content": SHARED + "\n\n" + "Sound design for film. " * 20,
+              "last_edited_time": "2026-02-01T00:00:00.000Z"}
+    monkeypatch.setattr(build_index, "fetch_all_pages", lambda edited_since=None: [edited])
+    monkeypatch.setattr(build_index, "fetch_page_ids", lambda: {"a", "b"})
+    fake_embeddings.clear()
+    build_index.incremental_build(state)
+
+    # Only the edited paragraph is embedded again
+    assert [t.strip() for call in fake_embeddings for t in call] == [
+        ("Sound design for film. " * 20).strip()
+    ]
+    docs = DocStore(METADATA_FILE)
+    new_ids = set(docs.vector_ids().tolist())
+    assert len(new_ids) == 3 and len(new_ids & old_ids) == 2
+    assert _hit(("Sound design for film. " * 20).strip())["page_id"] == "b"
+    assert _hit(SHARED.strip())["page_id"] == "a"
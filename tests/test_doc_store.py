@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from rag.columns import ColumnFile, write_columns
+from rag.doc_store import DocStore, LegacyDocStore, open_doc_store, write_doc_store
+
+
+def test_columns_round_trip():
+    write_columns("t.cols", {
+        "ids": np.array([3, 1, 2], dtype=np.int64),
+        "name": ["ü", "", "line\nbreak"],
+        "matrix": np.arange(6, dtype=np.float32).reshape(3, 2),
+    }, attrs={"spec": "flat"})
+
+    cols = ColumnFile("t.cols")
+    assert len(cols) == 3 and "name" in cols and "missing" not in cols
+    assert cols.attrs == {"spec": "flat"}
+    assert cols.array("ids").tolist() == [3, 1, 2]
+    assert cols.array("matrix").tolist() == [[0, 1], [2, 3], [4, 5]]
+    assert [cols.string("name", r) for r in range(3)] == ["ü", "", "line\nbreak"]
+    assert cols.row(2) == {"name": "line\nbreak"}
+    with pytest.raises(TypeError):
+        cols.array("name")
+
+
+def test_not_a_column_file(tmp_path):
+    (tmp_path / "bad.cols").write_bytes(b"not columns at all")
+    with pytest.raises(ValueError):
+        ColumnFile("bad.cols")
+
+
+def test_doc_store_round_trip():
+    ids = [70, 10, 40]
+    metadatas = [{"page_id": f"p{i}", "title": f"Title {i}"} for i in ids]
+    texts = [f"text {i}" for i in ids]
+    write_doc_store("docs.cols", ids, metadatas, texts, attrs={"spec": "hnsw"})
+
+    docs = DocStore("docs.cols")
+    assert len(docs) == 3
+    assert docs.attrs == {"spec": "hnsw"}
+    assert docs.vector_ids().tolist() == [10, 40, 70]
+
+    rows = docs.rows_for_ids([[40, 99], [-1, 70]])
+    assert rows.tolist() == [[1, -1], [-1, 2]]
+    assert docs.row(rows[0][0]) == {"page_id": "p40", "title": "Title 40", "text": "text 40"}
+
+
+def test_empty_doc_store():
+    write_doc_store("docs.cols", [], [], [])
+    docs = DocStore("docs.cols")
+    assert len(docs) == 0
+    assert docs.rows_for_ids([1, 2]).tolist() == [-1, -1]
+
+
+def test_legacy_doc_store_is_positional():
+    np.save("legacy.npy", np.array([{"page_id": "a", "title": "A"}], dtype=object))
+
+    docs = open_doc_store("missing.cols", "legacy.npy")
+    assert isinstance(docs, LegacyDocStore)
+    assert docs.rows_for_ids([0, 5]).tolist() == [0, -1]
+    assert docs.row(0) == {"page_id": "a", "title": "A", "text": ""}
@@ -0,0 +1,42 @@
+import numpy as np
+
+from rag.embedding_cache import EmbeddingCache
+
+
+def _count(cache):
+    return cache._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_get_many_marks_misses():
+    cache = EmbeddingCache("cache.sqlite")
+    cache.put_many("m", ["a"], [[1.0, 2.0]])
+
+    vectors = cache.get_many("m", ["a", "b"])
+    assert np.allclose(vectors[0], [1.0, 2.0]) and vectors[1] is None
+    assert cache.get_many("other-model", ["a"]) == [None]
+    assert cache.stats()["hits"] == 1
+
+
+def test_replacing_rows_does_not_grow_the_count():
+    cache = EmbeddingCache("cache.sqlite", max_entries=3)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    for _ in range(5):
+        cache.put_many("m", ["a", "b", "b"], [[1.0], [2.0], [2.0]])
+
+    assert cache.stats()["entries"] == _count(cache) == 2
+    assert cache.get_many("m", ["a", "b"])[1] is not None
+
+
+def test_least_recently_used_rows_are_evicted(monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("rag.embedding_cache.time.time", lambda: next(clock))
+    cache = EmbeddingCache("cache.sqlite", max_entries=2)
+    cache.put_many("m", ["a"], [[1.0]])
+    cache.put_many("m", ["b"], [[2.0]])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", ["c"], [[3.0]])
+
+    assert [v is not None for v in cache.get_many("m", ["a", "b", "c"])] == [True, False, True]
+    assert cache.stats()["entries"] == _count(cache) == 2
+    # The count survives a reopen
+    assert EmbeddingCache("cache.sqlite", max_entries=2).stats()["entries"] == 2
@@ -0,0 +1,67 @@
+import asyncio
+import subprocess
+import sys
+
+import http_client
+from conftest import SRC
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def test_retried_responses_are_closed(monkeypatch):
+    failed, ok = FakeResponse(503), FakeResponse(200)
+    session = FakeSession(failed, ok)
+    monkeypatch.setattr(http_client, "get_session", lambda url: session)
+    monkeypatch.setattr(http_client.time, "sleep", lambda seconds: None)
+
+    response = http_client.get("https://example.test/x", stream=True)
+
+    assert response is ok and not ok.closed
+    assert failed.closed
+    assert session.calls == 2
+
+
+def test_non_idempotent_requests_are_not_retried(monkeypatch):
+    session = FakeSession(FakeResponse(503))
+    monkeypatch.setattr(http_client, "get_session", lambda url: session)
+
+    assert http_client.post("https://example.test/x").status_code == 503
+    assert session.calls == 1
+
+
+def test_import_does_not_load_httpx():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, http_client; print('httpx' in sys.modules)"],
+        cwd=SRC, capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_async_clients_are_closed_per_loop():
+    async def run():
+        client = http_client._async_client()
+        assert http_client._async_client() is client
+        await http_client.aclose()
+        return client
+
+    client = asyncio.run(run())
+    assert client.is_closed
+    assert not http_client._async_clients
@@ -0,0 +1,74 @@
+import os
+import time
+
+import pytest
+import replicate
+
+import image_gen
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    out = tmp_path / "images"
+    monkeypatch.setattr(image_gen, "OUTPUT_DIR", out)
+    runs = []
+
+    def run(model, input):
+        runs.append(input)
+        return [[f"image {len(runs)}".encode()]]
+
+    monkeypatch.setattr(replicate, "run", run)
+    return out, runs
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_same_post_is_served_from_disk(images):
+    _, runs = images
+    first = image_gen.generate_image("a post")
+    assert image_gen.generate_image("a post") == first
+    assert len(runs) == 1
+
+
+def test_fresh_image_gets_its_own_path(images):
+    _, runs = images
+    live = image_gen.generate_image("a post")
+    fresh = image_gen.generate_image("a post", fresh=True)
+
+    assert fresh != live
+    assert live.read_bytes() == b"image 1"
+    assert fresh.read_bytes() == b"image 2"
+    assert len(runs) == 2
+
+
+def test_retention_spares_live_drafts(images, monkeypatch):
+    out, _ = images
+    monkeypatch.setattr(image_gen, "IMAGE_DIR_MAX_BYTES", 0)
+    out.mkdir()
+    live, stale = out / "live.png", out / "stale.png"
+    for path in (live, stale):
+        path.write_bytes(b"x" * 10)
+        _age(path, image_gen.IMAGE_MIN_AGE + 60)
+    # The processed copy media.prepare_image writes shares the stem
+    (out / "live.webp").write_bytes(b"x")
+    _age(out / "live.webp", image_gen.IMAGE_MIN_AGE + 60)
+
+    new = image_gen.generate_image("a post", in_use={str(live)})
+
+    assert live.exists() and (out / "live.webp").exists() and new.exists()
+    assert not stale.exists()
+
+
+def test_retention_needs_the_in_use_set(images, monkeypatch):
+    out, _ = images
+    monkeypatch.setattr(image_gen, "IMAGE_DIR_MAX_BYTES", 0)
+    out.mkdir()
+    old = out / "old.png"
+    old.write_bytes(b"x")
+    _age(old, image_gen.IMAGE_MIN_AGE + 60)
+
+    image_gen.generate_image("a post")
+    assert old.exists()
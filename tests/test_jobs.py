@@ -0,0 +1,108 @@
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from jobs import FAILED, INTERRUPTED_ERROR, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobStore
+
+
+@pytest.fixture
+def store():
+    return JobStore("jobs.sqlite")
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _set_owner(store, job_id, owner):
+    store._execute("UPDATE jobs SET owner = ? WHERE id = ?", (owner, job_id))
+
+
+def test_a_job_is_claimed_once(store):
+    job_id = store.create("run", {"fresh": True})
+    assert store.claim(job_id)
+    assert not store.claim(job_id)
+
+    job = store.get(job_id)
+    assert job["status"] == RUNNING
+    assert job["params"] == {"fresh": True}
+    assert store.pending() == []
+
+
+def test_pending_is_oldest_first(store):
+    first, second = store.create("run"), store.create("publish")
+    assert store.pending() == [first, second]
+    assert store.status_counts() == {QUEUED: 2}
+
+
+def test_fail_interrupted_only_fails_dead_workers(store):
+    dead, alive, legacy, queued = (store.create("run") for _ in range(4))
+    for job_id in (dead, alive, legacy):
+        store.claim(job_id)
+    _set_owner(store, dead, f"{socket.gethostname()}:{_dead_pid()}")
+    _set_owner(store, legacy, None)
+
+    assert sorted(store.fail_interrupted()) == sorted([dead, legacy])
+    assert store.get(dead)["status"] == FAILED
+    assert store.get(dead)["error"] == INTERRUPTED_ERROR
+    assert store.get(alive)["status"] == RUNNING
+    assert store.get(queued)["status"] == QUEUED
+
+
+def test_other_hosts_jobs_are_left_running(store):
+    job_id = store.create("run")
+    store.claim(job_id)
+    _set_owner(store, job_id, "some-other-host:1")
+    assert store.fail_interrupted() == []
+
+
+def _wait_for(queue, job_id):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_queue_runs_handlers(store):
+    def handler(record_stage, count=1):
+        record_stage("generate", 0.25)
+        return {"count": count}
+
+    def broken(record_stage):
+        raise RuntimeError("boom")
+
+    queue = JobQueue({"gen": handler, "broken": broken}, store=store, workers=1)
+    queue.start()
+    try:
+        done = _wait_for(queue, queue.submit("gen", count=3))
+        failed = _wait_for(queue, queue.submit("broken"))
+        with pytest.raises(ValueError):
+            queue.submit("unknown")
+    finally:
+        queue.shutdown()
+
+    assert done["status"] == SUCCEEDED
+    assert done["result"] == {"count": 3}
+    assert done["stages"] == {"generate": 0.25}
+    assert failed["status"] == FAILED and "RuntimeError: boom" in failed["error"]
+
+
+def test_queued_jobs_resume_on_start(store):
+    job_id = store.create("gen")
+    ran = threading.Event()
+
+    queue = JobQueue({"gen": lambda record_stage: ran.set()}, store=store, workers=1)
+    queue.start()
+    try:
+        assert ran.wait(2)
+        assert _wait_for(queue, job_id)["status"] == SUCCEEDED
+    finally:
+        queue.shutdown()
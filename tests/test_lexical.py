@@ -0,0 +1,43 @@
+import pytest
+
+from rag.lexical import LexicalIndex, build_lexical_index, tokenize
+
+TEXTS = [
+    "Bookbinding is a quiet craft of paper, thread and glue.",
+    "Foley artists record footsteps and rustling paper for film.",
+    "Data labelling pays for many side projects.",
+    "Bookbinding bookbinding bookbinding: repairing old books.",
+]
+IDS = [100, 200, 300, 400]
+
+
+@pytest.fixture
+def index():
+    build_lexical_index(IDS, TEXTS, "bm25.cols")
+    return LexicalIndex("bm25.cols")
+
+
+def test_tokenize_drops_single_characters():
+    assert tokenize("A Foley-artist's job, 2 days") == ["foley", "artist", "job", "days"]
+
+
+def test_ranks_by_bm25(index):
+    hits = index.search("bookbinding", k=5)
+    assert [vid for vid, _ in hits] == [400, 100]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_rare_terms_weigh_more(index):
+    # "paper" is in two chunks, "film" in one
+    hits = dict(index.search("paper film", k=4))
+    assert hits[200] > hits[100]
+
+
+def test_no_match_and_unknown_terms(index):
+    assert index.search("astronomy") == []
+    assert index.search("") == []
+
+
+def test_empty_index():
+    build_lexical_index([], [], "empty.cols")
+    assert LexicalIndex("empty.cols").search("anything") == []
@@ -0,0 +1,75 @@
+import pytest
+
+import llm_cache
+from llm_cache import LLMCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    return clock
+
+
+def test_hit_ignores_whitespace(clock):
+    cache = LLMCache("llm.sqlite")
+    cache.put("m", "Write  a\n post", "reply", tokens=12)
+
+    assert cache.get("m", " Write a post ") == "reply"
+    assert cache.stats()["tokens_saved"] == 12
+
+
+def test_model_and_params_are_part_of_the_key(clock):
+    cache = LLMCache("llm.sqlite")
+    cache.put("m", "prompt", "reply", params={"temperature": 0.2})
+
+    assert cache.get("m", "prompt", params={"temperature": 0.2}) == "reply"
+    assert cache.get("m", "prompt", params={"temperature": 0.9}) is None
+    assert cache.get("other", "prompt", params={"temperature": 0.2}) is None
+    assert cache_key("m", "p", {"a": 1, "b": 2}) == cache_key("m", "p", {"b": 2, "a": 1})
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LLMCache("llm.sqlite", ttl=60)
+    cache.put("m", "prompt", "reply")
+
+    clock.now += 59
+    assert cache.get("m", "prompt") == "reply"
+    clock.now += 2
+    assert cache.get("m", "prompt") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used(clock):
+    cache = LLMCache("llm.sqlite", max_entries=2)
+    cache.put("m", "a", "A")
+    clock.now += 1
+    cache.put("m", "b", "B")
+    clock.now += 1
+    assert cache.get("m", "a") == "A"
+    clock.now += 1
+    cache.put("m", "c", "C")
+
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") == "A"
+    assert cache.get("m", "c") == "C"
+    count = cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert count == 2
+
+
+def test_semantic_hit_above_threshold(clock):
+    cache = LLMCache("llm.sqlite")
+    cache.put("m", "first prompt", "reply", embedding=[1.0, 0.0, 0.0])
+
+    assert cache.get("m", "near prompt", embedding=[1.0, 0.01, 0.0]) == "reply"
+    assert cache.get("m", "far prompt", embedding=[0.0, 1.0, 0.0]) is None
+    assert cache.get("m", "near prompt", params={"x": 1}, embedding=[1.0, 0.01, 0.0]) is None
+    assert cache.stats()["semantic_hits"] == 1
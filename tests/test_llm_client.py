@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import llm_cache
+import llm_client
+
+
+class StreamResponse:
+    def __init__(self, deltas, finish_reason="stop", done=True, usage=None):
+        self.lines = []
+        for i, delta in enumerate(deltas):
+            last = i == len(deltas) - 1
+            choice = {"delta": {"content": delta}, "finish_reason": finish_reason if last else None}
+            self.lines.append(f"data: {json.dumps({'choices': [choice]})}")
+        if usage:
+            self.lines.append(f"data: {json.dumps({'choices': [], 'usage': usage})}")
+        if done:
+            self.lines.append("data: [DONE]")
+        self.closed = False
+
+    def raise_for_status(self):
+        return None
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = llm_cache.LLMCache("llm_cache.sqlite")
+    monkeypatch.setattr(llm_client, "get_llm_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    responses = []
+    monkeypatch.setattr(llm_client.http_client, "post", lambda *a, **kw: responses.pop(0))
+    return responses
+
+
+def _call(**kwargs):
+    timings = {}
+    text = llm_client.call_llm("prompt", cache=True, stream=True, timings=timings, **kwargs)
+    return text, timings
+
+
+def test_stream_stopped_at_max_chars_is_cached_per_limit(cache, serve):
+    serve.append(StreamResponse(["a" * 30, "b" * 30, "c" * 30]))
+
+    text, timings = _call(max_chars=50)
+    assert text == "a" * 30 + "b" * 30
+    assert timings["stopped_early"]
+
+    # Served from cache for the same limit, not for a different one or none
+    assert _call(max_chars=50)[1]["cached"]
+    assert cache.get(llm_client.DEFAULT_MODEL, "prompt") is None
+    assert cache.get(llm_client.DEFAULT_MODEL, "prompt", {"max_chars": 80}) is None
+
+
+@pytest.mark.parametrize("response", [
+    StreamResponse(["cut off"], finish_reason="length"),
+    StreamResponse(["dropped"], finish_reason=None, done=False),
+])
+def test_truncated_streams_are_not_cached(cache, serve, response):
+    serve.append(response)
+    _call()
+    assert cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+
+def test_usage_is_recorded(cache, serve):
+    serve.append(StreamResponse(["whole answer"], usage={"total_tokens": 42}))
+    _call()
+    serve.append(StreamResponse(["x" * 100, "y" * 100]))
+    _call(max_chars=50)
+
+    rows = cache._conn.execute("SELECT tokens FROM responses ORDER BY created_at").fetchall()
+    assert rows[0][0] == 42
+    # Stopped streams report no usage; it is estimated from the text
+    assert rows[1][0] == (len("prompt") + 100) // 4
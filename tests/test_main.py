@@ -0,0 +1,39 @@
+import pytest
+
+import main
+from review_store import PENDING, REJECTED, ReviewStore
+
+
+def _row(page_id):
+    return {"id": page_id, "content": f"content {page_id}", "examples": ""}
+
+
+@pytest.fixture
+def store():
+    return ReviewStore("reviews.sqlite")
+
+
+def test_next_row_skips_rows_in_review(store, monkeypatch):
+    store.add_draft(1, "post", page_id="a")
+    store.enqueue_ready("post", page_id="b")
+    monkeypatch.setattr(main, "fetch_next_row", lambda: _row("a"))
+    monkeypatch.setattr(main, "fetch_rows", lambda count: [_row(p) for p in "abc"][:count])
+
+    assert main._next_row(store)["id"] == "c"
+
+
+def test_next_row_retries_rejected_rows(store, monkeypatch):
+    store.add_draft(1, "post", page_id="a")
+    store.transition(1, [PENDING], REJECTED)
+    monkeypatch.setattr(main, "fetch_next_row", lambda: _row("a"))
+
+    assert main._next_row(store)["id"] == "a"
+
+
+def test_next_row_when_every_row_is_drafted(store, monkeypatch):
+    store.add_draft(1, "post", page_id="a")
+    monkeypatch.setattr(main, "fetch_next_row", lambda: _row("a"))
+    monkeypatch.setattr(main, "fetch_rows", lambda count: [_row("a")])
+
+    with pytest.raises(ValueError):
+        main._next_row(store)
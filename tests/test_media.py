@@ -0,0 +1,58 @@
+import importlib
+
+import pytest
+from PIL import Image
+
+import media
+
+
+@pytest.fixture
+def picture():
+    image = Image.new("RGB", (64, 64), "white")
+    for x in range(20, 40):
+        for y in range(10, 30):
+            image.putpixel((x, y), (200, 80, 30))
+    return image
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("webp", "webp"), ("JPG", "jpeg"), ("jpeg", "jpeg"), (".png", "png"),
+])
+def test_format_names_are_normalized(value, expected):
+    assert media._media_format(value) == expected
+
+
+def test_unknown_format_is_rejected_at_import(monkeypatch):
+    monkeypatch.setenv("MEDIA_FORMAT", "gif")
+    with pytest.raises(ValueError, match="MEDIA_FORMAT"):
+        importlib.reload(media)
+    monkeypatch.delenv("MEDIA_FORMAT")
+    importlib.reload(media)
+
+
+@pytest.mark.parametrize("fmt", ["webp", "jpg", "png"])
+def test_encode_to_target(picture, fmt):
+    data = media.encode_to_target(picture, fmt, target_bytes=100_000)
+    assert data
+
+
+def test_png_is_encoded_once(picture, monkeypatch):
+    calls = []
+    encode = media._encode
+    monkeypatch.setattr(media, "_encode", lambda *a: calls.append(a) or encode(*a))
+
+    media.encode_to_target(picture, "png", target_bytes=1)
+    assert len(calls) == 1
+
+
+def test_prepare_image_as_jpg(picture, tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "MEDIA_FORMAT", media._media_format("jpg"))
+    source = tmp_path / "image.png"
+    picture.save(source)
+
+    prepared = media.prepare_image(source)
+
+    assert prepared["path"] == tmp_path / "image.jpeg"
+    assert prepared["mime_type"] == "image/jpeg"
+    assert prepared["path"].exists()
+    assert -1 <= prepared["focus"][0] <= 1
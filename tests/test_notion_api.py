@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+import notion_api
+from notion_cache import NotionCache
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.headers = {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+ROW = {
+    "id": "row-1",
+    "last_edited_time": "2026-01-01T00:00:00.000Z",
+    "properties": {
+        "Content": {"id": "c", "rich_text": [{"plain_text": "content"}]},
+        "Example Posts": {"id": "e", "rich_text": []},
+    },
+}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = NotionCache("notion_cache.sqlite")
+    monkeypatch.setattr(notion_api, "get_notion_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def notion(monkeypatch):
+    """Serve queued responses to Notion queries, recording their payloads."""
+    responses, payloads = [], []
+
+    def post(url, json=None, **kwargs):
+        payloads.append(json)
+        return responses.pop(0)
+
+    monkeypatch.setattr(notion_api.http_client, "post", post)
+    return responses, payloads
+
+
+def test_missing_posted_property_disables_the_filter(cache, notion):
+    responses, payloads = notion
+    responses += [
+        FakeResponse({
+            "object": "error", "status": 400, "code": "validation_error",
+            "message": "Could not find property with name or id: Posted",
+        }, 400),
+        FakeResponse({"results": [ROW]}),
+        FakeResponse({"results": [ROW]}),
+    ]
+
+    assert notion_api.fetch_rows(1)[0]["id"] == "row-1"
+    assert "filter" in payloads[0] and "filter" not in payloads[1]
+
+    notion_api.fetch_rows(1)
+    assert "filter" not in payloads[2]
+
+
+@pytest.mark.parametrize("error", [
+    {"code": "validation_error", "message": "body.page_size should be ≤ 100"},
+    {"code": "invalid_json", "message": "Error parsing JSON body."},
+])
+def test_other_bad_requests_are_raised(cache, notion, error):
+    responses, payloads = notion
+    responses.append(FakeResponse({"object": "error", "status": 400, **error}, 400))
+
+    with pytest.raises(requests.HTTPError):
+        notion_api.fetch_rows(1)
+    assert notion_api._posted_filter_enabled(cache)
@@ -0,0 +1,97 @@
+import pytest
+
+import reply_engine
+from reply_engine import GeneratedResponse, format_generation_report
+
+
+def _posts(n):
+    return [{"id": str(i), "content": f"post {i}", "author": f"user{i}"} for i in range(n)]
+
+
+def _response(post):
+    return GeneratedResponse(
+        original_post_id=post["id"],
+        original_post_content=post["content"],
+        original_post_author=post["author"],
+        response_text="reply",
+        is_company_related=False,
+        relevance_score=0.5,
+        reasoning="",
+    )
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """
+    A fake `_generate_chunk`. `skip` holds ids the model never answers,
+    `fail` chunk sizes whose calls raise, and `calls` the chunks sent.
+    """
+    state = {"skip": set(), "fail": set(), "calls": []}
+
+    def generate_chunk(posts, business_context, report):
+        state["calls"].append([p["id"] for p in posts])
+        if len(posts) in state["fail"]:
+            raise RuntimeError("upstream error")
+        report.append({"posts": len(posts), "latency_s": 0.1,
+                       "prompt_tokens": 10, "completion_tokens": 5})
+        return [_response(p) for p in posts if p["id"] not in state["skip"]]
+
+    monkeypatch.setattr(reply_engine, "_generate_chunk", generate_chunk)
+    return state
+
+
+def _recover(posts, report):
+    return reply_engine._generate_with_recovery(posts, "context", report)
+
+
+def test_all_answered_in_one_call(model):
+    report = []
+    assert [r.original_post_id for r in _recover(_posts(4), report)] == ["0", "1", "2", "3"]
+    assert model["calls"] == [["0", "1", "2", "3"]]
+
+
+def test_skipped_posts_are_rerun(model):
+    model["skip"] = {"2"}
+    report = []
+    responses = _recover(_posts(4), report)
+
+    assert sorted(r.original_post_id for r in responses) == ["0", "1", "3"]
+    # The skipped post is rerun on its own, then retried once more
+    assert model["calls"] == [["0", "1", "2", "3"], ["2"], ["2"]]
+    assert report[-1] == {"posts": 1, "unanswered": ["2"]}
+
+
+def test_a_chunk_with_no_answers_is_bisected(model):
+    model["skip"] = {"0", "1", "2", "3"}
+    report = []
+
+    assert _recover(_posts(4), report) == []
+    assert ["0", "1"] in model["calls"] and ["2", "3"] in model["calls"]
+    unanswered = [pid for r in report for pid in r.get("unanswered", ())]
+    assert sorted(unanswered) == ["0", "1", "2", "3"]
+
+
+def test_a_failed_chunk_is_split(model):
+    model["fail"] = {4}
+    report = []
+    responses = _recover(_posts(4), report)
+
+    assert sorted(r.original_post_id for r in responses) == ["0", "1", "2", "3"]
+    assert model["calls"] == [["0", "1", "2", "3"], ["0", "1"], ["2", "3"]]
+    assert "error" in report[0]
+
+
+def test_a_failing_post_is_retried_once_then_reported(model):
+    model["fail"] = {1}
+    report = []
+
+    assert _recover(_posts(1), report) == []
+    assert model["calls"] == [["0"], ["0"]]
+    assert report[-1] == {"posts": 1, "unanswered": ["0"]}
+    assert "1 posts unanswered" in format_generation_report(report)
+
+
+def test_generate_responses_keeps_post_order(model):
+    model["skip"] = {"3"}
+    responses = reply_engine.generate_responses(_posts(7), "context", batch_size=3)
+    assert [r.original_post_id for r in responses] == ["0", "1", "2", "4", "5", "6"]
@@ -0,0 +1,68 @@
+import httpx
+import openai
+import pytest
+
+import reply_prefilter
+from conftest import fake_vector
+from rag import embeddings
+
+
+def _post(i, content, **extra):
+    return {"id": str(i), "content": f"<p>{content}</p>", "author": f"user{i}", **extra}
+
+
+POSTS = [
+    _post(0, "Thinking about a career change into bookbinding and restoration work"),
+    _post(1, "Thinking about a career change into bookbinding and restoration work!"),
+    _post(2, "Boosted: a long enough post about freelance illustration", is_boost=True),
+    _post(3, "Un article assez long sur les carrières non linéaires", language="fr"),
+    _post(4, "short"),
+    _post(5, "Side projects taught me more than my degree ever did, honestly"),
+    _post(6, "Learning foley artistry after ten years in accounting was wild"),
+]
+
+
+@pytest.fixture
+def embed(monkeypatch):
+    calls = []
+
+    def embed_texts(texts, model=embeddings.DEFAULT_MODEL):
+        calls.append(texts)
+        return [fake_vector(t) for t in texts]
+
+    monkeypatch.setattr(embeddings, "embed_texts", embed_texts)
+    return calls
+
+
+def _reasons(dropped):
+    return {p["id"]: p["drop_reason"] for p in dropped}
+
+
+def test_filters_and_ranks(embed):
+    kept, dropped = reply_prefilter.prefilter(POSTS, "careers", top_n=2, min_similarity=-1.0)
+
+    assert _reasons(dropped) == {
+        "1": "near_duplicate", "2": "boost", "3": "language", "4": "too_short",
+    }
+    assert len(kept) == 2
+    assert kept[0]["similarity"] >= kept[1]["similarity"]
+    assert all("<p>" not in p["text"] for p in kept)
+
+
+def test_empty_context_skips_ranking(embed):
+    kept, dropped = reply_prefilter.prefilter(POSTS, "  ", top_n=2)
+
+    assert embed == []
+    assert [p["id"] for p in kept] == ["0", "5"]
+    assert len(dropped) == 4
+
+
+def test_embedding_failure_passes_posts_through(monkeypatch):
+    def embed_texts(texts, model=embeddings.DEFAULT_MODEL):
+        raise openai.APIConnectionError(request=httpx.Request("POST", "https://example.test"))
+
+    monkeypatch.setattr(embeddings, "embed_texts", embed_texts)
+    kept, dropped = reply_prefilter.prefilter(POSTS, "careers", top_n=5)
+
+    assert [p["id"] for p in kept] == ["0", "5", "6"]
+    assert "low_similarity" not in _reasons(dropped).values()
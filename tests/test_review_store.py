@@ -0,0 +1,85 @@
+import pytest
+
+from review_store import (
+    APPROVED,
+    AWAITING_REASON,
+    FAILED,
+    PENDING,
+    PUBLISHED,
+    PUBLISHING,
+    REJECTED,
+    ReviewStore,
+)
+
+
+@pytest.fixture
+def store():
+    return ReviewStore("reviews.sqlite")
+
+
+def test_approve_and_publish(store):
+    store.add_draft(1, "post", "img.webp", page_id="row-1")
+    assert store.get(1)["state"] == PENDING
+
+    assert store.transition(1, [PENDING], APPROVED)
+    assert store.transition(1, [APPROVED], PUBLISHING)
+    assert store.transition(1, [PUBLISHING], PUBLISHED, status_url="https://x/1")
+
+    draft = store.get(1)
+    assert draft["state"] == PUBLISHED
+    assert draft["status_url"] == "https://x/1"
+
+
+def test_transition_from_wrong_state_is_refused(store):
+    store.add_draft(1, "post")
+    assert store.transition(1, [PENDING], APPROVED)
+    # A second worker, or a late button press, finds it already handled
+    assert not store.transition(1, [PENDING], AWAITING_REASON)
+    assert not store.transition(2, [PENDING], APPROVED)
+    assert store.get(1)["state"] == APPROVED
+
+
+def test_reject_with_reason(store):
+    store.add_draft(1, "post", page_id="row-1")
+    assert store.transition(1, [PENDING], AWAITING_REASON)
+    assert store.transition(1, [AWAITING_REASON], AWAITING_REASON, prompt_message_id=7)
+    assert store.find(prompt_message_id=7)[0]["message_id"] == 1
+
+    assert store.transition(1, [AWAITING_REASON], REJECTED, reason="too long")
+    assert store.get(1)["reason"] == "too long"
+    assert store.was_rejected("row-1")
+    assert not store.was_rejected("row-2")
+
+
+def test_page_and_image_bookkeeping(store):
+    store.add_draft(1, "a", "a.webp", page_id="pending")
+    store.add_draft(2, "b", "b.webp", page_id="rejected")
+    store.add_draft(3, "c", "c.webp", page_id="published")
+    store.add_draft(4, "d", "d.webp", page_id="failed")
+    store.enqueue_ready("e", "e.webp", page_id="queued")
+    store.transition(2, [PENDING], REJECTED)
+    store.transition(3, [PENDING], PUBLISHED)
+    store.transition(4, [PENDING], FAILED)
+
+    assert store.drafted_page_ids() == {"pending", "rejected", "published", "failed", "queued"}
+    assert store.active_page_ids() == {"pending", "published", "queued"}
+    assert store.image_paths_in_use() == {"a.webp", "e.webp"}
+    assert store.state_counts()[PENDING] == 1
+
+
+def test_ready_queue_is_fifo(store):
+    store.enqueue_ready("first", page_id="p1")
+    store.enqueue_ready("second", page_id="p2")
+    assert store.ready_count() == 2
+
+    draft = store.next_ready()
+    assert draft["post_text"] == "first"
+    store.remove_ready(draft["id"])
+    assert store.next_ready()["post_text"] == "second"
+
+
+def test_offset_persists():
+    store = ReviewStore("reviews.sqlite")
+    assert store.get_offset() is None
+    store.set_offset(42)
+    assert ReviewStore("reviews.sqlite").get_offset() == 42
@@ -0,0 +1,9 @@
+import pytest
+
+import _startup_bench
+
+
+@pytest.mark.parametrize("module", _startup_bench.ENTRY_POINTS)
+def test_entry_points_do_not_import_heavy_modules(module):
+    # Timing budgets are left to the benchmark itself; they are too noisy here
+    assert _startup_bench.check(module, budget=float("inf"), top=0) == []
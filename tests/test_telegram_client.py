@@ -0,0 +1,94 @@
+import pytest
+import requests
+
+import telegram_client
+from review_store import APPROVED, PENDING, ReviewStore
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "token")
+    monkeypatch.setenv("TELEGRAM_CHAT_ID", "99")
+    telegram_client._bot.cache_clear()
+    yield
+    telegram_client._bot.cache_clear()
+
+
+@pytest.fixture
+def store():
+    return ReviewStore("reviews.sqlite")
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(telegram_client.time, "sleep", slept.append)
+    return slept
+
+
+def _serve(monkeypatch, *responses):
+    responses = list(responses)
+    monkeypatch.setattr(telegram_client.http_client, "get", lambda *a, **kw: responses.pop(0))
+    monkeypatch.setattr(telegram_client.http_client, "post", lambda *a, **kw: FakeResponse(
+        {"ok": True, "result": {"message_id": 500}}
+    ))
+
+
+@pytest.mark.parametrize("response", [
+    FakeResponse({"ok": False, "description": "Conflict: webhook is active"}, 409),
+    FakeResponse({"ok": False, "description": "Unauthorized"}, 401),
+    FakeResponse({"ok": False, "description": "Flood control"}),
+])
+def test_get_updates_raises_when_not_ok(bot, monkeypatch, response):
+    _serve(monkeypatch, response)
+    with pytest.raises(requests.HTTPError):
+        telegram_client.get_updates()
+
+
+def test_poller_backs_off_after_errors(bot, monkeypatch, store, sleeps):
+    conflict = FakeResponse({"ok": False, "description": "Conflict"}, 409)
+    _serve(monkeypatch, conflict, conflict, FakeResponse({"ok": True, "result": []}))
+    poller = telegram_client.UpdatePoller(store)
+
+    assert poller.poll() == []
+    assert poller.poll() == []
+    assert sleeps[1] > sleeps[0] > 0
+    assert poller.poll() == []
+    assert poller.failures == 0
+    # An empty poll that returned at once still waits out the interval
+    assert 0 < sleeps[2] <= telegram_client.POLL_INTERVAL
+
+
+def test_poller_dispatches_callbacks(bot, monkeypatch, store, sleeps):
+    store.add_draft(10, "post")
+    update = {"update_id": 5, "callback_query": {
+        "id": "cb", "data": "approve", "message": {"message_id": 10, "chat": {"id": 99}},
+    }}
+    _serve(monkeypatch, FakeResponse({"ok": True, "result": [update]}))
+
+    assert telegram_client.UpdatePoller(store).poll() == [10]
+    assert store.get(10)["state"] == APPROVED
+    assert store.get_offset() == 6
+    assert sleeps == []
+
+
+def test_callback_from_another_chat_is_ignored(bot, store):
+    store.add_draft(10, "post")
+    update = {"callback_query": {
+        "id": "cb", "data": "approve", "message": {"message_id": 10, "chat": {"id": 1}},
+    }}
+    assert telegram_client.handle_update(update, store) is None
+    assert store.get(10)["state"] == PENDING